@@ -26,4 +26,10 @@ else:
     print('⚠️ El superusuario ya existe')
 END
 
+echo "🔥 Precalentando cachés..."
+python manage.py warmup || echo "⚠️ Warm-up con errores (no bloquea el deploy)"
+
+echo "🖨️ Pre-renderizando páginas públicas..."
+python manage.py prerender || echo "⚠️ Pre-render con errores (las páginas se renderizan al vuelo)"
+
 echo "✅ Build completado!"
\ No newline at end of file
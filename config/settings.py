@@ -4,6 +4,7 @@ Django settings for config project.
 """
 
 import os
+import sys
 from pathlib import Path
 
 import dj_database_url
@@ -16,6 +17,8 @@ load_dotenv(BASE_DIR / ".env")
 
 SECRET_KEY = os.environ.get("SECRET_KEY", "django-insecure-dev-key-change-in-production")
 DEBUG = os.environ.get("DEBUG", "False") == "True"
+# manage.py test
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
 
 # Hosts
 ALLOWED_HOSTS = ['vida.onrender.com', 'localhost', '127.0.0.1']
@@ -146,6 +149,22 @@ if AZURE_CONNECTION_STRING and (not AZURE_ACCOUNT_NAME or not AZURE_ACCOUNT_KEY)
     if not AZURE_ACCOUNT_KEY and extracted_key:
         AZURE_ACCOUNT_KEY = extracted_key
 
+# Cliente HTTP compartido por proceso (pool de conexiones + timeouts)
+AZURE_POOL_MAXSIZE = int(os.getenv("AZURE_POOL_MAXSIZE", "20"))
+AZURE_CONNECT_TIMEOUT = float(os.getenv("AZURE_CONNECT_TIMEOUT", "5"))
+AZURE_READ_TIMEOUT = float(os.getenv("AZURE_READ_TIMEOUT", "30"))
+# Reintentos del SDK (solo errores transitorios: conexión, timeout, 5xx):
+# espera ~ INITIAL_BACKOFF + INCREMENT_BASE**intento, +/- JITTER segundos
+AZURE_RETRY_TOTAL = int(os.getenv("AZURE_RETRY_TOTAL", "2"))
+AZURE_RETRY_INITIAL_BACKOFF = float(os.getenv("AZURE_RETRY_INITIAL_BACKOFF", "0.5"))
+AZURE_RETRY_INCREMENT_BASE = float(os.getenv("AZURE_RETRY_INCREMENT_BASE", "2"))
+AZURE_RETRY_JITTER = float(os.getenv("AZURE_RETRY_JITTER", "0.5"))
+# Circuit breaker por contenedor: fallas seguidas para abrirlo y segundos abierto
+AZURE_BREAKER_THRESHOLD = int(os.getenv("AZURE_BREAKER_THRESHOLD", "5"))
+AZURE_BREAKER_COOLDOWN = int(os.getenv("AZURE_BREAKER_COOLDOWN", "30"))
+# Tamaño de cada bloque al transmitir blobs (limita la memoria por descarga)
+AZURE_STREAM_CHUNK_SIZE = int(os.getenv("AZURE_STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
 USE_AZURE_MEDIA = bool(AZURE_ACCOUNT_NAME and AZURE_CONTAINER and (AZURE_CONNECTION_STRING or AZURE_ACCOUNT_KEY))
 
 # Media local (fallback)
@@ -186,7 +205,7 @@ else:
 
     STORAGES = {
         "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "BACKEND": "cv.storage_backends.LocalMediaStorage",
             "OPTIONS": {
                 "location": str(MEDIA_ROOT),
                 "base_url": MEDIA_URL,
@@ -199,6 +218,104 @@ else:
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# ============================
+# IMÁGENES: versiones reducidas (garage y foto de perfil)
+# ============================
+IMAGE_DERIVATIVE_WIDTHS = [
+    int(w) for w in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1024").split(",") if w.strip()
+]
+IMAGE_DERIVATIVE_FORMATS = [
+    f.strip().lower() for f in os.getenv("IMAGE_DERIVATIVE_FORMATS", "webp,avif").split(",") if f.strip()
+]
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+# Originales con más píxeles que esto no se procesan (bombas de descompresión)
+IMAGE_DERIVATIVE_MAX_PIXELS = int(os.getenv("IMAGE_DERIVATIVE_MAX_PIXELS", "50000000"))
+# True: se generan al subir la foto; False: al pedirlas por primera vez
+IMAGE_DERIVATIVES_EAGER = os.getenv("IMAGE_DERIVATIVES_EAGER", "False") == "True"
+# Espera máxima por una derivada que está generando otra petición (después se sirve el original)
+IMAGE_DERIVATIVE_LOCK_TIMEOUT = int(os.getenv("IMAGE_DERIVATIVE_LOCK_TIMEOUT", "30"))
+
+# ============================
+# CACHE: en disco, compartido por todos los workers de gunicorn
+# ============================
+CACHE_DIR = Path(os.getenv("CACHE_DIR", str(BASE_DIR / ".cache")))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(CACHE_DIR / "django"),
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000")),
+            "CULL_FREQUENCY": 4,
+        },
+    },
+}
+
+# Configuración de visibilidad cacheada (se invalida al guardar; el TTL es solo un respaldo)
+VISIBILIDAD_CACHE_TTL = int(os.getenv("VISIBILIDAD_CACHE_TTL", "3600"))
+# Perfil activo cacheado (también se invalida al guardar o borrar DatosPersonales)
+PERFIL_ACTIVO_CACHE_TTL = int(os.getenv("PERFIL_ACTIVO_CACHE_TTL", "3600"))
+
+# Fragmentos HTML de las secciones del CV (cv/fragmentos.py): vigentes por
+# FRAGMENTOS_CACHE_TTL, luego se sirven vencidos (hasta FRAGMENTOS_STALE_TTL)
+# mientras un solo request los regenera
+FRAGMENTOS_CACHE_TTL = int(os.getenv("FRAGMENTOS_CACHE_TTL", "3600"))
+FRAGMENTOS_STALE_TTL = int(os.getenv("FRAGMENTOS_STALE_TTL", str(60 * 60 * 24)))
+FRAGMENTOS_LOCK_TIMEOUT = int(os.getenv("FRAGMENTOS_LOCK_TIMEOUT", "30"))
+
+# Páginas públicas pre-renderizadas (cv/prerender.py, manage.py prerender):
+# se sirven a visitantes anónimos mientras el snapshot del CV no cambie
+# (apagado por defecto con DEBUG y en los tests: cada guardado lanzaría un render en segundo plano)
+PRERENDER_ENABLED = os.getenv("PRERENDER_ENABLED", str(not (DEBUG or TESTING))) == "True"
+PRERENDER_DIR = Path(os.getenv("PRERENDER_DIR", str(CACHE_DIR / "prerender")))
+PRERENDER_MAX_AGE = int(os.getenv("PRERENDER_MAX_AGE", "60"))
+
+# Precalentar cada worker de gunicorn al arrancar (post_worker_init en
+# gunicorn.conf.py, cv/warmup.py): plantillas, cliente de Azure y breaker
+WARMUP_WORKER_START = os.getenv("WARMUP_WORKER_START", "True") == "True"
+
+# Productos por página del catálogo de venta garage (cv/garage_catalogo.py)
+GARAGE_PAGE_SIZE = int(os.getenv("GARAGE_PAGE_SIZE", "24"))
+
+# Ubicación (contenedor, nombre) donde se encontró cada archivo en Azure
+AZURE_LOCATION_CACHE_TTL = int(os.getenv("AZURE_LOCATION_CACHE_TTL", str(60 * 60 * 24)))
+# Archivos que no existen en ningún contenedor: no se vuelven a buscar durante este tiempo
+AZURE_NOT_FOUND_TTL = int(os.getenv("AZURE_NOT_FOUND_TTL", "60"))
+# Hilos para probar contenedores/variantes en paralelo cuando no hay caché
+AZURE_PROBE_WORKERS = int(os.getenv("AZURE_PROBE_WORKERS", "6"))
+
+# Vistas async (cv/views_async.py) para servir archivos; requiere servidor ASGI:
+#   gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+ASYNC_FILE_PROXY = os.getenv("ASYNC_FILE_PROXY", "False") == "True"
+
+# Entrega de archivos por tipo ("perfil", "experiencia", "curso", "reconocimiento", "garage"):
+#   proxy -> los bytes pasan por Django (por defecto, controla Content-Disposition)
+#   sas   -> 302 a una URL SAS temporal, Azure entrega el archivo directamente
+# Ejemplo: AZURE_DELIVERY_POLICY="garage=sas,curso=sas"
+AZURE_DELIVERY_POLICY = {
+    k.strip(): v.strip().lower()
+    for k, _, v in (
+        item.partition("=") for item in os.getenv("AZURE_DELIVERY_POLICY", "").split(",") if "=" in item
+    )
+}
+AZURE_SAS_EXPIRY_SECONDS = int(os.getenv("AZURE_SAS_EXPIRY_SECONDS", "3600"))
+# Los SAS cacheados se renuevan este margen de segundos antes de expirar
+AZURE_SAS_REFRESH_MARGIN = int(os.getenv("AZURE_SAS_REFRESH_MARGIN", "300"))
+
+# Caché local de los blobs servidos por el proxy (0 = deshabilitada)
+BLOB_CACHE_DIR = Path(os.getenv("BLOB_CACHE_DIR", str(CACHE_DIR / "blobs")))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+BLOB_CACHE_MAX_ITEM_BYTES = int(os.getenv("BLOB_CACHE_MAX_ITEM_BYTES", str(25 * 1024 * 1024)))
+# Segundos durante los que una copia local se sirve sin revalidar contra Azure
+BLOB_CACHE_FRESHNESS = int(os.getenv("BLOB_CACHE_FRESHNESS", "60"))
+# Una sola descarga por blob aunque lo pidan muchas peticiones a la vez;
+# con BLOB_CACHE_PROCESS_LOCK también entre workers (flock en BLOB_CACHE_DIR)
+BLOB_CACHE_SINGLE_FLIGHT = os.getenv("BLOB_CACHE_SINGLE_FLIGHT", "True") == "True"
+BLOB_CACHE_PROCESS_LOCK = os.getenv("BLOB_CACHE_PROCESS_LOCK", "True") == "True"
+# Segundos máximos esperando la descarga de otra petición antes de ir directo a Azure
+BLOB_CACHE_LOCK_TIMEOUT = int(os.getenv("BLOB_CACHE_LOCK_TIMEOUT", "30"))
+
 # Security settings for production
 if not DEBUG:
     SECURE_HSTS_SECONDS = 31536000
@@ -220,4 +337,8 @@ LOGGING = {
         "handlers": ["console"],
         "level": "DEBUG",
     },
+    "loggers": {
+        # xhtml2pdf (cv/pdf_export.py) registra cada tabla y documento en DEBUG
+        "xhtml2pdf": {"level": "WARNING"},
+    },
 }
@@ -1,7 +1,19 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
-from cv.views import hoja_vida, serve_protected_file, serve_avatar, print_preview_improved
+from cv.views import (
+    descargar_certificados,
+    estado_cache_blobs,
+    hoja_vida,
+    print_preview_improved,
+    serve_avatar,
+    serve_protected_file,
+)
+
+if settings.ASYNC_FILE_PROXY:
+    from cv.views_async import serve_protected_file_async as serve_protected_file
+    from cv.views_async import serve_avatar_async as serve_avatar
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -10,7 +22,9 @@ urlpatterns = [
     path("print-preview/", print_preview_improved, name="print_preview"),
     path("print-preview-improved/", print_preview_improved, name="print_preview_improved"),
     path("garage/", include("cv.urls")),
+    path("certificados.zip", descargar_certificados, name="descargar_certificados"),
 
     path("protected/<str:file_type>/<int:model_id>/<str:field_name>/", serve_protected_file, name="serve_protected_file"),
     path("avatar/<int:perfil_id>/", serve_avatar, name="serve_avatar"),
+    path("estado/cache-blobs/", estado_cache_blobs, name="estado_cache_blobs"),
 ]
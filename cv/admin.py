@@ -8,7 +8,7 @@ from django.utils.safestring import mark_safe
 from .models import (
     DatosPersonales, ExperienciaLaboral, Reconocimientos,
     CursosRealizados, ProductosAcademicos, ProductosLaborales, VentaGarage,
-    ConfiguracionVisibilidad
+    ConfiguracionVisibilidad, MetadatosArchivo, SnapshotCV
 )
 
 # ==================== VALIDADORES REUTILIZABLES ====================
@@ -405,4 +405,32 @@ class ConfiguracionVisibilidadAdmin(admin.ModelAdmin):
         messages.success(
             request, 
             f'✅ Configuración guardada. {activas} secciones activas.'
-        )
\ No newline at end of file
+        )
+
+
+# ==================== ADMIN: MetadatosArchivo ====================
+@admin.register(MetadatosArchivo)
+class MetadatosArchivoAdmin(admin.ModelAdmin):
+    """Solo lectura: los registros los escribe el almacenamiento al subir archivos"""
+    list_display = ('nombre', 'contenedor', 'content_type', 'tamano', 'ancho', 'alto', 'fecha_registro')
+    search_fields = ('nombre', 'blob')
+    list_filter = ('contenedor', 'content_type')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ==================== ADMIN: SnapshotCV ====================
+@admin.register(SnapshotCV)
+class SnapshotCVAdmin(admin.ModelAdmin):
+    """Solo lectura: las señales lo reconstruyen al guardar cualquier modelo del CV"""
+    list_display = ('perfil', 'version', 'fecha_generacion')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
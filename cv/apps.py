@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class CvConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'cv'
\ No newline at end of file
+    name = 'cv'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,849 @@
+# cv/blob_cache.py - Caché local en disco de los blobs servidos desde Azure
+
+"""
+Caché LRU en disco para los archivos que pasan por AzureFileProxy.
+
+- Cada entrada se identifica por (contenedor, nombre del blob, ETag), así un
+  archivo reemplazado en Azure nunca se sirve con contenido viejo.
+- Presupuesto total en bytes (BLOB_CACHE_MAX_BYTES); al superarlo se borran
+  las entradas usadas hace más tiempo. El total se lleva en un contador
+  (archivo "size"), así guardar una entrada no recorre todo el directorio.
+- Las entradas se devuelven con el archivo ya abierto: si otro proceso la
+  expulsa después, la respuesta en curso sigue leyendo el descriptor.
+- Escrituras atómicas (archivo temporal + os.replace) y bloqueo con flock,
+  para que varios workers de gunicorn compartan el mismo directorio.
+- Los aciertos se sirven con FileResponse (sendfile, sin copiar a memoria).
+- stream_fill() / astream_fill(): una única descarga por blob aunque lo
+  pidan muchas peticiones a la vez (single-flight en el proceso y,
+  opcionalmente, flock por clave entre procesos). La descarga corre aparte
+  (hilo o tarea) escribiendo en disco, y todas las peticiones leen ese
+  archivo a medida que crece, sin depender de la velocidad de ningún
+  cliente. fill() hace lo mismo para contenido generado (PDF) que se sirve
+  recién cuando está completo.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+
+@dataclass
+class CachedBlob:
+    """Entrada de la caché: archivo en disco + metadatos del blob original."""
+
+    path: str
+    size: int
+    etag: str
+    last_modified: datetime | None
+    content_type: str | None
+    # archivo abierto en _load() (sigue legible aunque la entrada se expulse)
+    fh: object = None
+
+
+class BlobDiskCache:
+    def __init__(self, directory, max_bytes, max_item_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._objects_dir = os.path.join(self.directory, "objects")
+        self._latest_dir = os.path.join(self.directory, "latest")
+        self._tmp_dir = os.path.join(self.directory, "tmp")
+        self._locks_dir = os.path.join(self.directory, "locks")
+        self._size_path = os.path.join(self.directory, "size")
+        for d in (self._objects_dir, self._latest_dir, self._tmp_dir, self._locks_dir):
+            os.makedirs(d, exist_ok=True)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "stores": 0, "coalesced": 0}
+
+        # descargas en curso en este proceso: clave -> _Flight
+        self._flights_lock = threading.Lock()
+        self._flights = {}
+        # descargas async en curso: event loop -> {clave: _AsyncFlight}
+        self._aflights = weakref.WeakKeyDictionary()
+
+    # ---------- contadores ----------
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def record_miss(self):
+        self._count("misses")
+
+    def stats(self):
+        """Contadores del proceso actual y uso de disco de la caché."""
+        with self._stats_lock:
+            data = dict(self._stats)
+        with self._lock():
+            data["bytes"] = self._read_total()
+        data["max_bytes"] = self.max_bytes
+        return data
+
+    def filling(self, container, blob_name, etag):
+        """
+        True si este proceso ya está descargando el blob (stream_fill /
+        astream_fill del event loop actual): quien lo pida se sumará a esa
+        descarga en vez de empezar otra.
+        """
+        key = self._digest(container, blob_name, etag)
+        with self._flights_lock:
+            if key in self._flights:
+                return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return key in self._aflights.get(loop, {})
+
+    # ---------- rutas ----------
+    @staticmethod
+    def _digest(*parts):
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, container, blob_name, etag):
+        key = self._digest(container, blob_name, etag)
+        return os.path.join(self._objects_dir, key[:2], key)
+
+    def _latest_path(self, container, blob_name):
+        key = self._digest(container, blob_name)
+        return os.path.join(self._latest_dir, f"{key}.json")
+
+    @contextmanager
+    def _lock(self):
+        """Bloqueo exclusivo entre procesos sobre el directorio de la caché."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _key_lock_path(self, key):
+        return os.path.join(self._locks_dir, f"{key}.lock")
+
+    def _try_key_lock(self, key):
+        """
+        Intenta tomar el flock de la clave sin esperar: archivo abierto con
+        el bloqueo tomado, o None si lo tiene otro. Cada clave tiene su
+        propio archivo, así dos blobs distintos nunca se esperan entre sí.
+        """
+        path = self._key_lock_path(key)
+        fh = open(path, "a+")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fh.close()
+            return None
+        # quien lo tenía pudo borrar el archivo entre el open y el flock:
+        # el bloqueo solo vale si sigue siendo el archivo de la ruta
+        try:
+            vigente = os.stat(path).st_ino == os.fstat(fh.fileno()).st_ino
+        except FileNotFoundError:
+            vigente = False
+        if not vigente:
+            fh.close()
+            return None
+        return fh
+
+    def _release_key_lock(self, key, fh):
+        # se borra antes de soltarlo: los archivos de bloqueo no se acumulan
+        try:
+            os.unlink(self._key_lock_path(key))
+        except OSError:
+            pass
+        fcntl.flock(fh, fcntl.LOCK_UN)
+        fh.close()
+
+    @contextmanager
+    def _key_lock(self, key, timeout):
+        """
+        Bloqueo entre procesos para una clave (flock sobre locks/<clave>.lock).
+        TimeoutError si no se obtiene a tiempo.
+        """
+        if fcntl is None:
+            yield
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            fh = self._try_key_lock(key)
+            if fh is not None:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Tiempo agotado esperando otra descarga del blob")
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            self._release_key_lock(key, fh)
+
+    @asynccontextmanager
+    async def _akey_lock(self, key, timeout):
+        """Versión asíncrona de _key_lock (los intentos corren en un hilo)."""
+        if fcntl is None:
+            yield
+            return
+        deadline = time.monotonic() + timeout
+        while True:
+            fh = await asyncio.to_thread(self._try_key_lock, key)
+            if fh is not None:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Tiempo agotado esperando otra descarga del blob")
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self._release_key_lock, key, fh)
+
+    @staticmethod
+    def _write_atomic(path, data: bytes, tmp_dir):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    # ---------- lectura ----------
+    def _load(self, path):
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            data = open(path, "rb")
+        except (OSError, ValueError):
+            return None
+
+        last_modified = meta.get("last_modified")
+        return CachedBlob(
+            path=path,
+            size=os.fstat(data.fileno()).st_size,
+            etag=meta.get("etag"),
+            last_modified=datetime.fromisoformat(last_modified) if last_modified else None,
+            content_type=meta.get("content_type"),
+            fh=data,
+        )
+
+    def _touch(self, path):
+        # mtime = último uso (LRU); atime no es fiable con noatime
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def get(self, container, blob_name, etag):
+        """Entrada exacta (contenedor, blob, ETag) o None."""
+        entry = self._load(self._entry_path(container, blob_name, etag))
+        if entry is None:
+            return None
+        self._touch(entry.path)
+        self._count("hits")
+        return entry
+
+    def get_latest(self, container, blob_name, max_age=None):
+        """
+        Última versión guardada del blob, sin consultar Azure.
+        Con max_age solo se devuelve si se confirmó contra Azure hace menos
+        de max_age segundos.
+        """
+        latest_path = self._latest_path(container, blob_name)
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(latest_path) > max_age:
+                return None
+            with open(latest_path, "r", encoding="utf-8") as fh:
+                etag = json.load(fh)["etag"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        entry = self._load(self._entry_path(container, blob_name, etag))
+        if entry is None:
+            return None
+        self._touch(entry.path)
+        self._count("hits")
+        return entry
+
+    def confirm_latest(self, container, blob_name, etag):
+        """
+        Azure acaba de confirmar que `etag` es la versión vigente del blob
+        (para get_latest con max_age). El archivo "latest" solo se reescribe
+        si cambió el ETag; si no, se renueva su mtime.
+        """
+        latest_path = self._latest_path(container, blob_name)
+        try:
+            with open(latest_path, "r", encoding="utf-8") as fh:
+                actual = json.load(fh).get("etag")
+        except (OSError, ValueError, AttributeError):
+            actual = None
+        if actual == etag:
+            self._touch(latest_path)
+        else:
+            self._mark_latest(container, blob_name, etag)
+
+    def _mark_latest(self, container, blob_name, etag):
+        try:
+            self._write_atomic(
+                self._latest_path(container, blob_name),
+                json.dumps({"etag": etag}).encode("utf-8"),
+                self._tmp_dir,
+            )
+        except OSError:
+            pass
+
+    # ---------- escritura ----------
+    def tee(self, chunks, container, blob_name, etag, size, content_type, last_modified):
+        """
+        Reenvía los bloques tal cual y, en paralelo, los guarda en disco.
+        La entrada solo se publica si el blob se leyó completo. Con size=None
+        (tamaño desconocido, p. ej. un ZIP armado al vuelo) se guarda si el
+        iterador termina sin superar max_item_bytes.
+        """
+        if not etag or (size is not None and size > self.max_item_bytes):
+            yield from chunks
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        written = 0
+        committed = False
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    written += len(chunk)
+                    if written <= self.max_item_bytes:
+                        fh.write(chunk)
+                    yield chunk
+
+            if written == size or (size is None and written <= self.max_item_bytes):
+                self._commit(tmp_path, container, blob_name, etag, content_type, last_modified)
+                committed = True
+        finally:
+            if not committed and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    async def atee(self, chunks, container, blob_name, etag, size, content_type, last_modified):
+        """
+        Versión asíncrona de tee() para las vistas ASGI: la escritura en
+        disco y la publicación corren en un hilo, no en el event loop.
+        """
+        if not etag or (size is not None and size > self.max_item_bytes):
+            async for chunk in chunks:
+                yield chunk
+            return
+
+        fd, tmp_path = await asyncio.to_thread(tempfile.mkstemp, dir=self._tmp_dir)
+        fh = os.fdopen(fd, "wb")
+        written = 0
+        committed = False
+        try:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written <= self.max_item_bytes:
+                    await asyncio.to_thread(fh.write, chunk)
+                yield chunk
+            await asyncio.to_thread(fh.close)
+
+            if written == size or (size is None and written <= self.max_item_bytes):
+                await asyncio.to_thread(
+                    self._commit, tmp_path, container, blob_name, etag, content_type, last_modified
+                )
+                committed = True
+        finally:
+            fh.close()
+            if not committed:
+                await asyncio.to_thread(self._discard, tmp_path)
+
+    @staticmethod
+    def _discard(tmp_path):
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    def store(self, container, blob_name, etag, chunks, content_type=None, last_modified=None):
+        """Guarda un blob completo y devuelve la entrada creada."""
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+            self._commit(tmp_path, container, blob_name, etag, content_type, last_modified)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return self._load(self._entry_path(container, blob_name, etag))
+
+    def fill(self, container, blob_name, etag, fetch_chunks, content_type=None,
+             last_modified=None, timeout=30, process_lock=True):
+        """
+        Descarga y guarda el blob una sola vez aunque lo pidan varias
+        peticiones a la vez. fetch_chunks() devuelve el iterador de bloques
+        y solo lo llama quien hace la descarga; el resto espera y recibe la
+        misma entrada.
+
+        Returns:
+            (CachedBlob, True si esta llamada hizo la descarga)
+        """
+        key = self._digest(container, blob_name, etag)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError("Tiempo agotado esperando otra descarga del blob")
+            if flight.error is not None:
+                raise flight.error
+            # cada petición con su propio descriptor (no se comparte entre hilos)
+            entry = self._load(self._entry_path(container, blob_name, etag))
+            if entry is None:
+                # expulsada apenas se guardó: se vuelve a generar
+                return self.fill(container, blob_name, etag, fetch_chunks, content_type,
+                                 last_modified, timeout, process_lock)
+            self._count("coalesced")
+            return entry, False
+
+        try:
+            lock = self._key_lock(key, timeout) if process_lock else nullcontext()
+            with lock:
+                # otro proceso pudo haberlo descargado mientras esperábamos
+                entry = self._load(self._entry_path(container, blob_name, etag))
+                fetched = entry is None
+                if fetched:
+                    self._count("misses")
+                    entry = self.store(container, blob_name, etag, fetch_chunks(), content_type, last_modified)
+                else:
+                    self._count("coalesced")
+            return entry, fetched
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _chunk_size(self):
+        return getattr(settings, "AZURE_STREAM_CHUNK_SIZE", 1024 * 1024)
+
+    @staticmethod
+    def _append(fh, chunk):
+        # cada bloque queda en el archivo antes de avisar a los lectores
+        fh.write(chunk)
+        fh.flush()
+
+    def stream_fill(self, container, blob_name, etag, fetch_chunks, size, content_type=None,
+                    last_modified=None, timeout=30, process_lock=True):
+        """
+        Bloques del blob con una sola descarga por clave, sin esperar a que
+        termine para empezar a responder:
+
+        - la primera petición arranca la descarga en un hilo aparte
+          (_run_fill), que escribe un archivo temporal y lo publica como
+          entrada al terminar;
+        - todas las peticiones, también la primera, leen ese archivo a
+          medida que crece: un cliente lento o que se desconecta no frena
+          ni corta la descarga, y la clave se libera apenas termina;
+        - entre procesos, el hilo toma el flock de la clave; si otro
+          proceso ya la guardó mientras tanto, se lee del disco. Si el
+          flock no llega en `timeout`, cada petición transmite directo con
+          fetch_chunks(), sin guardar.
+
+        Es un generador: nada se descarga ni se bloquea hasta iterarlo.
+        """
+        key = self._digest(container, blob_name, etag)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            threading.Thread(
+                target=self._run_fill,
+                args=(key, flight, container, blob_name, etag, fetch_chunks, size,
+                      content_type, last_modified, timeout, process_lock),
+                name="blob-fill",
+                daemon=True,
+            ).start()
+        else:
+            self._count("coalesced")
+        yield from self._read_flight(flight, fetch_chunks, timeout)
+
+    def _run_fill(self, key, flight, container, blob_name, etag, fetch_chunks, size,
+                  content_type, last_modified, timeout, process_lock):
+        """Descarga de stream_fill (en su propio hilo)."""
+        path = self._entry_path(container, blob_name, etag)
+        tmp_path = None
+        committed = False
+        try:
+            with self._key_lock(key, timeout) if process_lock else nullcontext():
+                entry = self._load(path)
+                if entry is not None:
+                    # otro proceso la guardó mientras esperábamos el bloqueo
+                    entry.fh.close()
+                    with flight.cond:
+                        flight.path, flight.written = path, entry.size
+                        flight.cond.notify_all()
+                    return
+
+                self._count("misses")
+                fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir)
+                with os.fdopen(fd, "wb") as fh:
+                    with flight.cond:
+                        flight.path = tmp_path
+                        flight.cond.notify_all()
+                    for chunk in fetch_chunks():
+                        self._append(fh, chunk)
+                        with flight.cond:
+                            flight.written += len(chunk)
+                            flight.cond.notify_all()
+                if size is not None and flight.written != size:
+                    raise OSError(f"Descarga incompleta: {flight.written} de {size} bytes")
+                # bajo la condición: nadie abre el temporal mientras se mueve
+                with flight.cond:
+                    self._commit(tmp_path, container, blob_name, etag, content_type, last_modified)
+                    committed = True
+                    flight.path = path
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if tmp_path and not committed:
+                self._discard(tmp_path)
+            with self._flights_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+            flight.done.set()
+
+    def _read_flight(self, flight, fetch_chunks, timeout):
+        """Lee el archivo de una descarga de stream_fill a medida que crece."""
+        with flight.cond:
+            flight.cond.wait_for(lambda: flight.path is not None or flight.finished, timeout)
+            fh = None
+            if flight.path is not None:
+                try:
+                    fh = open(flight.path, "rb")
+                except OSError:
+                    # entrada expulsada apenas se guardó
+                    pass
+        if fh is None:
+            # sin copia en disco: otro proceso tiene la clave, o se expulsó
+            if flight.error is not None and not isinstance(flight.error, TimeoutError):
+                raise flight.error
+            self._count("misses")
+            yield from fetch_chunks()
+            return
+
+        chunk_size = self._chunk_size()
+        offset = 0
+        with fh:
+            while True:
+                with flight.cond:
+                    if not flight.cond.wait_for(lambda: flight.written > offset or flight.finished, timeout):
+                        raise TimeoutError("Tiempo agotado esperando la descarga del blob")
+                    written, error = flight.written, flight.error
+                if written <= offset:
+                    if error is not None:
+                        raise error
+                    return
+                data = os.pread(fh.fileno(), min(chunk_size, written - offset), offset)
+                if not data:
+                    raise OSError("La copia en disco terminó antes de lo esperado")
+                offset += len(data)
+                yield data
+
+    async def astream_fill(self, container, blob_name, etag, fetch_chunks, size, content_type=None,
+                           last_modified=None, timeout=30, process_lock=True):
+        """
+        Versión asíncrona de stream_fill() para las vistas ASGI: fetch_chunks()
+        devuelve un iterador asíncrono (cliente aio), la descarga es una
+        tarea del event loop y las peticiones del mismo loop leen su archivo.
+        """
+        key = self._digest(container, blob_name, etag)
+        loop = asyncio.get_running_loop()
+        flights = self._aflights.setdefault(loop, {})
+        flight = flights.get(key)
+        if flight is None:
+            flight = flights[key] = _AsyncFlight()
+            flight.task = loop.create_task(self._arun_fill(
+                key, flight, flights, container, blob_name, etag, fetch_chunks, size,
+                content_type, last_modified, timeout, process_lock,
+            ))
+        else:
+            self._count("coalesced")
+        async for chunk in self._aread_flight(flight, fetch_chunks, timeout):
+            yield chunk
+
+    async def _arun_fill(self, key, flight, flights, container, blob_name, etag, fetch_chunks, size,
+                         content_type, last_modified, timeout, process_lock):
+        """Descarga de astream_fill (tarea del event loop)."""
+        path = self._entry_path(container, blob_name, etag)
+        tmp_path = None
+        fh = None
+        committed = False
+        try:
+            async with AsyncExitStack() as stack:
+                if process_lock:
+                    await stack.enter_async_context(self._akey_lock(key, timeout))
+                entry = await asyncio.to_thread(self._load, path)
+                if entry is not None:
+                    entry.fh.close()
+                    async with flight.cond:
+                        flight.path, flight.written = path, entry.size
+                        flight.cond.notify_all()
+                    return
+
+                self._count("misses")
+                fd, tmp_path = await asyncio.to_thread(tempfile.mkstemp, dir=self._tmp_dir)
+                fh = os.fdopen(fd, "wb")
+                async with flight.cond:
+                    flight.path = tmp_path
+                    flight.cond.notify_all()
+                async for chunk in fetch_chunks():
+                    await asyncio.to_thread(self._append, fh, chunk)
+                    async with flight.cond:
+                        flight.written += len(chunk)
+                        flight.cond.notify_all()
+                await asyncio.to_thread(fh.close)
+                if size is not None and flight.written != size:
+                    raise OSError(f"Descarga incompleta: {flight.written} de {size} bytes")
+                async with flight.cond:
+                    await asyncio.to_thread(
+                        self._commit, tmp_path, container, blob_name, etag, content_type, last_modified
+                    )
+                    committed = True
+                    flight.path = path
+        except BaseException as e:
+            flight.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if fh is not None:
+                fh.close()
+            if tmp_path and not committed:
+                await asyncio.to_thread(self._discard, tmp_path)
+            if flights.get(key) is flight:
+                del flights[key]
+            async with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+
+    @staticmethod
+    async def _await_flight(flight, predicate, timeout):
+        """Espera (con flight.cond tomada) a que se cumpla predicate; False si vence."""
+        try:
+            await asyncio.wait_for(flight.cond.wait_for(predicate), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def _aread_flight(self, flight, fetch_chunks, timeout):
+        """Versión asíncrona de _read_flight."""
+        async with flight.cond:
+            await self._await_flight(flight, lambda: flight.path is not None or flight.finished, timeout)
+            fh = None
+            if flight.path is not None:
+                try:
+                    fh = await asyncio.to_thread(open, flight.path, "rb")
+                except OSError:
+                    pass
+        if fh is None:
+            if flight.error is not None and not isinstance(flight.error, TimeoutError):
+                raise flight.error
+            self._count("misses")
+            async for chunk in fetch_chunks():
+                yield chunk
+            return
+
+        chunk_size = self._chunk_size()
+        offset = 0
+        try:
+            while True:
+                async with flight.cond:
+                    if not await self._await_flight(
+                        flight, lambda: flight.written > offset or flight.finished, timeout
+                    ):
+                        raise TimeoutError("Tiempo agotado esperando la descarga del blob")
+                    written, error = flight.written, flight.error
+                if written <= offset:
+                    if error is not None:
+                        raise error
+                    return
+                data = await asyncio.to_thread(os.pread, fh.fileno(), min(chunk_size, written - offset), offset)
+                if not data:
+                    raise OSError("La copia en disco terminó antes de lo esperado")
+                offset += len(data)
+                yield data
+        finally:
+            fh.close()
+
+    def _commit(self, tmp_path, container, blob_name, etag, content_type, last_modified):
+        path = self._entry_path(container, blob_name, etag)
+        meta = {
+            "container": container,
+            "blob": blob_name,
+            "etag": etag,
+            "content_type": content_type,
+            "last_modified": last_modified.isoformat() if last_modified else None,
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(tmp_path)
+        with self._lock():
+            total = self._read_total()
+            try:
+                total -= os.path.getsize(path)  # la misma entrada guardada de nuevo
+            except OSError:
+                pass
+            self._write_atomic(f"{path}.json", json.dumps(meta).encode("utf-8"), self._tmp_dir)
+            os.replace(tmp_path, path)
+            total += size
+            self._write_total(total)
+        self._mark_latest(container, blob_name, etag)
+        self._count("stores")
+        if total > self.max_bytes:
+            self.evict()
+
+    # ---------- tamaño total ----------
+    def _read_total(self):
+        """Bytes ocupados según el contador (llamar con self._lock() tomado)."""
+        try:
+            with open(self._size_path, "r", encoding="utf-8") as fh:
+                return int(fh.read())
+        except (OSError, ValueError):
+            # primera vez (o contador dañado): se recalcula recorriendo la caché
+            total = sum(size for _path, size, _mtime in self._iter_entries())
+            self._write_total(total)
+            return total
+
+    def _write_total(self, total):
+        try:
+            self._write_atomic(self._size_path, str(max(total, 0)).encode("ascii"), self._tmp_dir)
+        except OSError:
+            pass
+
+    # ---------- expulsión LRU ----------
+    def _iter_entries(self):
+        for root, _dirs, files in os.walk(self._objects_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        """
+        Borra las entradas menos usadas hasta quedar bajo el 90% del
+        presupuesto. Solo se llama cuando el contador supera el presupuesto;
+        el recorrido del directorio se hace sin el bloqueo global y el total
+        se corrige con lo que realmente había en disco.
+        """
+        entries = sorted(self._iter_entries(), key=lambda e: e[2])
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        with self._lock():
+            total = sum(size for _path, size, _mtime in entries)
+            if total <= self.max_bytes:
+                self._write_total(total)
+                return 0
+
+            for path, size, _mtime in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                try:
+                    os.unlink(f"{path}.json")
+                except OSError:
+                    pass
+                total -= size
+                removed += 1
+            self._write_total(total)
+
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+
+class _Flight:
+    """
+    Descarga en curso compartida por las peticiones que esperan.
+    stream_fill además publica el archivo que se va escribiendo: path
+    (temporal mientras descarga, la entrada al terminar) y los bytes ya
+    escritos, avisando por cond a los lectores.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+        self.cond = threading.Condition()
+        self.path = None
+        self.written = 0
+        self.finished = False
+
+
+class _AsyncFlight:
+    """Igual que _Flight para astream_fill (un event loop)."""
+
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.task = None
+        self.error = None
+        self.path = None
+        self.written = 0
+        self.finished = False
+
+
+_cache_lock = threading.Lock()
+_cache_instance = {}
+
+
+def get_blob_cache():
+    """
+    Caché de blobs del proceso, o None si está deshabilitada
+    (BLOB_CACHE_MAX_BYTES = 0).
+    """
+    max_bytes = getattr(settings, "BLOB_CACHE_MAX_BYTES", 0)
+    if max_bytes <= 0:
+        return None
+
+    directory = str(settings.BLOB_CACHE_DIR)
+    with _cache_lock:
+        instance = _cache_instance.get(directory)
+        if instance is None:
+            instance = BlobDiskCache(
+                directory,
+                max_bytes=max_bytes,
+                max_item_bytes=getattr(settings, "BLOB_CACHE_MAX_ITEM_BYTES", max_bytes),
+            )
+            _cache_instance[directory] = instance
+        return instance
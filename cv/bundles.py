@@ -0,0 +1,248 @@
+# cv/bundles.py - ZIP con el CV y todos los certificados del perfil
+
+"""
+Arma al vuelo un ZIP con el cv_pdf y los certificados (rutacertificado) de
+experiencia, cursos y reconocimientos visibles del perfil, para descargarlos
+en una sola petición.
+
+- Sin archivos temporales: el ZIP se genera mientras se envía.
+- Los archivos se abren en paralelo (open_file_source: metadatos, caché
+  local de blobs y descarga única por blob).
+- Respeta ConfiguracionVisibilidad y activarparaqueseveaenfront.
+- El ZIP terminado queda en la caché local de blobs con una clave derivada
+  de los ETags de sus archivos (tomados de MetadatosArchivo, en una sola
+  consulta): mientras no cambie ninguno se reutiliza, y las revalidaciones
+  (304) y los aciertos no abren ningún archivo.
+- Los archivos salen del snapshot del CV (cv/snapshot.py); hay_certificados()
+  dice, sin consultar la BD en el caso cacheado, si la página debe ofrecer
+  la descarga.
+"""
+
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .blob_cache import get_blob_cache
+from .file_responses import blob_filename, build_file_response
+from .models import MetadatosArchivo
+from .snapshot import obtener_cv
+from .storage_backends import AzureFileProxy, AzureUnavailableError, LocalFileSource, open_file_source
+
+BUNDLE_CONTAINER = "bundles"
+
+CERTIFICADOS_CACHE_KEY = "cv:certificados:{}"
+
+# (carpeta dentro del ZIP, campo de ConfiguracionVisibilidad, sección del snapshot)
+CERTIFICATE_SECTIONS = (
+    ("experiencia", "mostrar_experiencia_laboral", "experiencias"),
+    ("cursos", "mostrar_cursos", "cursos"),
+    ("reconocimientos", "mostrar_reconocimientos", "reconocimientos"),
+)
+
+
+def bundle_members(cv):
+    """
+    [(nombre dentro del ZIP, referencia del archivo)] visibles del perfil,
+    a partir del CV leído del snapshot (obtener_cv).
+    """
+    if cv is None:
+        return []
+    perfil, config = cv["perfil"], cv["config"]
+    members = []
+    if perfil.cv_pdf and (config is None or config.mostrar_cv_descargable):
+        members.append((blob_filename(perfil.cv_pdf.name), perfil.cv_pdf.name))
+
+    # el snapshot ya tiene solo las filas con activarparaqueseveaenfront
+    for folder, flag, seccion in CERTIFICATE_SECTIONS:
+        if config is not None and not getattr(config, flag):
+            continue
+        for obj in cv[seccion]:
+            ref = getattr(obj.rutacertificado, "name", "")
+            if ref:
+                members.append((f"{folder}/{blob_filename(ref)}", ref))
+
+    # nombres repetidos dentro del ZIP: "a.pdf", "a (2).pdf", ...
+    seen = {}
+    out = []
+    for arcname, ref in members:
+        count = seen.get(arcname, 0) + 1
+        seen[arcname] = count
+        if count > 1:
+            root, ext = os.path.splitext(arcname)
+            arcname = f"{root} ({count}){ext}"
+        out.append((arcname, ref))
+    return out
+
+
+def _open_member(ref):
+    try:
+        return open_file_source(ref)
+    except (FileNotFoundError, AzureUnavailableError) as e:
+        print(f"Certificado omitido del ZIP ({ref}): {e}")
+        return None
+    finally:
+        # cada hilo usa su propia conexión a la BD
+        connection.close()
+
+
+def open_members(members, max_workers=6):
+    """Abre todos los archivos en paralelo; omite los que no se encuentran."""
+    if not members:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(members)), thread_name_prefix="bundle") as executor:
+        sources = list(executor.map(_open_member, [ref for _arcname, ref in members]))
+    return [(arcname, source) for (arcname, _ref), source in zip(members, sources) if source is not None]
+
+
+def hay_certificados(perfil_id, cv=None):
+    """
+    True si el perfil tiene archivos para el ZIP. Se cachea hasta que
+    cambie el snapshot (invalidar_certificados desde cv/signals.py).
+    """
+    if perfil_id is None:
+        return False
+    key = CERTIFICADOS_CACHE_KEY.format(perfil_id)
+    hay = cache.get(key)
+    if hay is None:
+        hay = bool(bundle_members(cv if cv is not None else obtener_cv(perfil_id)))
+        cache.set(key, hay, getattr(settings, "VISIBILIDAD_CACHE_TTL", 3600))
+    return hay
+
+
+def invalidar_certificados(perfil_id):
+    cache.delete(CERTIFICADOS_CACHE_KEY.format(perfil_id))
+
+
+def _etag_de_partes(parts):
+    return quote_etag(hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:32])
+
+
+def bundle_etag(entries):
+    """ETag del ZIP a partir de los archivos ya abiertos (nombres y ETags)."""
+    return _etag_de_partes([f"{arcname}\0{source.etag}" for arcname, source in entries])
+
+
+def members_etag(members):
+    """
+    ETag del ZIP sin abrir ningún archivo: los ETags (o el sha256, en
+    almacenamiento local) registrados en MetadatosArchivo, en una consulta.
+    None si a algún archivo le falta el registro.
+    """
+    nombres = {ref: AzureFileProxy._normalize_blob_name(ref) for _arcname, ref in members}
+    try:
+        registros = {
+            nombre: etag or sha256
+            for nombre, etag, sha256 in MetadatosArchivo.objects.filter(
+                nombre__in=set(nombres.values())
+            ).values_list("nombre", "etag", "sha256")
+        }
+    except DatabaseError:
+        return None
+    parts = []
+    for arcname, ref in members:
+        validador = registros.get(nombres[ref])
+        if not validador:
+            return None
+        parts.append(f"{arcname}\0{validador}")
+    return _etag_de_partes(["metadatos"] + parts)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Destino no posicionable de zipfile: acumula lo escrito hasta vaciarlo."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """
+    Genera el ZIP por bloques. Como la salida no es posicionable, zipfile
+    escribe el CRC y los tamaños después de cada archivo (data descriptor).
+    """
+    buffer = _StreamBuffer()
+    # nivel 1: los PDF/imágenes ya vienen comprimidos, solo se evita el costo de CPU
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for arcname, source in entries:
+            modified = source.last_modified or datetime.now()
+            info = zipfile.ZipInfo(arcname, date_time=max(modified.timetuple()[:6], (1980, 1, 1, 0, 0, 0)))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = source.size
+            with zf.open(info, mode="w", force_zip64=source.size > zipfile.ZIP64_LIMIT) as dest:
+                for chunk in source.iter_range():
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def bundle_response(request, perfil, members):
+    """
+    Respuesta con el ZIP: 304 si el cliente ya lo tiene, la copia de la
+    caché local si existe (con soporte de Range) o el ZIP armado al vuelo.
+    Los archivos se abren solo en este último caso (si los registros de
+    MetadatosArchivo alcanzan para calcular el ETag). None si no se pudo
+    abrir ninguno.
+    """
+    etag = members_etag(members)
+    entries = None
+    if etag is None:
+        entries = open_members(members)
+        if not entries:
+            return None
+        etag = bundle_etag(entries)
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    blob_cache = get_blob_cache()
+    bundle_name = f"perfil-{perfil.pk}.zip"
+    if blob_cache is not None:
+        entry = blob_cache.get(BUNDLE_CONTAINER, bundle_name, etag)
+        if entry:
+            return build_file_response(request, LocalFileSource.from_cache(entry), "application/zip")
+
+    if entries is None:
+        entries = open_members(members)
+        if not entries:
+            return None
+    completo = len(entries) == len(members)
+
+    chunks = iter_zip(entries)
+    if blob_cache is not None and completo:
+        # un ZIP al que le falta algún archivo no se guarda con este ETag
+        chunks = blob_cache.tee(chunks, BUNDLE_CONTAINER, bundle_name, etag, None, "application/zip", None)
+
+    response = StreamingHttpResponse(chunks, content_type="application/zip")
+    if completo:
+        response["ETag"] = etag
+    if blob_cache is not None:
+        response["X-Cache"] = "MISS"
+    return response
@@ -0,0 +1,103 @@
+# cv/circuit_breaker.py - Circuit breaker para las llamadas a Azure
+
+"""
+Circuit breaker por contenedor de Azure (estado en memoria de cada proceso).
+
+- cerrado: las llamadas pasan normalmente.
+- abierto: después de AZURE_BREAKER_THRESHOLD fallas seguidas, las llamadas
+  fallan al instante durante AZURE_BREAKER_COOLDOWN segundos (no se espera
+  a que venzan los timeouts).
+- semiabierto: pasado el cooldown se deja pasar una llamada de prueba;
+  si sale bien se cierra, si falla vuelve a abrirse.
+
+Solo cuentan como fallas los errores de disponibilidad (conexión, timeout,
+5xx, 429); un 404 es una respuesta sana del servicio.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+
+def is_unavailable_error(error):
+    """True si el error indica que Azure no está disponible (y no que falta el archivo)."""
+    if isinstance(error, (ServiceRequestError, ServiceResponseError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        status = getattr(error, "status_code", None)
+        return status is None or status >= 500 or status == 429
+    return False
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=None, cooldown=None):
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        # clave -> {"failures": int, "opened_at": float | None, "probing": float | None}
+        self._state = {}
+
+    @property
+    def threshold(self):
+        return self._threshold or getattr(settings, "AZURE_BREAKER_THRESHOLD", 5)
+
+    @property
+    def cooldown(self):
+        return self._cooldown or getattr(settings, "AZURE_BREAKER_COOLDOWN", 30)
+
+    def _entry(self, key):
+        return self._state.setdefault(key, {"failures": 0, "opened_at": None, "probing": None})
+
+    def _blocked(self, entry, now):
+        if now - entry["opened_at"] < self.cooldown:
+            return True
+        # una prueba en curso (si no informó resultado, vence con el cooldown)
+        return entry["probing"] is not None and now - entry["probing"] < self.cooldown
+
+    def is_open(self, key):
+        """True mientras el circuito está abierto (sin reservar la llamada de prueba)."""
+        with self._lock:
+            entry = self._state.get(key)
+            if not entry or entry["opened_at"] is None:
+                return False
+            return self._blocked(entry, time.monotonic())
+
+    def allow(self, key):
+        """
+        Indica si se puede llamar a Azure. Con el cooldown vencido solo la
+        primera llamada pasa (prueba); las demás siguen fallando rápido.
+        """
+        with self._lock:
+            entry = self._entry(key)
+            if entry["opened_at"] is None:
+                return True
+            now = time.monotonic()
+            if self._blocked(entry, now):
+                return False
+            entry["probing"] = now
+            return True
+
+    def record_success(self, key):
+        with self._lock:
+            entry = self._state.get(key)
+            if entry:
+                entry.update(failures=0, opened_at=None, probing=None)
+
+    def record_failure(self, key):
+        with self._lock:
+            entry = self._entry(key)
+            entry["failures"] += 1
+            if entry["probing"] is not None or entry["failures"] >= self.threshold:
+                if entry["opened_at"] is None:
+                    print(f"[WARN] Azure no disponible ({key}): circuito abierto por {self.cooldown}s")
+                entry.update(opened_at=time.monotonic(), probing=None)
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+azure_breaker = CircuitBreaker()
@@ -0,0 +1,110 @@
+# cv/file_metadata.py - Registro de metadatos de los archivos subidos
+
+"""
+Guarda en la tabla MetadatosArchivo el tamaño, content-type, ETag, hash,
+dimensiones (imágenes) y ubicación real de cada archivo subido.
+
+Lo escribe el almacenamiento al guardar el archivo (MetadataStorageMixin en
+cv/storage_backends.py); las vistas lo leen para servir el archivo sin
+llamar a get_blob_properties ni probar contenedores en Azure.
+Los archivos subidos antes de existir la tabla se registran la primera vez
+que se sirven.
+"""
+
+import hashlib
+import mimetypes
+import os
+
+from django.db import DatabaseError
+from PIL import Image
+
+from .models import MetadatosArchivo
+
+
+def inspeccionar_archivo(content, name):
+    """
+    Calcula tamaño, sha256, content-type y dimensiones del archivo que se
+    está por guardar. Deja el archivo rebobinado al inicio.
+    """
+    sha = hashlib.sha256()
+    size = 0
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks() if hasattr(content, "chunks") else [content.read()]:
+        sha.update(chunk)
+        size += len(chunk)
+
+    content_type = getattr(content, "content_type", None)
+    if not content_type:
+        content_type, _ = mimetypes.guess_type(os.path.basename(name))
+
+    ancho = alto = None
+    if content_type and content_type.startswith("image/"):
+        try:
+            content.seek(0)
+            with Image.open(content) as img:
+                ancho, alto = img.size
+        except Exception:
+            pass
+
+    if hasattr(content, "seek"):
+        content.seek(0)
+
+    return {
+        "tamano": size,
+        "sha256": sha.hexdigest(),
+        "content_type": content_type or "",
+        "ancho": ancho,
+        "alto": alto,
+    }
+
+
+def registrar_metadatos(nombre, **datos):
+    """Crea o actualiza el registro del archivo."""
+    try:
+        MetadatosArchivo.objects.update_or_create(nombre=nombre, defaults=datos)
+    except DatabaseError as e:
+        print(f"Error registrando metadatos de {nombre}: {e}")
+
+
+def datos_desde_propiedades(blob_client, props):
+    """Campos del registro a partir de las properties de un blob de Azure."""
+    content_settings = getattr(props, "content_settings", None)
+    return {
+        "contenedor": blob_client.container_name,
+        "blob": blob_client.blob_name,
+        "tamano": props.size,
+        "content_type": getattr(content_settings, "content_type", None) or "",
+        "etag": props.etag or "",
+        "fecha_modificacion": props.last_modified,
+    }
+
+
+def obtener_metadatos(nombre):
+    """Registro del archivo, o None si no existe (o la tabla no está migrada)."""
+    try:
+        return MetadatosArchivo.objects.filter(nombre=nombre).first()
+    except DatabaseError:
+        return None
+
+
+async def aobtener_metadatos(nombre):
+    try:
+        return await MetadatosArchivo.objects.filter(nombre=nombre).afirst()
+    except DatabaseError:
+        return None
+
+
+async def aregistrar_metadatos(nombre, **datos):
+    try:
+        await MetadatosArchivo.objects.aupdate_or_create(nombre=nombre, defaults=datos)
+    except DatabaseError as e:
+        print(f"Error registrando metadatos de {nombre}: {e}")
+
+
+def borrar_metadatos(nombre):
+    """Descarta el registro (el archivo cambió fuera de Django o se borró)."""
+    try:
+        MetadatosArchivo.objects.filter(nombre=nombre).delete()
+    except DatabaseError:
+        pass
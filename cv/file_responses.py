@@ -0,0 +1,233 @@
+# cv/file_responses.py - Construcción de respuestas HTTP para archivos protegidos
+
+"""
+Helpers compartidos por las vistas que sirven archivos (CV, certificados,
+fotos de garage y avatar). Se encargan de los headers y de transmitir el
+contenido por bloques, sin cargar el archivo completo en memoria.
+"""
+
+import mimetypes
+import os
+import re
+import secrets
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+
+# Más rangos que esto en una sola petición se ignoran y se envía el archivo completo
+MAX_RANGES = 10
+
+_RANGE_SPEC_RE = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+def guess_content_type(source, blob_ref, default="application/octet-stream"):
+    """
+    Obtiene el content-type guardado con el archivo.
+    Si no lo tiene, lo adivina por la extensión del archivo.
+    """
+    content_type = getattr(source, "content_type", None)
+    if content_type:
+        return content_type
+
+    filename_guess = os.path.basename(str(blob_ref))
+    content_type, _ = mimetypes.guess_type(filename_guess)
+    return content_type or default
+
+
+def blob_filename(blob_ref):
+    """Nombre final del archivo (sin carpetas ni querystring)."""
+    return os.path.basename(str(blob_ref).replace("\\", "/").split("?")[0])
+
+
+def streaming_blob_response(chunks, blob_properties, content_type):
+    """
+    StreamingHttpResponse que envía los bloques a medida que llegan de Azure.
+    Content-Length se toma del tamaño real del blob.
+    """
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    size = getattr(blob_properties, "size", None)
+    if size is not None:
+        response["Content-Length"] = str(size)
+    return response
+
+
+def parse_range_header(header, size):
+    """
+    Interpreta el header Range ("bytes=0-99,200-", "bytes=-500", ...).
+
+    Returns:
+        - None si no hay header, es inválido o pide demasiados rangos
+          (se responde el archivo completo con 200).
+        - [] si ningún rango es satisfacible (416).
+        - Lista de tuplas (inicio, fin) inclusivas, ordenadas y fusionadas.
+    """
+    if not header or size is None:
+        return None
+
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    parts = specs.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        match = _RANGE_SPEC_RE.match(part)
+        if not match:
+            return None
+        first, last = match.groups()
+
+        if first == "" and last == "":
+            return None
+
+        if first == "":
+            # sufijo: los últimos N bytes
+            suffix = int(last)
+            if suffix == 0:
+                continue
+            start = max(size - suffix, 0)
+            end = size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            end = min(end, size - 1)
+
+        if size > 0:
+            ranges.append((start, end))
+
+    # fusiona rangos solapados o contiguos
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _multipart_byteranges(source, ranges, content_type):
+    """
+    Arma el cuerpo multipart/byteranges sin leer nada todavía.
+    Retorna (boundary, generador, longitud total).
+    """
+    boundary = secrets.token_hex(16)
+    heads = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{source.size}\r\n\r\n"
+        ).encode("ascii")
+        for start, end in ranges
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+
+    total = len(tail) + sum(len(h) for h in heads)
+    total += sum(end - start + 1 for start, end in ranges)
+
+    if getattr(source, "is_async", False):
+        async def body():
+            for head, (start, end) in zip(heads, ranges):
+                yield head
+                async for chunk in source.iter_range(start, end - start + 1):
+                    yield chunk
+            yield tail
+    else:
+        def body():
+            for head, (start, end) in zip(heads, ranges):
+                yield head
+                yield from source.iter_range(start, end - start + 1)
+            yield tail
+
+    return boundary, body(), total
+
+
+def _last_modified_timestamp(source):
+    last_modified = getattr(source, "last_modified", None)
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def _if_range_matches(request, source, last_modified):
+    """
+    If-Range: el Range solo se respeta si el validador sigue vigente;
+    si el archivo cambió se envía completo.
+    """
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        etag = getattr(source, "etag", None)
+        return bool(etag) and not if_range.startswith("W/") and etag in parse_etags(if_range)
+    return last_modified is not None and if_range == http_date(last_modified)
+
+
+def _set_validators(response, source, last_modified):
+    etag = getattr(source, "etag", None)
+    if etag:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def build_file_response(request, source, content_type):
+    """
+    Respuesta para una fuente de archivo (Azure o local) respetando Range
+    y GET condicional:
+      - If-None-Match / If-Modified-Since vigentes: 304 sin leer el archivo
+      - sin Range (o Range ignorado): 200 con el archivo completo
+      - un rango: 206 con Content-Range
+      - varios rangos: 206 multipart/byteranges
+      - rangos fuera del archivo: 416
+    Cada rango se lee por separado (lectura parcial en Azure o seek local).
+    Con fuentes asíncronas (is_async) el cuerpo es un iterador asíncrono.
+    """
+    last_modified = _last_modified_timestamp(source)
+    not_modified = get_conditional_response(
+        request, etag=getattr(source, "etag", None), last_modified=last_modified
+    )
+    if not_modified is not None:
+        return _set_validators(not_modified, source, last_modified)
+
+    size = source.size
+    ranges = None
+    if request.method in ("GET", "HEAD") and _if_range_matches(request, source, last_modified):
+        ranges = parse_range_header(request.META.get("HTTP_RANGE"), size)
+
+    if ranges is None:
+        if source.path:
+            response = FileResponse(source.open(), content_type=content_type)
+        else:
+            response = streaming_blob_response(source.iter_range(), source, content_type)
+    elif not ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            source.iter_range(start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        boundary, body, total = _multipart_byteranges(source, ranges, content_type)
+        response = StreamingHttpResponse(
+            body,
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response["Content-Length"] = str(total)
+
+    response["Accept-Ranges"] = "bytes"
+    cache_status = getattr(source, "cache_status", None)
+    if cache_status:
+        response["X-Cache"] = cache_status
+    return _set_validators(response, source, last_modified)
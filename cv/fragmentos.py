@@ -0,0 +1,132 @@
+# cv/fragmentos.py - Caché de fragmentos HTML de las secciones del CV
+
+"""
+hoja_vida acepta siete parámetros booleanos en la URL (128 combinaciones),
+así que cachear la página completa no sirve. En cambio, cada sección
+(templates/cv/secciones/<seccion>.html) se renderiza una vez y se guarda
+en la caché compartida; la página se arma con los fragmentos cacheados de
+las secciones visibles, sea cual sea la combinación.
+
+- Clave: plantilla + perfil + sección. Cada fragmento guarda la versión de
+  los datos con la que se generó; al guardar o borrar un registro de la
+  sección, cv/signals.py cambia la versión después de reconstruir el
+  snapshot (cv/snapshot.py), que es de donde se regeneran los fragmentos.
+- Stale-while-revalidate: un fragmento vencido (FRAGMENTOS_CACHE_TTL) o de
+  una versión anterior se sigue sirviendo mientras un solo request lo
+  regenera (candado con cache.add); los demás no repiten el trabajo.
+- Si el fragmento está en caché, el queryset de la sección no se evalúa.
+"""
+
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import DatosPersonales
+from .secciones import SECCIONES
+
+PLANTILLA_SECCION = "cv/secciones/{}.html"
+
+# secciones que hoja_vida_cv.html muestra con {% fragmento_seccion %}
+SECCIONES_FRAGMENTO = ("experiencias", "cursos", "reconocimientos", "prod_acad", "prod_lab")
+
+
+def _ttl():
+    return getattr(settings, "FRAGMENTOS_CACHE_TTL", 3600)
+
+
+def _version_key(perfil_id, seccion):
+    return f"cv:fragmentos:version:{perfil_id}:{seccion}"
+
+
+def _fragmento_key(plantilla, perfil_id, seccion):
+    return f"cv:fragmentos:{plantilla}:{perfil_id}:{seccion}"
+
+
+def version_seccion(perfil_id, seccion):
+    """
+    Versión actual de los datos de la sección. Si se perdió de la caché se
+    crea una nueva: los fragmentos guardados con la anterior quedan vencidos.
+    """
+    key = _version_key(perfil_id, seccion)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def fragmentos_pendientes(perfil_id, secciones=SECCIONES_FRAGMENTO):
+    """Secciones que hay que renderizar (sin fragmento vigente): las que conviene precargar."""
+    return set(secciones) - fragmentos_vigentes(perfil_id, secciones)
+
+
+def fragmentos_vigentes(perfil_id, secciones, plantilla=None):
+    """Nombres de las secciones cuyo fragmento está en caché y vigente."""
+    if perfil_id is None:
+        return set()
+    claves = {
+        seccion: (
+            _fragmento_key(plantilla or PLANTILLA_SECCION.format(seccion), perfil_id, seccion),
+            _version_key(perfil_id, seccion),
+        )
+        for seccion in secciones
+    }
+    valores = cache.get_many([key for par in claves.values() for key in par])
+    ahora = time.time()
+    vigentes = set()
+    for seccion, (fragmento_key, version_key) in claves.items():
+        entrada = valores.get(fragmento_key)
+        if entrada and entrada["version"] == valores.get(version_key) and ahora < entrada["vence"]:
+            vigentes.add(seccion)
+    return vigentes
+
+
+def invalidar_seccion(perfil_id, seccion):
+    cache.set(_version_key(perfil_id, seccion), time.time_ns(), None)
+
+
+@lru_cache(maxsize=None)
+def secciones_por_modelo():
+    """{modelo: [(sección, atributo del FK al perfil)]} según SECCIONES."""
+    mapa = {}
+    for seccion in SECCIONES:
+        relacion = DatosPersonales._meta.get_field(seccion.related_name)
+        mapa.setdefault(relacion.related_model, []).append((seccion.nombre, relacion.field.attname))
+    return mapa
+
+
+def render_fragmento(perfil, seccion, datos, plantilla=None):
+    """
+    HTML de la sección: el de la caché si está vigente; si no, se renderiza
+    (o se devuelve el vencido mientras otro request lo regenera).
+    """
+    plantilla = plantilla or PLANTILLA_SECCION.format(seccion)
+    if perfil is None:
+        return render_to_string(plantilla, {seccion: datos})
+
+    key = _fragmento_key(plantilla, perfil.pk, seccion)
+    version = version_seccion(perfil.pk, seccion)
+    entrada = cache.get(key)
+    if entrada and entrada["version"] == version and time.time() < entrada["vence"]:
+        return entrada["html"]
+
+    lock_key = f"{key}:lock"
+    bloqueado = cache.add(lock_key, 1, getattr(settings, "FRAGMENTOS_LOCK_TIMEOUT", 30))
+    if entrada and not bloqueado:
+        # otro request lo está regenerando: se sirve el anterior
+        return entrada["html"]
+
+    try:
+        html = render_to_string(plantilla, {"perfil": perfil, seccion: datos})
+        cache.set(
+            key,
+            {"version": version, "html": html, "vence": time.time() + _ttl()},
+            _ttl() + getattr(settings, "FRAGMENTOS_STALE_TTL", 86400),
+        )
+        return html
+    finally:
+        if bloqueado:
+            cache.delete(lock_key)
@@ -0,0 +1,117 @@
+# cv/garage_catalogo.py - Catálogo de la venta garage paginado por cursor
+
+"""
+La página de venta garage muestra los productos de a GARAGE_PAGE_SIZE,
+del más nuevo al más viejo, con paginación por cursor (keyset): la página
+siguiente pide `idventagarage < cursor` en vez de usar OFFSET, así cada
+página cuesta lo mismo aunque el catálogo tenga miles de productos.
+
+Filtros de la URL (se combinan entre sí y con el cursor):
+
+- disponible=1|0
+- estado=<estadoproducto> (uno de ESTADOS)
+- precio_min / precio_max: rango de valordelbien
+
+Cada filtro tiene su índice parcial en VentaGarage (solo filas visibles,
+ver cv/models.py). /garage/pagina/ devuelve las páginas siguientes como
+fragmento HTML en JSON para el scroll infinito.
+"""
+
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+from django.conf import settings
+
+from .models import VentaGarage
+
+# valores de estadoproducto que la plantilla distingue
+ESTADOS = ("Disponible", "Reservado", "Vendido")
+
+# tope del tamaño de página pedido con ?tamano=
+TAMANO_MAXIMO = 100
+
+
+def _tamano_pagina():
+    return getattr(settings, "GARAGE_PAGE_SIZE", 24)
+
+
+def _decimal(valor):
+    try:
+        numero = Decimal(valor)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return numero if numero.is_finite() and numero >= 0 else None
+
+
+def _entero(valor):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if numero > 0 else None
+
+
+def filtros_desde_request(request):
+    """
+    Filtros válidos de la URL como {parámetro: valor en texto}; los
+    valores que no se entienden se ignoran.
+    """
+    filtros = {}
+    disponible = request.GET.get("disponible")
+    if disponible in ("1", "0"):
+        filtros["disponible"] = disponible
+    estado = request.GET.get("estado")
+    if estado in ESTADOS:
+        filtros["estado"] = estado
+    for parametro in ("precio_min", "precio_max"):
+        precio = _decimal(request.GET.get(parametro))
+        if precio is not None:
+            filtros[parametro] = str(precio)
+    return filtros
+
+
+def cursor_desde_request(request):
+    return _entero(request.GET.get("cursor"))
+
+
+def tamano_desde_request(request):
+    tamano = _entero(request.GET.get("tamano"))
+    return min(tamano, TAMANO_MAXIMO) if tamano else _tamano_pagina()
+
+
+def querystring(filtros, **extra):
+    """Query string de los filtros (más cursor u otros parámetros)."""
+    parametros = dict(filtros)
+    parametros.update({clave: valor for clave, valor in extra.items() if valor is not None})
+    return urlencode(parametros)
+
+
+def productos_garage(perfil, filtros=None):
+    """Productos visibles del perfil con los filtros, del más nuevo al más viejo."""
+    filtros = filtros or {}
+    qs = VentaGarage.objects.filter(idperfilconqueestaactivo=perfil, activarparaqueseveaenfront=True)
+    if "disponible" in filtros:
+        qs = qs.filter(disponible=filtros["disponible"] == "1")
+    if "estado" in filtros:
+        qs = qs.filter(estadoproducto=filtros["estado"])
+    if "precio_min" in filtros:
+        qs = qs.filter(valordelbien__gte=Decimal(filtros["precio_min"]))
+    if "precio_max" in filtros:
+        qs = qs.filter(valordelbien__lte=Decimal(filtros["precio_max"]))
+    return qs.order_by("-idventagarage")
+
+
+def pagina_garage(perfil, filtros=None, cursor=None, tamano=None):
+    """
+    Una página del catálogo: (productos, cursor de la siguiente o None).
+    Una sola consulta: se pide un producto de más para saber si hay otra página.
+    """
+    tamano = tamano or _tamano_pagina()
+    qs = productos_garage(perfil, filtros)
+    if cursor is not None:
+        qs = qs.filter(idventagarage__lt=cursor)
+    productos = list(qs[:tamano + 1])
+    if len(productos) > tamano:
+        productos = productos[:tamano]
+        return productos, productos[-1].idventagarage
+    return productos, None
@@ -0,0 +1,211 @@
+# cv/image_derivatives.py - Versiones reducidas de las fotos (garage y perfil)
+
+"""
+Genera con Pillow versiones más livianas de las imágenes subidas
+(varios anchos, formatos modernos como WebP/AVIF) y las guarda junto al
+original en el almacenamiento.
+
+Nombre de cada derivada: "garage/productos/foto.jpg" -> "garage/productos/foto.jpg__w640.webp"
+(con la extensión del original: foto.jpg y foto.png no comparten derivadas)
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageOps, features
+
+from .file_metadata import obtener_metadatos
+from .storage_backends import AzureFileProxy, open_file_source, save_derived_file
+
+# Campos de imagen por modelo (file_type de serve_protected_file)
+IMAGE_FIELDS = {
+    "perfil": ("foto",),
+    "garage": ("foto", "foto2", "foto3"),
+}
+
+_FORMATS = {
+    # formato pedido -> (formato Pillow, content-type)
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+def supported_formats():
+    """Formatos configurados que la instalación de Pillow puede escribir."""
+    out = []
+    for fmt in getattr(settings, "IMAGE_DERIVATIVE_FORMATS", ["webp"]):
+        if fmt == "jpeg" or (fmt in _FORMATS and features.check(fmt)):
+            out.append(fmt)
+    return out
+
+
+def normalize_width(width):
+    """
+    Ajusta el ancho pedido al ancho configurado más cercano por arriba,
+    así no se puede pedir una cantidad ilimitada de tamaños distintos.
+    """
+    widths = sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [640]))
+    try:
+        width = int(width)
+    except (TypeError, ValueError):
+        return None
+    if width <= 0 or not widths:
+        return None
+    for w in widths:
+        if w >= width:
+            return w
+    return widths[-1]
+
+
+def derivative_name(blob_ref, width, fmt):
+    name = AzureFileProxy._normalize_blob_name(blob_ref)
+    return f"{name}__w{width}.{fmt}"
+
+
+def _cache_key(blob_ref, version, width, fmt):
+    # con la versión del original: si se reemplaza, la clave cambia
+    digest = hashlib.sha1(f"{blob_ref}\0{version}\0{width}\0{fmt}".encode("utf-8")).hexdigest()
+    return f"img:derivative:{digest}"
+
+
+def _version_original(blob_ref):
+    """
+    (registro del original, versión): ETag o sha256 de MetadatosArchivo.
+    Sin registro se abre la fuente solo para leer su ETag.
+    """
+    meta = obtener_metadatos(AzureFileProxy._normalize_blob_name(blob_ref))
+    if meta is not None:
+        return meta, meta.etag or meta.sha256 or meta.fecha_registro.isoformat()
+    source = open_file_source(blob_ref)
+    source.close()
+    return None, source.etag
+
+
+def _derivada_vigente(derived_ref, meta_original):
+    """True si la derivada ya existe y se generó después de registrar el original."""
+    meta = obtener_metadatos(derived_ref)
+    if meta is None:
+        return False
+    return meta_original is None or meta.fecha_registro >= meta_original.fecha_registro
+
+
+_locks_guard = threading.Lock()
+_locks = {}
+
+
+def _lock_local(cache_key):
+    """Lock del proceso para una derivada (pocas claves: fotos x anchos x formatos)."""
+    with _locks_guard:
+        return _locks.setdefault(cache_key, threading.Lock())
+
+
+def render_derivative(data: bytes, width: int, fmt: str) -> bytes:
+    """Redimensiona (sin agrandar) y convierte la imagen al formato pedido."""
+    pillow_format, _content_type = _FORMATS[fmt]
+    quality = getattr(settings, "IMAGE_DERIVATIVE_QUALITY", 80)
+
+    with Image.open(io.BytesIO(data)) as img:
+        # Image.open solo leyó el encabezado: se rechaza antes de decodificar
+        # (evita bombas de descompresión sin tocar el límite global de Pillow)
+        max_pixels = getattr(settings, "IMAGE_DERIVATIVE_MAX_PIXELS", 50_000_000)
+        if img.width * img.height > max_pixels:
+            raise ValueError(f"Imagen demasiado grande: {img.width}x{img.height} píxeles")
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        if pillow_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+
+        out = io.BytesIO()
+        img.save(out, format=pillow_format, quality=quality)
+        return out.getvalue()
+
+
+def get_or_create_derivative(blob_ref, width, fmt):
+    """
+    Devuelve la referencia de la derivada (creándola si todavía no existe
+    o si el original cambió). El resultado se memoriza en la caché
+    compartida, con la versión del original en la clave.
+
+    Una sola petición la genera: lock por clave en el proceso y candado
+    con cache.add entre procesos. Las demás esperan hasta
+    IMAGE_DERIVATIVE_LOCK_TIMEOUT y, si sigue sin estar, reciben el original.
+    """
+    meta, version = _version_original(blob_ref)
+    cache_key = _cache_key(blob_ref, version, width, fmt)
+    derived_ref = cache.get(cache_key)
+    if derived_ref:
+        return derived_ref
+
+    timeout = getattr(settings, "IMAGE_DERIVATIVE_LOCK_TIMEOUT", 30)
+    deadline = time.monotonic() + timeout
+    lock = _lock_local(cache_key)
+    if not lock.acquire(timeout=timeout):
+        return blob_ref
+    try:
+        lock_key = f"{cache_key}:lock"
+        while not cache.add(lock_key, 1, timeout):
+            # otro proceso la está generando
+            if time.monotonic() >= deadline:
+                return blob_ref
+            time.sleep(0.1)
+        try:
+            derived_ref = cache.get(cache_key)
+            if derived_ref:
+                return derived_ref
+
+            derived_ref = derivative_name(blob_ref, width, fmt)
+            if not _derivada_vigente(derived_ref, meta):
+                source = open_file_source(blob_ref)
+                try:
+                    original = b"".join(source.iter_range())
+                finally:
+                    source.close()
+                data = render_derivative(original, width, fmt)
+                save_derived_file(blob_ref, derived_ref, data, _FORMATS[fmt][1])
+
+            cache.set(cache_key, derived_ref, None)
+            return derived_ref
+        finally:
+            cache.delete(lock_key)
+    finally:
+        lock.release()
+
+
+def generate_all_derivatives(blob_ref):
+    """Crea todas las combinaciones ancho x formato configuradas."""
+    for fmt in supported_formats():
+        for width in getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", []):
+            try:
+                get_or_create_derivative(blob_ref, width, fmt)
+            except Exception as e:
+                print(f"Error generando derivada {width}/{fmt} de {blob_ref}: {e}")
+
+
+_executor_lock = threading.Lock()
+_executor_state = {"pid": None, "executor": None}
+
+
+def schedule_derivatives(blob_refs):
+    """Genera las derivadas en segundo plano (no demora el guardado en admin)."""
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor_state["executor"] is None or _executor_state["pid"] != pid:
+            _executor_state["executor"] = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="img-derivatives"
+            )
+            _executor_state["pid"] = pid
+        executor = _executor_state["executor"]
+
+    for blob_ref in blob_refs:
+        executor.submit(generate_all_derivatives, blob_ref)
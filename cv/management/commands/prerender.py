@@ -0,0 +1,34 @@
+# cv/management/commands/prerender.py - Pre-renderiza las páginas públicas
+
+"""
+python manage.py prerender
+
+Renderiza el CV y la venta garage (combinaciones de cv.prerender.PAGINAS)
+a archivos HTML con hash en PRERENDER_DIR y publica el manifest. Las
+vistas los sirven a los visitantes anónimos mientras el snapshot del CV no
+cambie; después de cada edición en el admin se regeneran solos.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cv.prerender import prerenderizar_todo
+
+
+class Command(BaseCommand):
+    help = "Pre-renderiza las páginas públicas (CV y venta garage)"
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "PRERENDER_ENABLED", True):
+            self.stdout.write("PRERENDER_ENABLED=False: no se generan páginas")
+            return
+
+        started = time.perf_counter()
+        paginas = prerenderizar_todo()
+        for clave, archivo in sorted(paginas.items()):
+            self.stdout.write(f"  {clave:<24} {archivo}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(paginas)} páginas pre-renderizadas en {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,149 @@
+# cv/management/commands/warmup.py - Precalienta cachés después de un deploy
+
+"""
+python manage.py warmup [--workers 8] [--skip-media] [--skip-derivatives] [--skip-pages]
+
+1. Recorre todos los archivos referenciados por DatosPersonales,
+   ExperienciaLaboral, CursosRealizados, Reconocimientos y VentaGarage y
+   los abre con open_file_source: queda registrada la ubicación/metadatos
+   y, con Azure, se leen completos para dejar la copia en la caché local
+   de blobs (los que superan BLOB_CACHE_MAX_ITEM_BYTES no se descargan).
+2. Genera las versiones reducidas de las fotos (perfil y garage).
+3. Renderiza hoja_vida, print_preview_improved y garage (configuración de
+   visibilidad, snapshot y fragmentos en la caché compartida).
+
+Informa los tiempos de cada etapa. Pensado para build.sh o un hook
+post-deploy; un archivo que falla no detiene el resto.
+
+Corre en su propio proceso, así que solo calienta lo que queda en disco o
+en la BD. Las plantillas compiladas, el cliente de Azure y el circuit
+breaker son de cada worker de gunicorn: los calienta calentar_worker()
+(cv/warmup.py) desde post_worker_init en gunicorn.conf.py.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+
+from cv.image_derivatives import IMAGE_FIELDS, generate_all_derivatives
+from cv.models import (
+    CursosRealizados,
+    DatosPersonales,
+    ExperienciaLaboral,
+    Reconocimientos,
+    VentaGarage,
+)
+from cv.storage_backends import open_file_source
+from cv.warmup import calentar_paginas
+
+WARMUP_MODELS = {
+    "perfil": DatosPersonales,
+    "experiencia": ExperienciaLaboral,
+    "curso": CursosRealizados,
+    "reconocimiento": Reconocimientos,
+    "garage": VentaGarage,
+}
+
+def file_references():
+    """(file_type, campo, nombre del archivo) de todos los archivos cargados."""
+    refs = []
+    for file_type, model in WARMUP_MODELS.items():
+        file_fields = [f.name for f in model._meta.get_fields() if isinstance(f, models.FileField)]
+        for values in model.objects.values_list(*file_fields):
+            for field_name, name in zip(file_fields, values):
+                if name:
+                    refs.append((file_type, field_name, name))
+    return refs
+
+
+class Command(BaseCommand):
+    help = "Precalienta las cachés de archivos y páginas (ejecutar después de cada deploy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Hilos para los archivos (default 8)")
+        parser.add_argument("--skip-media", action="store_true", help="No precargar archivos")
+        parser.add_argument("--skip-derivatives", action="store_true", help="No generar miniaturas")
+        parser.add_argument("--skip-pages", action="store_true", help="No renderizar páginas")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        # el mismo archivo puede estar en varios registros: se precarga una vez
+        refs = list({ref[2]: ref for ref in file_references()}.values())
+        self.stdout.write(f"Archivos referenciados: {len(refs)}")
+
+        missing = set()
+        if not options["skip_media"]:
+            missing = self._run_parallel("Archivos", refs, self._warm_file, options["workers"])
+
+        if not options["skip_derivatives"]:
+            images = [r for r in refs if r[1] in IMAGE_FIELDS.get(r[0], ()) and r[2] not in missing]
+            self._run_parallel("Miniaturas", images, self._warm_derivatives, options["workers"])
+
+        if not options["skip_pages"]:
+            self._warm_pages()
+
+        total = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Warm-up completado en {total:.2f}s"))
+
+    # ---------- archivos ----------
+    @staticmethod
+    def _timed(task, ref):
+        t0 = time.perf_counter()
+        try:
+            task(ref)
+            return ref, time.perf_counter() - t0, None
+        except Exception as e:
+            return ref, time.perf_counter() - t0, e
+        finally:
+            # cada hilo usa su propia conexión a la BD
+            connection.close()
+
+    @staticmethod
+    def _warm_file(ref):
+        source = open_file_source(ref[2])
+        try:
+            # blob de Azure que no estaba en la caché local: la lectura
+            # completa (tee / stream_fill) deja la copia en disco
+            blob_cache = getattr(source, "blob_cache", None)
+            if blob_cache is not None and source.size is not None and source.size <= blob_cache.max_item_bytes:
+                for _chunk in source.iter_range():
+                    pass
+        finally:
+            # copia local (o MEDIA_ROOT): se cierra el descriptor que abrió la fuente
+            fh = getattr(source, "_fh", None)
+            if fh is not None:
+                fh.close()
+
+    @staticmethod
+    def _warm_derivatives(ref):
+        generate_all_derivatives(ref[2])
+
+    def _run_parallel(self, label, refs, task, workers):
+        """Ejecuta task sobre cada referencia; retorna los nombres que fallaron."""
+        if not refs:
+            self.stdout.write(f"{label}: nada que precargar")
+            return set()
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="warmup") as executor:
+            results = list(executor.map(lambda r: self._timed(task, r), refs))
+        elapsed = time.perf_counter() - t0
+
+        errors = [(ref, e) for ref, _t, e in results if e is not None]
+        for (file_type, field_name, name), e in errors:
+            self.stdout.write(self.style.WARNING(f"  ✗ {file_type}.{field_name} {name}: {e}"))
+
+        slowest = max(results, key=lambda r: r[1])
+        self.stdout.write(
+            f"{label}: {len(refs) - len(errors)}/{len(refs)} ok en {elapsed:.2f}s "
+            f"(más lento: {slowest[0][2]} {slowest[1]:.2f}s)"
+        )
+        return {ref[2] for ref, _e in errors}
+
+    # ---------- páginas ----------
+    def _warm_pages(self):
+        for name, status, elapsed in calentar_paginas():
+            self.stdout.write(f"Página {name}: {status} en {elapsed:.2f}s")
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0005_ventagarage_foto2_ventagarage_foto3'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetadatosArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=255, unique=True)),
+                ('contenedor', models.CharField(blank=True, default='', max_length=63)),
+                ('blob', models.CharField(blank=True, default='', max_length=255)),
+                ('tamano', models.BigIntegerField(verbose_name='Tamaño (bytes)')),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('etag', models.CharField(blank=True, default='', max_length=100)),
+                ('sha256', models.CharField(blank=True, default='', max_length=64)),
+                ('ancho', models.PositiveIntegerField(blank=True, null=True)),
+                ('alto', models.PositiveIntegerField(blank=True, null=True)),
+                ('fecha_modificacion', models.DateTimeField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Metadatos de Archivo',
+                'verbose_name_plural': 'Metadatos de Archivos',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0006_metadatosarchivo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datospersonales',
+            index=models.Index(condition=models.Q(('perfilactivo', 1)), fields=['idperfil'], name='datospersonales_activo_idx'),
+        ),
+    ]
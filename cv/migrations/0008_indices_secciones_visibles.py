@@ -0,0 +1,37 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0007_datospersonales_activo_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cursosrealizados',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', '-fechafin'], name='curso_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='experiencialaboral',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', '-fechafingestion'], name='experiencia_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productosacademicos',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', 'idproductoacademico'], name='prodacad_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoslaborales',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', '-fechaproducto'], name='prodlab_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reconocimientos',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', '-fechareconocimiento'], name='reconocimiento_visible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventagarage',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', '-idventagarage'], name='garage_visible_idx'),
+        ),
+    ]
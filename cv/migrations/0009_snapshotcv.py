@@ -0,0 +1,28 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:33
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0008_indices_secciones_visibles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotCV',
+            fields=[
+                ('perfil', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='cv.datospersonales')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('fecha_generacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot del CV',
+                'verbose_name_plural': 'Snapshots del CV',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.10 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cv', '0009_snapshotcv'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ventagarage',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True), ('disponible', True)), fields=['idperfilconqueestaactivo', '-idventagarage'], name='garage_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventagarage',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True), ('disponible', False)), fields=['idperfilconqueestaactivo', '-idventagarage'], name='garage_no_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventagarage',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', 'estadoproducto', '-idventagarage'], name='garage_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ventagarage',
+            index=models.Index(condition=models.Q(('activarparaqueseveaenfront', True)), fields=['idperfilconqueestaactivo', 'valordelbien'], name='garage_precio_idx'),
+        ),
+    ]
@@ -2,6 +2,7 @@
 from datetime import date
 
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -102,6 +103,14 @@ class DatosPersonales(models.Model):
     class Meta:
         verbose_name = "Datos personales"
         verbose_name_plural = "Datos personales"
+        indexes = [
+            # solo las filas activas: la búsqueda del perfil activo no recorre la tabla
+            models.Index(
+                fields=["idperfil"],
+                condition=models.Q(perfilactivo=1),
+                name="datospersonales_activo_idx",
+            ),
+        ]
 
 
 # ==================== MODELO: ExperienciaLaboral ====================
@@ -139,6 +148,16 @@ class ExperienciaLaboral(models.Model):
         upload_to="experiencia/certificados/", blank=True, null=True
     )
 
+    class Meta:
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-fechafingestion"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="experiencia_visible_idx",
+            ),
+        ]
+
     def clean(self):
         """🚫 VALIDACIÓN BLOQUEANTE"""
         super().clean()
@@ -208,6 +227,16 @@ class Reconocimientos(models.Model):
         upload_to="reconocimientos/evidencias/", blank=True, null=True
     )
 
+    class Meta:
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-fechareconocimiento"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="reconocimiento_visible_idx",
+            ),
+        ]
+
     def clean(self):
         """🚫 VALIDACIÓN BLOQUEANTE"""
         super().clean()
@@ -267,6 +296,16 @@ class CursosRealizados(models.Model):
         upload_to="cursos/certificados/", blank=True, null=True
     )
 
+    class Meta:
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-fechafin"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="curso_visible_idx",
+            ),
+        ]
+
     def clean(self):
         """🚫 VALIDACIÓN BLOQUEANTE - IMPIDE GUARDAR CURSOS CON FECHAS INVÁLIDAS"""
         super().clean()
@@ -331,6 +370,16 @@ class ProductosAcademicos(models.Model):
 
     activarparaqueseveaenfront = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "idproductoacademico"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="prodacad_visible_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.nombrerecurso or "Producto académico"
 
@@ -352,6 +401,16 @@ class ProductosLaborales(models.Model):
 
     activarparaqueseveaenfront = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-fechaproducto"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="prodlab_visible_idx",
+            ),
+        ]
+
     def clean(self):
         """🚫 VALIDACIÓN BLOQUEANTE"""
         super().clean()
@@ -404,6 +463,38 @@ class VentaGarage(models.Model):
         verbose_name = "Producto en Venta"
         verbose_name_plural = "Productos en Venta"
         ordering = ["-idventagarage"]
+        indexes = [
+            # filtro + orden de la sección (cv/secciones.py), solo filas visibles
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-idventagarage"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="garage_visible_idx",
+            ),
+            # filtros del catálogo (cv/garage_catalogo.py); con el cursor
+            # sobre idventagarage cada página lee solo sus filas.
+            # disponible es booleano: un índice parcial por valor (Django lo
+            # filtra como "WHERE disponible", sin "= true")
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-idventagarage"],
+                condition=models.Q(activarparaqueseveaenfront=True, disponible=True),
+                name="garage_disponible_idx",
+            ),
+            models.Index(
+                fields=["idperfilconqueestaactivo", "-idventagarage"],
+                condition=models.Q(activarparaqueseveaenfront=True, disponible=False),
+                name="garage_no_disponible_idx",
+            ),
+            models.Index(
+                fields=["idperfilconqueestaactivo", "estadoproducto", "-idventagarage"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="garage_estado_idx",
+            ),
+            models.Index(
+                fields=["idperfilconqueestaactivo", "valordelbien"],
+                condition=models.Q(activarparaqueseveaenfront=True),
+                name="garage_precio_idx",
+            ),
+        ]
 
     def get_fotos(self):
         """Retorna lista de fotos disponibles"""
@@ -494,3 +585,62 @@ class ConfiguracionVisibilidad(models.Model):
     def contar_secciones_activas(self):
         """Retorna la cantidad de secciones activas"""
         return sum(1 for v in self.get_secciones_activas().values() if v)
+
+
+# ==================== MODELO: MetadatosArchivo ====================
+class MetadatosArchivo(models.Model):
+    """
+    Metadatos de cada archivo subido (Azure o MEDIA_ROOT).
+    Se registran al guardar el archivo, así servirlo no requiere
+    consultar las propiedades del blob ni buscarlo entre contenedores.
+    """
+
+    # valor guardado en el FileField/ImageField
+    nombre = models.CharField(max_length=255, unique=True)
+    # ubicación real en Azure (vacío con almacenamiento local)
+    contenedor = models.CharField(max_length=63, blank=True, default="")
+    blob = models.CharField(max_length=255, blank=True, default="")
+
+    tamano = models.BigIntegerField(verbose_name="Tamaño (bytes)")
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    etag = models.CharField(max_length=100, blank=True, default="")
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+    ancho = models.PositiveIntegerField(blank=True, null=True)
+    alto = models.PositiveIntegerField(blank=True, null=True)
+    fecha_modificacion = models.DateTimeField(blank=True, null=True)
+
+    fecha_registro = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Metadatos de Archivo"
+        verbose_name_plural = "Metadatos de Archivos"
+
+    def __str__(self):
+        return self.nombre
+
+
+# ==================== MODELO: SnapshotCV ====================
+class SnapshotCV(models.Model):
+    """
+    Documento JSON con todo el CV de un perfil (perfil, configuración de
+    visibilidad y las secciones visibles, con duraciones y URLs ya
+    calculadas). Lo reconstruyen las señales al guardar o borrar cualquier
+    modelo del CV; las vistas lo leen con una sola consulta por clave.
+    """
+
+    perfil = models.OneToOneField(
+        DatosPersonales,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="snapshot",
+    )
+    version = models.PositiveIntegerField(default=1)
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    fecha_generacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Snapshot del CV"
+        verbose_name_plural = "Snapshots del CV"
+
+    def __str__(self):
+        return f"Snapshot v{self.version} de {self.perfil_id}"
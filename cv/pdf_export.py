@@ -0,0 +1,98 @@
+# cv/pdf_export.py - CV en PDF generado en el servidor
+
+"""
+hoja_vida?download=1 devuelve el CV en PDF (templates/cv/hoja_vida_pdf.html
+renderizada con xhtml2pdf, Python puro: no necesita navegador ni servicios
+externos).
+
+Cada PDF se guarda en la caché local de blobs con una clave derivada de
+la versión del snapshot del perfil (cambia con cualquier edición del CV)
+y de la combinación de secciones pedida en la URL:
+
+- descargas repetidas no vuelven a renderizar (X-Cache: HIT);
+- ETag = esa clave: 304 en las revalidaciones y soporte de Range;
+- si muchas peticiones piden el mismo PDF a la vez, se genera una sola vez
+  (BlobDiskCache.fill).
+
+Si xhtml2pdf no está instalado, hoja_vida sigue devolviendo el HTML.
+"""
+
+import hashlib
+import io
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .blob_cache import get_blob_cache
+from .file_responses import build_file_response
+from .snapshot import obtener_cv, secciones_visibles, version_snapshot
+from .storage_backends import LocalFileSource
+
+try:
+    from xhtml2pdf import pisa
+except ImportError:  # dependencia opcional
+    pisa = None
+
+PDF_CONTAINER = "pdf"
+PLANTILLA_PDF = "cv/hoja_vida_pdf.html"
+
+# se incrementa al cambiar la plantilla: los PDF anteriores dejan de usarse
+FORMATO_PDF = 1
+
+
+def pdf_disponible():
+    return pisa is not None
+
+
+def pdf_etag(perfil_id, version, sections_config):
+    combinacion = ",".join(f"{clave}={int(bool(valor))}" for clave, valor in sorted(sections_config.items()))
+    digest = hashlib.sha256(f"{FORMATO_PDF}|{perfil_id}|{version}|{combinacion}".encode("utf-8")).hexdigest()
+    return quote_etag(digest[:32])
+
+
+def renderizar_pdf(context):
+    """Bytes del PDF con la plantilla de impresión."""
+    html = render_to_string(PLANTILLA_PDF, context)
+    salida = io.BytesIO()
+    resultado = pisa.CreatePDF(html, dest=salida, encoding="utf-8")
+    if resultado.err:
+        raise ValueError(f"xhtml2pdf no pudo generar el PDF ({resultado.err} errores)")
+    return salida.getvalue()
+
+
+def pdf_response(request, perfil, config, sections_config):
+    """Respuesta con el PDF del CV (de la caché si ya se generó esta versión)."""
+    version = version_snapshot(perfil.pk)
+    if version is None:
+        # todavía no hay snapshot: se crea ahora
+        cv = obtener_cv(perfil.pk)
+        version = cv["version"] if cv else 0
+
+    etag = pdf_etag(perfil.pk, version, sections_config)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    def generar():
+        cv = obtener_cv(perfil.pk)
+        context = {
+            "perfil": cv["perfil"] if cv else perfil,
+            "config": config,
+            "sections_config": sections_config,
+            **secciones_visibles(cv, config, sections_config),
+        }
+        return [renderizar_pdf(context)]
+
+    blob_cache = get_blob_cache()
+    if blob_cache is None:
+        response = HttpResponse(generar()[0], content_type="application/pdf")
+        response["ETag"] = etag
+        return response
+
+    entry, generado = blob_cache.fill(PDF_CONTAINER, f"cv-{perfil.pk}.pdf", etag, generar, "application/pdf")
+    source = LocalFileSource.from_cache(entry)
+    source.cache_status = "MISS" if generado else "HIT"
+    return build_file_response(request, source, "application/pdf")
@@ -0,0 +1,63 @@
+# cv/perfil_activo.py - Perfil activo del sitio (perfilactivo=1)
+
+"""
+Todas las vistas públicas muestran el perfil activo. En vez de consultar
+DatosPersonales.objects.filter(perfilactivo=1).first() en cada request,
+el perfil se resuelve aquí:
+
+- en la caché compartida (PERFIL_ACTIVO_CACHE_TTL), también cuando no hay
+  ningún perfil activo;
+- memorizado en el request, para que la vista y los template tags usen
+  el mismo objeto.
+
+Las señales de cv/signals.py invalidan la caché al guardar o borrar
+cualquier DatosPersonales (puede cambiar cuál es el activo).
+La consulta usa el índice parcial datospersonales_activo_idx.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import DatosPersonales
+
+CACHE_KEY = "perfil:activo"
+
+# se cachea también "no hay perfil activo" (None no se distingue de un miss)
+_SIN_PERFIL = 0
+
+
+def _cargar_perfil_activo():
+    return DatosPersonales.objects.filter(perfilactivo=1).order_by("idperfil").first()
+
+
+def invalidar_cache_perfil_activo():
+    cache.delete(CACHE_KEY)
+
+
+def obtener_perfil_activo(request=None):
+    """
+    Perfil activo (o None si no hay). Con request, se resuelve una sola
+    vez por request.
+    """
+    if request is not None and hasattr(request, "_perfil_activo"):
+        return request._perfil_activo
+
+    perfil = cache.get(CACHE_KEY)
+    if perfil is None:
+        perfil = _cargar_perfil_activo()
+        cache.set(
+            CACHE_KEY,
+            perfil if perfil is not None else _SIN_PERFIL,
+            getattr(settings, "PERFIL_ACTIVO_CACHE_TTL", 3600),
+        )
+    elif perfil == _SIN_PERFIL:
+        perfil = None
+
+    if request is not None:
+        request._perfil_activo = perfil
+    return perfil
+
+
+def obtener_perfil_activo_id(request=None):
+    perfil = obtener_perfil_activo(request)
+    return perfil.pk if perfil is not None else None
@@ -0,0 +1,270 @@
+# cv/prerender.py - Páginas públicas pre-renderizadas
+
+"""
+Las páginas públicas (CV y venta garage) solo cambian cuando alguien edita
+en el admin, así que se renderizan de antemano a archivos HTML:
+
+- `python manage.py prerender` (build.sh) y, después de cada cambio en un
+  modelo del CV, un hilo en segundo plano (señales de cv/signals.py)
+  renderizan las combinaciones de PAGINAS con las mismas vistas.
+- Cada archivo se nombra con el hash de su contenido
+  (PRERENDER_DIR/<pagina>.<hash>.html) y manifest.json indica cuál
+  corresponde a cada página/combinación, con qué perfil y con qué versión
+  del snapshot (cv/snapshot.py) se generó.
+- Las vistas sirven el archivo a los visitantes anónimos si la versión
+  sigue vigente (ETag = hash, 304 en las revalidaciones); si el snapshot
+  cambió o la combinación no está pre-renderizada, se renderiza como siempre.
+
+Los archivos se escriben en tiempo de ejecución, así que no pueden pasar
+por WhiteNoise (indexa STATIC_ROOT solo al arrancar): los sirve la vista.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.http import FileResponse, HttpRequest, QueryDict
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .perfil_activo import obtener_perfil_activo_id
+from .snapshot import reconstruir_snapshot, version_snapshot
+
+# página -> (ruta, combinaciones de parámetros GET que se pre-renderizan)
+PAGINAS = {
+    "hoja_vida": ("/", ({}, {"preview": "1"})),
+    "garage": ("/garage/", ({},)),
+}
+
+MANIFEST = "manifest.json"
+
+
+def _directorio():
+    return os.fspath(getattr(settings, "PRERENDER_DIR"))
+
+
+def _habilitado():
+    return getattr(settings, "PRERENDER_ENABLED", True)
+
+
+def clave_combinacion(parametros):
+    """Clave estable de los parámetros GET ("" sin parámetros)."""
+    return urlencode(sorted((k, v) for k, v in parametros.items()))
+
+
+# ---------- manifest ----------
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {"mtime": None, "datos": {}}
+
+
+def leer_manifest():
+    """Manifest actual (se relee solo si el archivo cambió)."""
+    path = os.path.join(_directorio(), MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    with _manifest_lock:
+        if _manifest_cache["mtime"] != mtime:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    _manifest_cache["datos"] = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error leyendo manifest de páginas pre-renderizadas: {e}")
+                _manifest_cache["datos"] = {}
+            _manifest_cache["mtime"] = mtime
+        return _manifest_cache["datos"]
+
+
+def _escribir_atomico(path, data):
+    directorio = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directorio, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+# ---------- generación ----------
+
+def request_interna(ruta, parametros=None):
+    """
+    GET anónimo armado a mano para renderizar una vista fuera de un
+    request real (pre-render y warm-up de cv/warmup.py).
+    """
+    host = next((h for h in settings.ALLOWED_HOSTS if h and not h.startswith((".", "*"))), "localhost")
+    query = urlencode(parametros or {})
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = ruta
+    request.GET = QueryDict(query)
+    request.META.update({
+        "REQUEST_METHOD": "GET",
+        "QUERY_STRING": query,
+        "HTTP_HOST": host,
+        "SERVER_NAME": host,
+        "SERVER_PORT": "443",
+        "wsgi.url_scheme": "https",
+    })
+    request.user = AnonymousUser()
+    return request
+
+
+def _renderizar(nombre, ruta, parametros):
+    from . import views
+
+    vista = {"hoja_vida": views.hoja_vida, "garage": views.garage}[nombre]
+    request = request_interna(ruta, parametros)
+    request._prerender = True
+    response = vista(request)
+    if response.status_code != 200 or getattr(response, "streaming", False):
+        return None
+    return response.content
+
+
+def prerenderizar_todo():
+    """
+    Renderiza todas las páginas/combinaciones y publica el manifest.
+    Retorna {página?combinación: archivo}.
+    """
+    directorio = _directorio()
+    os.makedirs(directorio, exist_ok=True)
+
+    perfil_id = obtener_perfil_activo_id()
+    # versión leída antes de renderizar: si cambia mientras tanto, las
+    # páginas quedan vencidas y se vuelven a generar
+    version = version_snapshot(perfil_id)
+    if version is None and perfil_id is not None:
+        reconstruir_snapshot(perfil_id)
+        version = version_snapshot(perfil_id)
+
+    entradas = {}
+    for nombre, (ruta, combinaciones) in PAGINAS.items():
+        for parametros in combinaciones:
+            try:
+                html = _renderizar(nombre, ruta, parametros)
+            except Exception as e:
+                print(f"Error pre-renderizando {nombre} {parametros}: {e}")
+                continue
+            if html is None:
+                continue
+            digest = hashlib.sha256(html).hexdigest()[:20]
+            archivo = f"{nombre}.{digest}.html"
+            path = os.path.join(directorio, archivo)
+            if not os.path.exists(path):
+                _escribir_atomico(path, html)
+            entradas[f"{nombre}?{clave_combinacion(parametros)}"] = {
+                "archivo": archivo,
+                "hash": digest,
+                "perfil": perfil_id,
+                "version": version,
+            }
+
+    manifest = json.dumps(entradas, indent=2).encode("utf-8")
+    _escribir_atomico(os.path.join(directorio, MANIFEST), manifest)
+
+    # los archivos de versiones anteriores ya no se sirven (un FileResponse
+    # en curso conserva su descriptor aunque se borre)
+    vigentes = {entrada["archivo"] for entrada in entradas.values()}
+    for archivo in os.listdir(directorio):
+        if archivo.endswith(".html") and archivo not in vigentes:
+            try:
+                os.unlink(os.path.join(directorio, archivo))
+            except OSError:
+                pass
+    return {clave: entrada["archivo"] for clave, entrada in entradas.items()}
+
+
+_executor_lock = threading.Lock()
+_executor_state = {"pid": None, "executor": None, "programado": False}
+
+
+def _ejecutar_programado():
+    with _executor_lock:
+        _executor_state["programado"] = False
+    try:
+        prerenderizar_todo()
+    except Exception as e:
+        print(f"Error pre-renderizando páginas: {e}")
+    finally:
+        connection.close()
+
+
+def programar_prerender():
+    """
+    Vuelve a pre-renderizar en segundo plano (no demora el guardado en admin).
+    Varios cambios seguidos se agrupan en una sola pasada.
+    """
+    if not _habilitado():
+        return
+    pid = os.getpid()
+    with _executor_lock:
+        if _executor_state["executor"] is None or _executor_state["pid"] != pid:
+            _executor_state["executor"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prerender")
+            _executor_state["pid"] = pid
+            _executor_state["programado"] = False
+        if _executor_state["programado"]:
+            return
+        _executor_state["programado"] = True
+        executor = _executor_state["executor"]
+    try:
+        executor.submit(_ejecutar_programado)
+    except RuntimeError:
+        # el proceso se está cerrando: no se programa nada más
+        with _executor_lock:
+            _executor_state["programado"] = False
+
+
+# ---------- servicio ----------
+
+def servir_prerenderizada(request, nombre):
+    """
+    FileResponse con la página pre-renderizada, o None si hay que
+    renderizarla (usuario logueado, combinación no generada o snapshot
+    más nuevo que el archivo).
+    """
+    if not _habilitado() or getattr(request, "_prerender", False):
+        return None
+    if request.method not in ("GET", "HEAD"):
+        return None
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return None
+
+    entrada = leer_manifest().get(f"{nombre}?{clave_combinacion(request.GET.dict())}")
+    if not entrada:
+        return None
+
+    perfil_id = obtener_perfil_activo_id(request)
+    if perfil_id is None or entrada["perfil"] != perfil_id:
+        return None
+    version = version_snapshot(perfil_id)
+    if version is None or entrada["version"] != version:
+        return None
+
+    etag = quote_etag(entrada["hash"])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            response = FileResponse(
+                open(os.path.join(_directorio(), entrada["archivo"]), "rb"),
+                content_type="text/html; charset=utf-8",
+            )
+        except FileNotFoundError:
+            return None
+        response["X-Prerender"] = "HIT"
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={getattr(settings, 'PRERENDER_MAX_AGE', 60)}"
+    return response
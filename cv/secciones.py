@@ -0,0 +1,185 @@
+# cv/secciones.py - Registro de secciones del CV y su carga
+
+"""
+Cada sección del CV (experiencia, cursos, ...) se declara una sola vez en
+SECCIONES: de dónde salen los datos, su orden, qué relaciones precargar y
+qué la oculta (ConfiguracionVisibilidad y el parámetro de la URL).
+
+Todas las vistas del CV (hoja_vida, print_preview_improved) y
+obtener_datos_filtrados cargan los datos con cargar_secciones(); una
+sección oculta no ejecuta ninguna consulta. Las vistas precargan juntas
+(Prefetch) las secciones visibles que no tienen su fragmento HTML en caché.
+"""
+
+from dataclasses import dataclass, field
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import DatosPersonales
+
+# atributo del perfil donde queda cada sección precargada
+PREFETCH_ATTR = "_seccion_{}"
+
+
+@dataclass(frozen=True)
+class Seccion:
+    nombre: str                 # clave en el contexto de las plantillas
+    related_name: str           # relación inversa en DatosPersonales
+    campo_visibilidad: str      # campo booleano de ConfiguracionVisibilidad
+    parametro_url: str          # clave de sections_config (?experiencia=0)
+    ordering: tuple = ()
+    select_related: tuple = ()
+    prefetch_related: tuple = ()
+    # otros nombres con los que se publica (obtener_datos_filtrados)
+    alias: tuple = field(default=())
+
+    def visible(self, config=None, sections_config=None):
+        if config is not None and not getattr(config, self.campo_visibilidad, True):
+            return False
+        if sections_config is not None and not sections_config.get(self.parametro_url, True):
+            return False
+        return True
+
+    def queryset(self, perfil):
+        return self._filtrar(getattr(perfil, self.related_name).all())
+
+    def prefetch(self):
+        """Prefetch de la sección (filtrada y ordenada) en PREFETCH_ATTR."""
+        modelo = DatosPersonales._meta.get_field(self.related_name).related_model
+        return Prefetch(
+            self.related_name,
+            queryset=self._filtrar(modelo._default_manager.all()),
+            to_attr=PREFETCH_ATTR.format(self.nombre),
+        )
+
+    def _filtrar(self, qs):
+        qs = qs.filter(activarparaqueseveaenfront=True)
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        if self.prefetch_related:
+            qs = qs.prefetch_related(*self.prefetch_related)
+        if self.ordering:
+            qs = qs.order_by(*self.ordering)
+        return qs
+
+
+SECCIONES = (
+    Seccion(
+        nombre="experiencias",
+        related_name="experiencias",
+        campo_visibilidad="mostrar_experiencia_laboral",
+        parametro_url="experiencia",
+        ordering=("-fechafingestion",),
+    ),
+    Seccion(
+        nombre="cursos",
+        related_name="cursos",
+        campo_visibilidad="mostrar_cursos",
+        parametro_url="cursos",
+        ordering=("-fechafin",),
+    ),
+    Seccion(
+        nombre="reconocimientos",
+        related_name="reconocimientos",
+        campo_visibilidad="mostrar_reconocimientos",
+        parametro_url="reconocimientos",
+        ordering=("-fechareconocimiento",),
+    ),
+    Seccion(
+        nombre="prod_acad",
+        related_name="productos_academicos",
+        campo_visibilidad="mostrar_productos_academicos",
+        parametro_url="productos_academicos",
+        ordering=("idproductoacademico",),
+        alias=("productos_academicos",),
+    ),
+    Seccion(
+        nombre="prod_lab",
+        related_name="productos_laborales",
+        campo_visibilidad="mostrar_productos_laborales",
+        parametro_url="productos_laborales",
+        ordering=("-fechaproducto",),
+        alias=("productos_laborales",),
+    ),
+    Seccion(
+        nombre="garage",
+        related_name="garage",
+        campo_visibilidad="mostrar_venta_garage",
+        parametro_url="venta_garage",
+        ordering=("-idventagarage",),
+    ),
+)
+
+# parámetros de la URL -> clave de sections_config
+PARAMETROS_URL = {
+    "datos_personales": "datos-personales",
+    "experiencia": "experiencia",
+    "cursos": "cursos",
+    "reconocimientos": "reconocimientos",
+    "productos_academicos": "productos-academicos",
+    "productos_laborales": "productos-laborales",
+    "venta_garage": "venta-garage",
+}
+
+
+def sections_config_desde_request(request):
+    """Secciones pedidas en la URL (?experiencia=0 oculta esa sección)."""
+    return {
+        clave: request.GET.get(parametro, "1") == "1"
+        for clave, parametro in PARAMETROS_URL.items()
+    }
+
+
+def secciones_vacias():
+    return {seccion.nombre: [] for seccion in SECCIONES}
+
+
+def precargar_secciones(perfil, secciones):
+    """
+    Carga de una vez las secciones pedidas sobre el perfil ya obtenido
+    (prefetch_related_objects: una consulta por sección, sin repetir la
+    del perfil). Retorna {nombre: lista}.
+    """
+    if not secciones:
+        return {}
+    try:
+        prefetch_related_objects([perfil], *(seccion.prefetch() for seccion in secciones))
+    except Exception as e:
+        print(f"Error precargando secciones: {e}")
+        return {}
+    return {seccion.nombre: getattr(perfil, PREFETCH_ATTR.format(seccion.nombre)) for seccion in secciones}
+
+
+def cargar_secciones(perfil, config=None, sections_config=None, usar_alias=False, incluir_ocultas=True,
+                     precargar=()):
+    """
+    Datos de cada sección del perfil: queryset (perezoso) si la sección está
+    visible, [] si está oculta o falla, sin consultar la BD en ese caso.
+    Con incluir_ocultas=False las secciones ocultas no aparecen en el dict.
+    Las secciones visibles nombradas en precargar se cargan ya, todas juntas
+    (una consulta por sección); el resto queda como queryset perezoso (p. ej.
+    las que tienen el fragmento HTML en caché y no se van a leer).
+    """
+    visibles = [
+        seccion for seccion in SECCIONES
+        if perfil is not None and seccion.visible(config, sections_config)
+    ]
+    precargadas = precargar_secciones(perfil, [s for s in visibles if s.nombre in precargar])
+
+    datos = {}
+    for seccion in SECCIONES:
+        visible = seccion in visibles
+        if not visible and not incluir_ocultas:
+            continue
+        claves = seccion.alias if usar_alias and seccion.alias else (seccion.nombre,)
+        valor = []
+        if seccion.nombre in precargadas:
+            valor = precargadas[seccion.nombre]
+        elif visible:
+            try:
+                valor = seccion.queryset(perfil)
+            except Exception as e:
+                print(f"Error cargando {seccion.nombre}: {e}")
+        for clave in claves:
+            datos[clave] = valor
+    return datos
@@ -0,0 +1,102 @@
+# cv/signals.py - Señales del modelo (se conectan en CvConfig.ready)
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .bundles import invalidar_certificados
+from .fragmentos import secciones_por_modelo
+from .image_derivatives import IMAGE_FIELDS, schedule_derivatives
+from .models import ConfiguracionVisibilidad, DatosPersonales, MetadatosArchivo, SnapshotCV, VentaGarage
+from .perfil_activo import invalidar_cache_perfil_activo
+from .prerender import programar_prerender
+from .snapshot import programar_reconstruccion
+from .storage_backends import AzureFileProxy
+from .visibilidad import invalidar_cache_visibilidad
+
+
+@receiver(post_save, sender=DatosPersonales)
+@receiver(post_save, sender=VentaGarage)
+def generar_derivadas_imagenes(sender, instance, **kwargs):
+    """Con IMAGE_DERIVATIVES_EAGER, crea las miniaturas apenas se sube la foto."""
+    if not getattr(settings, "IMAGE_DERIVATIVES_EAGER", False):
+        return
+
+    file_type = "perfil" if sender is DatosPersonales else "garage"
+    blob_refs = []
+    for field_name in IMAGE_FIELDS[file_type]:
+        field = getattr(instance, field_name, None)
+        name = getattr(field, "name", "") if field else ""
+        if name:
+            blob_refs.append(name)
+
+    if blob_refs:
+        transaction.on_commit(lambda: schedule_derivatives(blob_refs))
+
+
+@receiver(post_save)
+def olvidar_archivos_no_encontrados(sender, instance, **kwargs):
+    """
+    Al guardar un modelo de cv con archivos se borra la marca de
+    "no encontrado" de sus archivos actuales (AZURE_NOT_FOUND_TTL).
+    """
+    if sender._meta.app_label != "cv":
+        return
+
+    names = []
+    for field in sender._meta.get_fields():
+        if isinstance(field, models.FileField):
+            name = getattr(getattr(instance, field.name, None), "name", "")
+            if name:
+                names.append(name)
+
+    if names:
+        transaction.on_commit(lambda: AzureFileProxy.forget_missing(*names))
+
+
+@receiver(post_save, sender=ConfiguracionVisibilidad)
+@receiver(post_delete, sender=ConfiguracionVisibilidad)
+@receiver(post_save, sender=DatosPersonales)
+@receiver(post_delete, sender=DatosPersonales)
+def invalidar_configuracion_visibilidad(sender, instance, **kwargs):
+    """La configuración cacheada incluye el perfil: cualquier cambio la invalida."""
+    perfil_id = instance.perfil_id if sender is ConfiguracionVisibilidad else instance.pk
+    transaction.on_commit(lambda: invalidar_cache_visibilidad(perfil_id))
+
+
+@receiver(post_save, sender=DatosPersonales)
+@receiver(post_delete, sender=DatosPersonales)
+def invalidar_perfil_activo(sender, instance, **kwargs):
+    """Cualquier cambio en un perfil puede cambiar cuál es el activo (o sus datos)."""
+    transaction.on_commit(invalidar_cache_perfil_activo)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def reconstruir_snapshot_cv(sender, instance, **kwargs):
+    """
+    Cualquier cambio en un modelo del CV regenera el snapshot de su perfil
+    y, después, invalida el fragmento HTML de su sección y lo cacheado a
+    partir del snapshot (si hay certificados, páginas pre-renderizadas).
+    """
+    if sender._meta.app_label != "cv" or sender in (SnapshotCV, MetadatosArchivo):
+        return
+
+    if sender is DatosPersonales:
+        perfil_id = instance.pk
+    elif sender is ConfiguracionVisibilidad:
+        perfil_id = instance.perfil_id
+    else:
+        perfil_id = getattr(instance, "idperfilconqueestaactivo_id", None)
+
+    if perfil_id is not None:
+        secciones = [
+            seccion
+            for seccion, fk_attname in secciones_por_modelo().get(sender, ())
+            if getattr(instance, fk_attname, None) == perfil_id
+        ]
+        programar_reconstruccion(perfil_id, secciones)
+        transaction.on_commit(lambda: invalidar_certificados(perfil_id))
+        # después del snapshot (los callbacks de on_commit corren en orden)
+        transaction.on_commit(programar_prerender)
@@ -0,0 +1,209 @@
+# cv/snapshot.py - Snapshot JSON del CV de cada perfil
+
+"""
+Las visitas superan por mucho a las ediciones del admin, así que el CV de
+cada perfil se guarda ya armado en un solo registro (SnapshotCV):
+
+- perfil, configuración de visibilidad y todas las secciones con
+  activarparaqueseveaenfront, en el orden de cv/secciones.py;
+- duración en meses de experiencias y cursos y URLs de sus archivos.
+
+Las señales de cv/signals.py lo reconstruyen (dentro de una transacción,
+al confirmar la que hizo el cambio) cuando se guarda o borra cualquier
+modelo del CV. Las vistas lo leen con una consulta por clave primaria y
+reciben instancias de los modelos (sin guardar), así las plantillas y los
+template tags funcionan igual que con los querysets.
+"""
+
+from django.core import serializers
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.urls import reverse
+
+from .fragmentos import invalidar_seccion
+from .models import (
+    ConfiguracionVisibilidad,
+    CursosRealizados,
+    DatosPersonales,
+    ExperienciaLaboral,
+    Reconocimientos,
+    SnapshotCV,
+    VentaGarage,
+)
+from .secciones import SECCIONES, precargar_secciones
+
+# se incrementa si cambia la forma del documento: los anteriores se reconstruyen
+FORMATO = 1
+
+# tipo de archivo de serve_protected_file para cada modelo con archivos
+TIPOS_ARCHIVO = {
+    DatosPersonales: "perfil",
+    ExperienciaLaboral: "experiencia",
+    CursosRealizados: "curso",
+    Reconocimientos: "reconocimiento",
+    VentaGarage: "garage",
+}
+
+# campos (inicio, fin) con los que se calcula la duración en meses
+CAMPOS_DURACION = {
+    ExperienciaLaboral: ("fechainiciogestion", "fechafingestion"),
+    CursosRealizados: ("fechainicio", "fechafin"),
+}
+
+
+def _duracion_meses(obj):
+    campos = CAMPOS_DURACION.get(type(obj))
+    if not campos:
+        return None
+    inicio, fin = (getattr(obj, campo) for campo in campos)
+    if not inicio or not fin:
+        return None
+    return (fin.year - inicio.year) * 12 + fin.month - inicio.month
+
+
+def _urls_archivos(obj):
+    tipo = TIPOS_ARCHIVO.get(type(obj))
+    if not tipo:
+        return {}
+    urls = {}
+    for field in obj._meta.fields:
+        if field.get_internal_type() in ("FileField", "ImageField") and getattr(obj, field.name):
+            urls[field.name] = reverse("serve_protected_file", args=[tipo, obj.pk, field.name])
+    return urls
+
+
+def _serializar(objs):
+    registros = serializers.serialize("python", objs)
+    for obj, registro in zip(objs, registros):
+        registro["extra"] = {"duracion_meses": _duracion_meses(obj), "urls": _urls_archivos(obj)}
+    return registros
+
+
+def _deserializar(registros):
+    objs = []
+    for registro in registros:
+        extra = registro.get("extra", {})
+        obj = next(serializers.deserialize("python", [registro], ignorenonexistent=True)).object
+        obj.duracion_meses = extra.get("duracion_meses")
+        obj.urls = extra.get("urls", {})
+        objs.append(obj)
+    return objs
+
+
+def construir_snapshot(perfil):
+    """Documento del CV del perfil (una consulta por sección)."""
+    config = ConfiguracionVisibilidad.objects.filter(perfil=perfil).first()
+    secciones = precargar_secciones(perfil, SECCIONES)
+    return {
+        "formato": FORMATO,
+        "perfil": _serializar([perfil]),
+        "config": _serializar([config]) if config else [],
+        "secciones": {
+            seccion.nombre: _serializar(list(secciones.get(seccion.nombre, [])))
+            for seccion in SECCIONES
+        },
+    }
+
+
+def reconstruir_snapshot(perfil_id):
+    """Regenera el snapshot del perfil (o lo borra si el perfil ya no existe)."""
+    try:
+        with transaction.atomic():
+            perfil = DatosPersonales.objects.filter(pk=perfil_id).first()
+            if perfil is None:
+                SnapshotCV.objects.filter(pk=perfil_id).delete()
+                return None
+
+            datos = construir_snapshot(perfil)
+            actualizados = SnapshotCV.objects.filter(pk=perfil_id).update(
+                datos=datos, version=F("version") + 1
+            )
+            if not actualizados:
+                try:
+                    with transaction.atomic():
+                        SnapshotCV.objects.create(perfil=perfil, datos=datos)
+                except IntegrityError:
+                    # otro proceso lo creó al mismo tiempo
+                    SnapshotCV.objects.filter(pk=perfil_id).update(
+                        datos=datos, version=F("version") + 1
+                    )
+            return datos
+    except DatabaseError as e:
+        print(f"Error reconstruyendo snapshot del perfil {perfil_id}: {e}")
+        return None
+
+
+def programar_reconstruccion(perfil_id, secciones=()):
+    """
+    Reconstruye el snapshot cuando se confirme la transacción actual y
+    recién después invalida los fragmentos HTML de `secciones`: si se
+    invalidaran antes, un request intermedio regeneraría el fragmento con
+    el snapshot anterior y lo guardaría con la versión nueva.
+    """
+    def reconstruir():
+        if reconstruir_snapshot(perfil_id) is None:
+            return
+        for seccion in secciones:
+            invalidar_seccion(perfil_id, seccion)
+
+    transaction.on_commit(reconstruir)
+
+
+def version_snapshot(perfil_id):
+    """Versión actual del snapshot del perfil (None si todavía no hay)."""
+    if perfil_id is None:
+        return None
+    try:
+        return SnapshotCV.objects.filter(pk=perfil_id).values_list("version", flat=True).first()
+    except DatabaseError:
+        return None
+
+
+def obtener_cv(perfil_id):
+    """
+    CV del perfil leído del snapshot: {"perfil", "config", "version", y una
+    lista de instancias por sección}. Si todavía no hay snapshot (o es de un
+    formato anterior) se construye en el momento. None si el perfil no existe.
+    """
+    if perfil_id is None:
+        return None
+    try:
+        snapshot = SnapshotCV.objects.filter(pk=perfil_id).first()
+    except DatabaseError:
+        snapshot = None
+
+    datos = snapshot.datos if snapshot else None
+    version = snapshot.version if snapshot else None
+    if not datos or datos.get("formato") != FORMATO:
+        datos = reconstruir_snapshot(perfil_id)
+        if datos is None:
+            return None
+        # la versión del registro recién creado o actualizado
+        version = version_snapshot(perfil_id) or 1
+
+    perfiles = _deserializar(datos["perfil"])
+    configs = _deserializar(datos["config"])
+    cv = {
+        "perfil": perfiles[0],
+        "config": configs[0] if configs else None,
+        "version": version,
+    }
+    for seccion in SECCIONES:
+        cv[seccion.nombre] = _deserializar(datos["secciones"].get(seccion.nombre, []))
+    return cv
+
+
+def secciones_visibles(cv, config=None, sections_config=None, usar_alias=False, incluir_ocultas=True):
+    """
+    Igual que cargar_secciones() pero con las listas del snapshot:
+    [] para las secciones ocultas por la configuración o la URL.
+    """
+    datos = {}
+    for seccion in SECCIONES:
+        visible = cv is not None and seccion.visible(config, sections_config)
+        if not visible and not incluir_ocultas:
+            continue
+        claves = seccion.alias if usar_alias and seccion.alias else (seccion.nombre,)
+        for clave in claves:
+            datos[clave] = cv[seccion.nombre] if visible else []
+    return datos
@@ -0,0 +1,351 @@
+# cv/storage_async.py - Acceso asíncrono a Azure Blob Storage (vistas ASGI)
+
+"""
+Equivalente asíncrono de AzureFileProxy/open_file_source basado en
+azure.storage.blob.aio. Lo usan las vistas de cv/views_async.py cuando el
+proyecto corre bajo un servidor ASGI: un solo proceso puede mantener
+cientos de descargas en curso sin bloquear un worker por cada una.
+
+Comparte con la versión síncrona la caché de ubicaciones y la caché local
+de blobs.
+"""
+
+import asyncio
+import os
+import weakref
+from types import SimpleNamespace
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient as AsyncBlobServiceClient
+from azure.storage.blob.aio import ExponentialRetry as AsyncExponentialRetry
+
+from .blob_cache import get_blob_cache
+from .circuit_breaker import azure_breaker, is_unavailable_error
+from .file_metadata import aobtener_metadatos, aregistrar_metadatos, borrar_metadatos, datos_desde_propiedades
+from .storage_backends import (
+    AzureFileProxy,
+    AzureUnavailableError,
+    LocalFileSource,
+    _coalesced_source,
+    _stale_source,
+    build_retry_policy,
+    open_file_source,
+)
+
+# Un cliente por event loop (aiohttp no permite compartir sesiones entre loops)
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_blob_service_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        pool_size = getattr(settings, "AZURE_POOL_MAXSIZE", 20)
+        connect_timeout = getattr(settings, "AZURE_CONNECT_TIMEOUT", 5)
+        read_timeout = getattr(settings, "AZURE_READ_TIMEOUT", 30)
+        chunk_size = getattr(settings, "AZURE_STREAM_CHUNK_SIZE", 1024 * 1024)
+
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=30),
+        )
+        transport = AioHttpTransport(session=session, session_owner=False)
+        client = AsyncBlobServiceClient.from_connection_string(
+            settings.AZURE_CONNECTION_STRING,
+            transport=transport,
+            connection_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retry_policy=build_retry_policy(AsyncExponentialRetry),
+            max_single_get_size=chunk_size,
+            max_chunk_get_size=chunk_size,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aazure_circuit_open(blob_ref):
+    """Versión asíncrona de azure_circuit_open (caché de ubicaciones con cache.aget)."""
+    if not getattr(settings, "USE_AZURE_MEDIA", False):
+        return False
+    location = await cache.aget(AzureFileProxy._location_cache_key(blob_ref))
+    container = location[0] if location else (getattr(settings, "AZURE_CONTAINER", "") or "").strip()
+    return bool(container) and azure_breaker.is_open(container)
+
+
+async def _aprobe(container, blob_name):
+    if not azure_breaker.allow(container):
+        raise AzureUnavailableError(f"Circuito abierto para el contenedor {container}")
+
+    blob_client = get_async_blob_service_client().get_blob_client(container=container, blob=blob_name)
+    try:
+        props = await blob_client.get_blob_properties()
+    except Exception as e:
+        if is_unavailable_error(e):
+            azure_breaker.record_failure(container)
+            raise AzureUnavailableError(str(e)) from e
+        azure_breaker.record_success(container)
+        raise
+    azure_breaker.record_success(container)
+    return blob_client, props
+
+
+async def alocate_blob(blob_name: str):
+    """Versión asíncrona de AzureFileProxy.locate_blob (candidatos en paralelo)."""
+    variants = AzureFileProxy._blob_name_variants(blob_name)
+    if not variants:
+        raise FileNotFoundError("Nombre de archivo vacío")
+
+    missing_key = AzureFileProxy._missing_cache_key(blob_name)
+    if await cache.aget(missing_key):
+        raise FileNotFoundError(f"Archivo no encontrado en Azure (en caché): {variants[0]}")
+
+    cache_key = AzureFileProxy._location_cache_key(blob_name)
+    cached = await cache.aget(cache_key)
+    if cached:
+        try:
+            return await _aprobe(*cached)
+        except AzureUnavailableError:
+            raise
+        except Exception:
+            await cache.adelete(cache_key)
+
+    candidates = [
+        (container, name_try)
+        for container in AzureFileProxy._candidate_containers()
+        for name_try in variants
+    ]
+    results = await asyncio.gather(*(_aprobe(c, n) for c, n in candidates), return_exceptions=True)
+
+    errors = []
+    for candidate, result in zip(candidates, results):
+        if isinstance(result, BaseException):
+            errors.append(result)
+            continue
+        ttl = getattr(settings, "AZURE_LOCATION_CACHE_TTL", 60 * 60 * 24)
+        await cache.aset(cache_key, candidate, ttl)
+        return result
+
+    unavailable = [e for e in errors if isinstance(e, AzureUnavailableError)]
+    if unavailable:
+        raise unavailable[0]
+    if errors and all(isinstance(e, ResourceNotFoundError) for e in errors):
+        await cache.aset(missing_key, True, getattr(settings, "AZURE_NOT_FOUND_TTL", 60))
+    last_error = errors[-1] if errors else None
+    raise FileNotFoundError(f"Archivo no encontrado en Azure: {variants}. Detalle: {last_error}")
+
+
+class AsyncAzureBlobSource:
+    """Blob localizado con el cliente aio; iter_range() es un iterador asíncrono."""
+
+    is_async = True
+
+    def __init__(self, blob_client, properties, blob_cache=None, nombre=None):
+        content_settings = getattr(properties, "content_settings", None)
+        self.blob_client = blob_client
+        self.properties = properties
+        self.size = properties.size
+        self.path = None
+        self.etag = quote_etag(properties.etag) if properties.etag else None
+        self.last_modified = properties.last_modified
+        self.content_type = getattr(content_settings, "content_type", None)
+        self.blob_cache = blob_cache
+        self.cache_status = "MISS" if blob_cache else None
+        self.nombre = nombre
+        self.single_flight = False
+        self._downloader = None
+
+    @classmethod
+    def from_metadata(cls, meta, blob_cache=None):
+        """Ver AzureBlobSource.from_metadata."""
+        properties = SimpleNamespace(
+            size=meta.tamano,
+            etag=meta.etag,
+            last_modified=meta.fecha_modificacion,
+            content_settings=SimpleNamespace(content_type=meta.content_type or None),
+        )
+        blob_client = get_async_blob_service_client().get_blob_client(container=meta.contenedor, blob=meta.blob)
+        return cls(blob_client, properties, blob_cache=blob_cache, nombre=meta.nombre)
+
+    async def start(self):
+        """Ver AzureBlobSource.start."""
+        container = self.blob_client.container_name
+        if not azure_breaker.allow(container):
+            raise AzureUnavailableError(f"Circuito abierto para el contenedor {container}")
+        try:
+            self._downloader = await self.blob_client.download_blob(
+                etag=self.properties.etag, match_condition=MatchConditions.IfNotModified
+            )
+        except (ResourceModifiedError, ResourceNotFoundError):
+            azure_breaker.record_success(container)
+            await self._olvidar()
+            raise
+        except Exception as e:
+            if is_unavailable_error(e):
+                azure_breaker.record_failure(container)
+                raise AzureUnavailableError(str(e)) from e
+            raise
+
+    async def _olvidar(self):
+        await sync_to_async(borrar_metadatos)(self.nombre)
+        await cache.adelete(AzureFileProxy._location_cache_key(self.nombre))
+
+    async def _chunks(self, offset, length):
+        container = self.blob_client.container_name
+        downloader, self._downloader = self._downloader, None
+        if downloader is None or offset is not None or length is not None:
+            if not azure_breaker.allow(container):
+                raise AzureUnavailableError(f"Circuito abierto para el contenedor {container}")
+            downloader = None
+
+        kwargs = {"offset": offset, "length": length}
+        if self.nombre is not None:
+            # datos tomados de la BD: se descarga solo si el blob sigue igual
+            kwargs.update(etag=self.properties.etag, match_condition=MatchConditions.IfNotModified)
+        try:
+            if downloader is None:
+                downloader = await self.blob_client.download_blob(**kwargs)
+            async for chunk in downloader.chunks():
+                yield chunk
+        except (ResourceModifiedError, ResourceNotFoundError):
+            if self.nombre is not None:
+                await self._olvidar()
+            raise
+        except Exception as e:
+            if is_unavailable_error(e):
+                azure_breaker.record_failure(container)
+                raise AzureUnavailableError(str(e)) from e
+            raise
+        azure_breaker.record_success(container)
+
+    def iter_range(self, offset=None, length=None):
+        if self.blob_cache is None or offset is not None or length is not None:
+            return self._chunks(offset, length)
+        if self.single_flight:
+            # una sola descarga (con el cliente aio) aunque la pidan varias peticiones
+            return self.blob_cache.astream_fill(
+                self.blob_client.container_name,
+                self.blob_client.blob_name,
+                self.etag,
+                lambda: self._chunks(None, None),
+                self.size,
+                content_type=self.content_type,
+                last_modified=self.last_modified,
+                timeout=getattr(settings, "BLOB_CACHE_LOCK_TIMEOUT", 30),
+                process_lock=getattr(settings, "BLOB_CACHE_PROCESS_LOCK", True),
+            )
+        return self.blob_cache.atee(
+            self._chunks(None, None),
+            self.blob_client.container_name,
+            self.blob_client.blob_name,
+            self.etag,
+            self.size,
+            self.content_type,
+            self.last_modified,
+        )
+
+
+class AsyncLocalFileSource(LocalFileSource):
+    """
+    Archivo en disco leído por bloques desde un iterador asíncrono
+    (sin FileResponse, que bajo ASGI se consumiría de forma síncrona).
+    Cada lectura corre en un hilo: el disco no bloquea el event loop.
+    """
+
+    is_async = True
+
+    def __init__(self, source):
+        self.__dict__.update(source.__dict__)
+        self.local_path = source.path
+        self.path = None
+
+    async def iter_range(self, offset=None, length=None):
+        chunk_size = getattr(settings, "AZURE_STREAM_CHUNK_SIZE", 1024 * 1024)
+        offset = offset or 0
+        remaining = self.size - offset if length is None else length
+        fh = self._fh if self._fh is not None else await asyncio.to_thread(open, self.local_path, "rb")
+        try:
+            while remaining > 0:
+                data = await asyncio.to_thread(os.pread, fh.fileno(), min(chunk_size, remaining), offset)
+                if not data:
+                    break
+                offset += len(data)
+                remaining -= len(data)
+                yield data
+        finally:
+            if fh is not self._fh:
+                fh.close()
+
+
+async def aopen_file_source(blob_ref: str):
+    """
+    Versión asíncrona de open_file_source. El acceso al disco (caché local,
+    MEDIA_ROOT) corre en un hilo para no bloquear el event loop.
+    """
+    if not getattr(settings, "USE_AZURE_MEDIA", False):
+        return AsyncLocalFileSource(await sync_to_async(open_file_source, thread_sensitive=False)(blob_ref))
+
+    nombre = AzureFileProxy._normalize_blob_name(blob_ref)
+    meta = await aobtener_metadatos(nombre)
+    try:
+        return await _aopen_azure_source(blob_ref, nombre, meta)
+    except AzureUnavailableError:
+        stale = await sync_to_async(_stale_source, thread_sensitive=False)(blob_ref, meta)
+        if stale is None:
+            raise
+        return AsyncLocalFileSource(stale)
+
+
+async def _aopen_azure_source(blob_ref, nombre, meta):
+    blob_cache = get_blob_cache()
+    if meta and meta.contenedor and meta.etag:
+        if azure_breaker.is_open(meta.contenedor):
+            raise AzureUnavailableError(f"Circuito abierto para el contenedor {meta.contenedor}")
+        source = AsyncAzureBlobSource.from_metadata(meta, blob_cache=blob_cache)
+        entry = None
+        if blob_cache is not None:
+            entry = await sync_to_async(blob_cache.get, thread_sensitive=False)(meta.contenedor, meta.blob, source.etag)
+        if entry:
+            return AsyncLocalFileSource(LocalFileSource.from_cache(entry))
+        try:
+            # miss: la descarga condicional empieza antes de responder
+            if blob_cache is None or not blob_cache.filling(meta.contenedor, meta.blob, source.etag):
+                await source.start()
+            if blob_cache is None:
+                return source
+            return _coalesced_source(source, blob_cache)
+        except (ResourceModifiedError, ResourceNotFoundError):
+            # el blob cambió fuera de Django (start() ya borró el registro):
+            # se vuelve a buscar
+            meta = None
+
+    if blob_cache is not None:
+        location = await cache.aget(AzureFileProxy._location_cache_key(blob_ref))
+        if location:
+            freshness = getattr(settings, "BLOB_CACHE_FRESHNESS", 60)
+            entry = await sync_to_async(blob_cache.get_latest, thread_sensitive=False)(*location, max_age=freshness)
+            if entry:
+                return AsyncLocalFileSource(LocalFileSource.from_cache(entry))
+
+    blob_client, props = await alocate_blob(blob_ref)
+    if not meta:
+        await aregistrar_metadatos(nombre, **datos_desde_propiedades(blob_client, props))
+    source = AsyncAzureBlobSource(blob_client, props, blob_cache=blob_cache)
+    if blob_cache is not None:
+        if source.etag:
+            entry = await sync_to_async(blob_cache.get, thread_sensitive=False)(
+                blob_client.container_name, blob_client.blob_name, source.etag
+            )
+            if entry:
+                await sync_to_async(blob_cache.confirm_latest, thread_sensitive=False)(
+                    blob_client.container_name, blob_client.blob_name, source.etag
+                )
+                return AsyncLocalFileSource(LocalFileSource.from_cache(entry))
+        return _coalesced_source(source, blob_cache)
+    return source
@@ -1,17 +1,68 @@
-from datetime import datetime, timedelta
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from urllib.parse import urlparse
 
+import requests
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.utils.http import quote_etag
+from requests.adapters import HTTPAdapter
 from storages.backends.azure_storage import AzureStorage
 
+from .blob_cache import get_blob_cache
+from .circuit_breaker import azure_breaker, is_unavailable_error
+from .file_metadata import (
+    borrar_metadatos,
+    datos_desde_propiedades,
+    inspeccionar_archivo,
+    obtener_metadatos,
+    registrar_metadatos,
+)
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.storage.blob import (
     BlobServiceClient,
+    ContentSettings,
+    ExponentialRetry,
     generate_blob_sas,
     BlobSasPermissions,
 )
 
 
-class AzureMediaStorage(AzureStorage):
+class MetadataStorageMixin:
+    """
+    Registra en MetadatosArchivo cada archivo que se sube por el admin
+    (cualquier FileField/ImageField) y lo borra al eliminar el archivo.
+    """
+
+    def _save(self, name, content):
+        datos = inspeccionar_archivo(content, name)
+        name = super()._save(name, content)
+        # el nombre pudo quedar marcado como inexistente antes de subirlo
+        AzureFileProxy.forget_missing(name)
+        try:
+            datos.update(self._datos_guardado(name))
+        except Exception as e:
+            print(f"Error leyendo propiedades de {name}: {e}")
+        registrar_metadatos(name, **datos)
+        return name
+
+    def _datos_guardado(self, name):
+        return {}
+
+    def delete(self, name):
+        super().delete(name)
+        borrar_metadatos(name)
+
+
+class AzureMediaStorage(MetadataStorageMixin, AzureStorage):
     account_name = settings.AZURE_ACCOUNT_NAME
     account_key = settings.AZURE_ACCOUNT_KEY
     azure_container = settings.AZURE_CONTAINER
@@ -21,6 +72,100 @@ class AzureMediaStorage(AzureStorage):
     def url(self, name):
         return name
 
+    def _datos_guardado(self, name):
+        # Una sola llamada al subir; después se sirve sin consultar Azure
+        blob_client = AzureFileProxy._get_blob_client(self.azure_container, name)
+        datos = datos_desde_propiedades(blob_client, blob_client.get_blob_properties())
+        ttl = getattr(settings, "AZURE_LOCATION_CACHE_TTL", 60 * 60 * 24)
+        cache.set(AzureFileProxy._location_cache_key(name), (self.azure_container, name), ttl)
+        return datos
+
+
+class LocalMediaStorage(MetadataStorageMixin, FileSystemStorage):
+    """MEDIA_ROOT local (sin Azure) con registro de metadatos."""
+
+
+_client_lock = threading.Lock()
+_client_state = {"pid": None, "client": None}
+
+
+class AzureUnavailableError(Exception):
+    """Azure no responde (timeouts, 5xx o circuito abierto); distinto de un 404."""
+
+
+def build_retry_policy(policy_class=ExponentialRetry):
+    """Reintentos acotados con backoff exponencial y jitter (AZURE_RETRY_*)."""
+    return policy_class(
+        initial_backoff=getattr(settings, "AZURE_RETRY_INITIAL_BACKOFF", 0.5),
+        increment_base=getattr(settings, "AZURE_RETRY_INCREMENT_BASE", 2),
+        retry_total=getattr(settings, "AZURE_RETRY_TOTAL", 2),
+        random_jitter_range=getattr(settings, "AZURE_RETRY_JITTER", 0.5),
+    )
+
+
+def _build_blob_service_client():
+    """
+    Crea el BlobServiceClient con una sesión HTTP propia:
+    pool de conexiones acotado, keep-alive y timeouts configurables.
+    """
+    pool_size = getattr(settings, "AZURE_POOL_MAXSIZE", 20)
+    connect_timeout = getattr(settings, "AZURE_CONNECT_TIMEOUT", 5)
+    read_timeout = getattr(settings, "AZURE_READ_TIMEOUT", 30)
+
+    session = requests.Session()
+    # Los reintentos los gestiona el pipeline de Azure, no urllib3
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    transport = RequestsTransport(
+        session=session,
+        session_owner=False,
+        connection_timeout=connect_timeout,
+        read_timeout=read_timeout,
+    )
+    chunk_size = getattr(settings, "AZURE_STREAM_CHUNK_SIZE", 1024 * 1024)
+    return BlobServiceClient.from_connection_string(
+        settings.AZURE_CONNECTION_STRING,
+        transport=transport,
+        connection_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retry_policy=build_retry_policy(),
+        max_single_get_size=chunk_size,
+        max_chunk_get_size=chunk_size,
+    )
+
+
+def get_blob_service_client():
+    """
+    Devuelve el BlobServiceClient del proceso actual (se crea la primera vez).
+    Si el proceso viene de un fork (workers de gunicorn) se crea uno nuevo,
+    para no compartir sockets con el proceso padre.
+    """
+    pid = os.getpid()
+    client = _client_state["client"]
+    if client is not None and _client_state["pid"] == pid:
+        return client
+
+    with _client_lock:
+        if _client_state["client"] is None or _client_state["pid"] != pid:
+            _client_state["client"] = _build_blob_service_client()
+            _client_state["pid"] = pid
+        return _client_state["client"]
+
+
+def _get_probe_executor():
+    """Pool de hilos para las búsquedas en paralelo (uno por proceso)."""
+    pid = os.getpid()
+    with _client_lock:
+        if _client_state.get("executor") is None or _client_state.get("executor_pid") != pid:
+            workers = getattr(settings, "AZURE_PROBE_WORKERS", 6)
+            _client_state["executor"] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="azure-probe"
+            )
+            _client_state["executor_pid"] = pid
+        return _client_state["executor"]
+
 
 class AzureFileProxy:
     @staticmethod
@@ -98,51 +243,596 @@ class AzureFileProxy:
 
     @staticmethod
     def _get_blob_client(container: str, blob_name: str):
-        bsc = BlobServiceClient.from_connection_string(settings.AZURE_CONNECTION_STRING)
+        bsc = get_blob_service_client()
         return bsc.get_blob_client(container=container, blob=blob_name)
 
     @staticmethod
-    def download_blob(blob_name: str):
-        variants = AzureFileProxy._blob_name_variants(blob_name)
-        if not variants:
-            raise FileNotFoundError("Nombre de archivo vacío")
+    def _location_cache_key(blob_name: str) -> str:
+        digest = hashlib.sha1(AzureFileProxy._normalize_blob_name(blob_name).encode("utf-8")).hexdigest()
+        return f"azure:location:{digest}"
 
-        last_error = None
-        for container in AzureFileProxy._candidate_containers():
-            for name_try in variants:
-                try:
-                    blob_client = AzureFileProxy._get_blob_client(container, name_try)
-                    props = blob_client.get_blob_properties()
-                    content = blob_client.download_blob().readall()
-                    return content, props
-                except Exception as e:
-                    last_error = e
+    @staticmethod
+    def cached_location(blob_name: str):
+        """(contenedor, nombre) memorizado para el archivo, o None."""
+        return cache.get(AzureFileProxy._location_cache_key(blob_name))
 
-        raise FileNotFoundError(f"Archivo no encontrado en Azure: {variants}. Detalle: {last_error}")
+    @staticmethod
+    def forget_location(blob_name: str):
+        """Borra la ubicación memorizada de un archivo."""
+        cache.delete(AzureFileProxy._location_cache_key(blob_name))
+
+    @staticmethod
+    def _missing_cache_key(blob_name: str) -> str:
+        digest = hashlib.sha1(AzureFileProxy._normalize_blob_name(blob_name).encode("utf-8")).hexdigest()
+        return f"azure:missing:{digest}"
+
+    @staticmethod
+    def forget_missing(*blob_names):
+        """Quita la marca de "no encontrado" (el archivo se subió o cambió)."""
+        keys = [AzureFileProxy._missing_cache_key(n) for n in blob_names if n]
+        if keys:
+            cache.delete_many(keys)
+
+    @staticmethod
+    def resolve_location(blob_name: str):
+        """
+        (contenedor, nombre) del blob: tabla de metadatos, caché de
+        ubicaciones o, si no hay otra, la búsqueda en Azure.
+        """
+        meta = obtener_metadatos(AzureFileProxy._normalize_blob_name(blob_name))
+        if meta and meta.contenedor:
+            return meta.contenedor, meta.blob
+        location = AzureFileProxy.cached_location(blob_name)
+        if location:
+            return tuple(location)
+        blob_client, _props = AzureFileProxy.locate_blob(blob_name)
+        return blob_client.container_name, blob_client.blob_name
+
+    @staticmethod
+    def _probe(container: str, blob_name: str):
+        if not azure_breaker.allow(container):
+            raise AzureUnavailableError(f"Circuito abierto para el contenedor {container}")
+
+        blob_client = AzureFileProxy._get_blob_client(container, blob_name)
+        try:
+            props = blob_client.get_blob_properties()
+        except Exception as e:
+            if is_unavailable_error(e):
+                azure_breaker.record_failure(container)
+                raise AzureUnavailableError(str(e)) from e
+            # 404 y similares: el servicio respondió bien
+            azure_breaker.record_success(container)
+            raise
+        azure_breaker.record_success(container)
+        return blob_client, props
 
     @staticmethod
-    def generate_sas_url(blob_name: str, expiry_hours: int = 1) -> str:
+    def _probe_candidates(candidates):
+        """
+        Prueba todas las combinaciones (contenedor, nombre) en paralelo y
+        devuelve la primera que exista respetando el orden de prioridad.
+        Si ninguna existe, el error devuelto es ResourceNotFoundError solo
+        cuando todas respondieron 404 (si no, el primer error distinto).
+        """
+        if len(candidates) == 1:
+            container, name_try = candidates[0]
+            try:
+                return candidates[0], AzureFileProxy._probe(container, name_try), None
+            except Exception as e:
+                return None, None, e
+
+        executor = _get_probe_executor()
+        futures = [executor.submit(AzureFileProxy._probe, c, n) for c, n in candidates]
+
+        errors = []
+        for candidate, future in zip(candidates, futures):
+            try:
+                return candidate, future.result(), None
+            except Exception as e:
+                errors.append(e)
+        other = [e for e in errors if not isinstance(e, ResourceNotFoundError)]
+        return None, None, (other or errors or [None])[0]
+
+    @staticmethod
+    def locate_blob(blob_name: str):
+        """
+        Busca el blob probando contenedores y variantes de nombre.
+        Retorna (blob_client, properties) sin descargar el contenido.
+
+        La ubicación encontrada se memoriza en la caché compartida, así las
+        siguientes peticiones van directo al contenedor correcto.
+        """
         variants = AzureFileProxy._blob_name_variants(blob_name)
         if not variants:
             raise FileNotFoundError("Nombre de archivo vacío")
 
-        last_error = None
-        for container in AzureFileProxy._candidate_containers():
-            for name_try in variants:
-                try:
-                    blob_client = AzureFileProxy._get_blob_client(container, name_try)
-                    blob_client.get_blob_properties()  # valida existencia
-
-                    sas_token = generate_blob_sas(
-                        account_name=settings.AZURE_ACCOUNT_NAME,
-                        container_name=container,
-                        blob_name=name_try,
-                        account_key=settings.AZURE_ACCOUNT_KEY,
-                        permission=BlobSasPermissions(read=True),
-                        expiry=datetime.utcnow() + timedelta(hours=expiry_hours),
-                    )
-                    return f"{blob_client.url}?{sas_token}"
-                except Exception as e:
-                    last_error = e
+        missing_key = AzureFileProxy._missing_cache_key(blob_name)
+        if cache.get(missing_key):
+            raise FileNotFoundError(f"Archivo no encontrado en Azure (en caché): {variants[0]}")
+
+        cache_key = AzureFileProxy._location_cache_key(blob_name)
+        cached = cache.get(cache_key)
+        if cached:
+            try:
+                return AzureFileProxy._probe(*cached)
+            except AzureUnavailableError:
+                raise
+            except Exception:
+                # el blob se movió o se borró: volver a buscar
+                cache.delete(cache_key)
 
+        candidates = [
+            (container, name_try)
+            for container in AzureFileProxy._candidate_containers()
+            for name_try in variants
+        ]
+        found, result, last_error = AzureFileProxy._probe_candidates(candidates)
+        if found:
+            ttl = getattr(settings, "AZURE_LOCATION_CACHE_TTL", 60 * 60 * 24)
+            cache.set(cache_key, found, ttl)
+            return result
+
+        if isinstance(last_error, AzureUnavailableError):
+            # no se pudo confirmar que no exista: no es un 404
+            raise last_error
+        if isinstance(last_error, ResourceNotFoundError):
+            # 404 en todos los candidatos: se recuerda por un rato
+            cache.set(missing_key, True, getattr(settings, "AZURE_NOT_FOUND_TTL", 60))
         raise FileNotFoundError(f"Archivo no encontrado en Azure: {variants}. Detalle: {last_error}")
+
+    @staticmethod
+    def start_blob_download(blob_client, offset=None, length=None, etag=None):
+        """
+        Pide el blob (o el rango) a Azure y devuelve el downloader: la
+        primera respuesta ya llegó, así que los errores (404, ETag que no
+        coincide, Azure caído) aparecen acá y no al leer los bloques.
+        Con etag la descarga falla (ResourceModifiedError) si el blob cambió.
+        """
+        container = blob_client.container_name
+        if not azure_breaker.allow(container):
+            raise AzureUnavailableError(f"Circuito abierto para el contenedor {container}")
+
+        kwargs = {"offset": offset, "length": length}
+        if etag:
+            kwargs.update(etag=etag, match_condition=MatchConditions.IfNotModified)
+        try:
+            downloader = blob_client.download_blob(**kwargs)
+        except Exception as e:
+            if is_unavailable_error(e):
+                azure_breaker.record_failure(container)
+                raise AzureUnavailableError(str(e)) from e
+            # 404 / 412: el servicio respondió bien
+            azure_breaker.record_success(container)
+            raise
+        return downloader
+
+    @staticmethod
+    def iter_download(blob_client, downloader):
+        """Bloques de un downloader de start_blob_download."""
+        container = blob_client.container_name
+        try:
+            for chunk in downloader.chunks():
+                yield chunk
+        except Exception as e:
+            if is_unavailable_error(e):
+                azure_breaker.record_failure(container)
+                raise AzureUnavailableError(str(e)) from e
+            raise
+        azure_breaker.record_success(container)
+
+    @staticmethod
+    def iter_blob_chunks(blob_client, offset=None, length=None, etag=None):
+        """
+        Genera el contenido del blob en bloques de AZURE_STREAM_CHUNK_SIZE.
+        Con offset/length solo se lee ese rango de bytes desde Azure.
+        Con etag la descarga falla (ResourceModifiedError) si el blob cambió.
+        """
+        downloader = AzureFileProxy.start_blob_download(blob_client, offset=offset, length=length, etag=etag)
+        yield from AzureFileProxy.iter_download(blob_client, downloader)
+
+    @staticmethod
+    def download_blob(blob_name: str):
+        blob_client, props = AzureFileProxy.locate_blob(blob_name)
+        content = blob_client.download_blob().readall()
+        return content, props
+
+    @staticmethod
+    def generate_sas_url(blob_name: str, expiry_hours: int = 1, expiry_seconds=None, content_disposition=None) -> str:
+        """
+        URL SAS de solo lectura para el blob.
+
+        La URL se cachea hasta AZURE_SAS_REFRESH_MARGIN segundos antes de que
+        expire, y la ubicación sale de la caché de ubicaciones: peticiones
+        repetidas no llaman a Azure.
+        """
+        container, resolved_name = AzureFileProxy.resolve_location(blob_name)
+
+        if expiry_seconds is None:
+            expiry_seconds = int(expiry_hours * 3600)
+        margin = getattr(settings, "AZURE_SAS_REFRESH_MARGIN", 300)
+
+        digest = hashlib.sha1(
+            f"{container}\0{resolved_name}\0{expiry_seconds}\0{content_disposition or ''}".encode("utf-8")
+        ).hexdigest()
+        cache_key = f"azure:sas:{digest}"
+        url = cache.get(cache_key)
+        if url:
+            return url
+
+        sas_token = generate_blob_sas(
+            account_name=settings.AZURE_ACCOUNT_NAME,
+            container_name=container,
+            blob_name=resolved_name,
+            account_key=settings.AZURE_ACCOUNT_KEY,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.utcnow() + timedelta(seconds=expiry_seconds),
+            content_disposition=content_disposition,
+        )
+        blob_client = AzureFileProxy._get_blob_client(container, resolved_name)
+        url = f"{blob_client.url}?{sas_token}"
+
+        if expiry_seconds > margin:
+            cache.set(cache_key, url, expiry_seconds - margin)
+        return url
+
+
+def save_derived_file(original_ref: str, derived_ref: str, data: bytes, content_type: str):
+    """
+    Guarda un archivo derivado (p. ej. una miniatura) junto al original:
+    en el mismo contenedor de Azure, o en MEDIA_ROOT sin Azure.
+    """
+    derived_ref = AzureFileProxy._normalize_blob_name(derived_ref)
+
+    if getattr(settings, "USE_AZURE_MEDIA", False):
+        container, resolved_name = AzureFileProxy.resolve_location(original_ref)
+
+        # mismo prefijo que el original dentro del contenedor
+        original_name = AzureFileProxy._normalize_blob_name(original_ref)
+        blob_name = resolved_name[: len(resolved_name) - len(os.path.basename(original_name))]
+        blob_name += os.path.basename(derived_ref)
+
+        blob_client = AzureFileProxy._get_blob_client(container, blob_name)
+        result = blob_client.upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type),
+        )
+        ttl = getattr(settings, "AZURE_LOCATION_CACHE_TTL", 60 * 60 * 24)
+        cache.set(AzureFileProxy._location_cache_key(derived_ref), (container, blob_name), ttl)
+        AzureFileProxy.forget_missing(derived_ref)
+        registrar_metadatos(
+            derived_ref,
+            contenedor=container,
+            blob=blob_name,
+            tamano=len(data),
+            content_type=content_type,
+            etag=result.get("etag") or "",
+            sha256=hashlib.sha256(data).hexdigest(),
+            fecha_modificacion=result.get("last_modified"),
+        )
+        return derived_ref
+
+    media_root = os.path.realpath(str(settings.MEDIA_ROOT))
+    path = os.path.realpath(os.path.join(media_root, derived_ref))
+    if not path.startswith(media_root + os.sep):
+        raise FileNotFoundError(f"Ruta inválida: {derived_ref}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+    registrar_metadatos(
+        derived_ref,
+        tamano=len(data),
+        content_type=content_type,
+        sha256=hashlib.sha256(data).hexdigest(),
+    )
+    return derived_ref
+
+
+def azure_circuit_open(blob_ref: str) -> bool:
+    """True si el circuito del contenedor donde vive el archivo está abierto."""
+    if not getattr(settings, "USE_AZURE_MEDIA", False):
+        return False
+    location = AzureFileProxy.cached_location(blob_ref)
+    container = location[0] if location else (getattr(settings, "AZURE_CONTAINER", "") or "").strip()
+    return bool(container) and azure_breaker.is_open(container)
+
+
+def delivery_mode(file_type: str) -> str:
+    """
+    Modo de entrega configurado para el tipo de archivo: "proxy" o "sas".
+    SAS solo es posible con Azure habilitado y la account key disponible.
+    """
+    mode = getattr(settings, "AZURE_DELIVERY_POLICY", {}).get(file_type, "proxy")
+    if mode == "sas" and getattr(settings, "USE_AZURE_MEDIA", False) and settings.AZURE_ACCOUNT_KEY:
+        return "sas"
+    return "proxy"
+
+
+# ==================== FUENTES DE ARCHIVO ====================
+class AzureBlobSource:
+    """Blob ya localizado en Azure, listo para leerse completo o por rangos."""
+
+    def __init__(self, blob_client, properties, blob_cache=None, nombre=None):
+        content_settings = getattr(properties, "content_settings", None)
+        self.blob_client = blob_client
+        self.properties = properties
+        self.size = properties.size
+        self.path = None
+        self.etag = quote_etag(properties.etag) if properties.etag else None
+        self.last_modified = properties.last_modified
+        self.content_type = getattr(content_settings, "content_type", None)
+        self.blob_cache = blob_cache
+        self.cache_status = "MISS" if blob_cache else None
+        # nombre del registro en MetadatosArchivo si la fuente salió de ahí
+        self.nombre = nombre
+        # lectura completa con una sola descarga por blob (_coalesced_source)
+        self.single_flight = False
+        # descarga ya empezada por start(), para la primera lectura completa
+        self._downloader = None
+
+    @classmethod
+    def from_metadata(cls, meta, blob_cache=None):
+        """Fuente armada solo con el registro de la BD (sin get_blob_properties)."""
+        properties = SimpleNamespace(
+            size=meta.tamano,
+            etag=meta.etag,
+            last_modified=meta.fecha_modificacion,
+            content_settings=SimpleNamespace(content_type=meta.content_type or None),
+        )
+        blob_client = AzureFileProxy._get_blob_client(meta.contenedor, meta.blob)
+        return cls(blob_client, properties, blob_cache=blob_cache, nombre=meta.nombre)
+
+    def start(self):
+        """
+        Empieza la descarga condicional (ETag del registro de la BD) antes
+        de armar la respuesta, sin un HEAD aparte: si el blob cambió o se
+        borró, ResourceModifiedError / ResourceNotFoundError llegan acá y no
+        a mitad del cuerpo con el status ya enviado. La primera lectura
+        completa sigue con esa misma descarga.
+        """
+        try:
+            self._downloader = AzureFileProxy.start_blob_download(self.blob_client, etag=self.properties.etag)
+        except (ResourceModifiedError, ResourceNotFoundError):
+            self._olvidar()
+            raise
+
+    def close(self):
+        """Descarta la descarga de start() si no se usó."""
+        self._downloader = None
+
+    def _olvidar(self):
+        # cambió fuera de Django: la próxima petición vuelve a consultarlo
+        borrar_metadatos(self.nombre)
+        AzureFileProxy.forget_location(self.nombre)
+
+    def _chunks(self, offset, length):
+        downloader, self._downloader = self._downloader, None
+        if downloader is not None and offset is None and length is None:
+            chunks = AzureFileProxy.iter_download(self.blob_client, downloader)
+        else:
+            # Los datos vienen de la BD: se descarga solo si el blob sigue igual
+            etag = self.properties.etag if self.nombre is not None else None
+            chunks = AzureFileProxy.iter_blob_chunks(self.blob_client, offset=offset, length=length, etag=etag)
+        try:
+            yield from chunks
+        except (ResourceModifiedError, ResourceNotFoundError):
+            if self.nombre is not None:
+                self._olvidar()
+            raise
+
+    def iter_range(self, offset=None, length=None):
+        if self.blob_cache is None or offset is not None or length is not None:
+            return self._chunks(offset, length)
+        if self.single_flight:
+            return self.blob_cache.stream_fill(
+                self.blob_client.container_name,
+                self.blob_client.blob_name,
+                self.etag,
+                lambda: self._chunks(None, None),
+                self.size,
+                content_type=self.content_type,
+                last_modified=self.last_modified,
+                timeout=getattr(settings, "BLOB_CACHE_LOCK_TIMEOUT", 30),
+                process_lock=getattr(settings, "BLOB_CACHE_PROCESS_LOCK", True),
+            )
+        # lectura completa: se guarda una copia en la caché local
+        return self.blob_cache.tee(
+            self._chunks(None, None),
+            self.blob_client.container_name,
+            self.blob_client.blob_name,
+            self.etag,
+            self.size,
+            self.content_type,
+            self.last_modified,
+        )
+
+
+class LocalFileSource:
+    """Archivo en disco: MEDIA_ROOT (sin Azure) o una copia de la caché local."""
+
+    def __init__(self, path, etag=None, last_modified=None, content_type=None, cache_status=None, fh=None):
+        # fh: archivo ya abierto (entradas de la caché, que pueden expulsarse)
+        stat = os.fstat(fh.fileno()) if fh is not None else os.stat(path)
+        self._fh = fh
+        self.path = path
+        self.properties = None
+        self.size = stat.st_size
+        self.etag = etag or f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = last_modified or datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        self.content_type = content_type
+        self.cache_status = cache_status
+
+    @classmethod
+    def from_cache(cls, entry):
+        return cls(
+            entry.path,
+            etag=entry.etag,
+            last_modified=entry.last_modified,
+            content_type=entry.content_type,
+            cache_status="HIT",
+            fh=entry.fh,
+        )
+
+    def open(self):
+        """Archivo abierto para FileResponse (el descriptor de la fuente, si lo tiene)."""
+        fh, self._fh = self._fh, None
+        if fh is None:
+            return open(self.path, "rb")
+        fh.seek(0)
+        return fh
+
+    def close(self):
+        """Cierra el descriptor de la fuente si no se usó para la respuesta."""
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            fh.close()
+
+    def iter_range(self, offset=None, length=None):
+        chunk_size = getattr(settings, "AZURE_STREAM_CHUNK_SIZE", 1024 * 1024)
+        offset = offset or 0
+        remaining = self.size - offset if length is None else length
+        if self._fh is not None:
+            # pread: varios rangos del mismo descriptor sin compartir la posición
+            fd = self._fh.fileno()
+            while remaining > 0:
+                data = os.pread(fd, min(chunk_size, remaining), offset)
+                if not data:
+                    break
+                offset += len(data)
+                remaining -= len(data)
+                yield data
+            return
+        with open(self.path, "rb") as fh:
+            fh.seek(offset)
+            while remaining > 0:
+                data = fh.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+
+def _coalesced_source(source, blob_cache):
+    """
+    Miss en la caché local: la lectura completa pasa por
+    BlobDiskCache.stream_fill, una sola descarga por (contenedor, blob, ETag)
+    aunque lleguen muchas peticiones a la vez. La descarga se escribe en
+    disco aparte y todas las peticiones leen esa copia a medida que crece
+    (no esperan a tener el archivo completo ni al cliente más lento).
+    Si no aplica (archivo grande, sin ETag) se transmite directo desde
+    Azure como antes. Sirve igual para AsyncAzureBlobSource.
+    """
+    if (
+        not getattr(settings, "BLOB_CACHE_SINGLE_FLIGHT", True)
+        or not source.etag
+        or source.size is None
+        or source.size > blob_cache.max_item_bytes
+    ):
+        blob_cache.record_miss()
+        return source
+
+    source.single_flight = True
+    return source
+
+
+def _open_from_metadata(meta, blob_cache):
+    if azure_breaker.is_open(meta.contenedor):
+        raise AzureUnavailableError(f"Circuito abierto para el contenedor {meta.contenedor}")
+    source = AzureBlobSource.from_metadata(meta, blob_cache=blob_cache)
+    if blob_cache is not None:
+        entry = blob_cache.get(meta.contenedor, meta.blob, source.etag)
+        if entry:
+            return LocalFileSource.from_cache(entry)
+    # miss: la descarga condicional empieza antes de responder (si otra
+    # petición de este proceso ya lo está descargando, se espera esa)
+    if blob_cache is None or not blob_cache.filling(meta.contenedor, meta.blob, source.etag):
+        source.start()
+    if blob_cache is None:
+        return source
+    return _coalesced_source(source, blob_cache)
+
+
+def _stale_source(blob_ref, meta):
+    """Última copia local conocida del blob (sin importar su antigüedad), o None."""
+    blob_cache = get_blob_cache()
+    if blob_cache is None:
+        return None
+    if meta and meta.contenedor:
+        location = (meta.contenedor, meta.blob)
+    else:
+        location = AzureFileProxy.cached_location(blob_ref)
+    entry = blob_cache.get_latest(*location) if location else None
+    if entry is None:
+        return None
+    source = LocalFileSource.from_cache(entry)
+    source.cache_status = "STALE"
+    return source
+
+
+def _open_azure_source(blob_ref: str):
+    nombre = AzureFileProxy._normalize_blob_name(blob_ref)
+    meta = obtener_metadatos(nombre)
+    try:
+        if meta and meta.contenedor and meta.etag:
+            try:
+                return _open_from_metadata(meta, get_blob_cache())
+            except (ResourceModifiedError, ResourceNotFoundError):
+                # el blob cambió fuera de Django (el registro ya se borró)
+                meta = None
+        return _locate_azure_source(blob_ref, nombre if not meta else None)
+    except AzureUnavailableError:
+        # Azure caído: mejor una copia vieja que un error
+        stale = _stale_source(blob_ref, meta)
+        if stale is None:
+            raise
+        return stale
+
+
+def _locate_azure_source(blob_ref: str, registrar_como=None):
+    blob_cache = get_blob_cache()
+    if blob_cache is not None:
+        # Copia local confirmada hace poco: no hace falta preguntar a Azure
+        location = AzureFileProxy.cached_location(blob_ref)
+        if location:
+            freshness = getattr(settings, "BLOB_CACHE_FRESHNESS", 60)
+            entry = blob_cache.get_latest(*location, max_age=freshness)
+            if entry:
+                return LocalFileSource.from_cache(entry)
+
+    blob_client, props = AzureFileProxy.locate_blob(blob_ref)
+    if registrar_como:
+        # archivo subido antes de la tabla de metadatos: se registra ahora
+        registrar_metadatos(registrar_como, **datos_desde_propiedades(blob_client, props))
+
+    source = AzureBlobSource(blob_client, props, blob_cache=blob_cache)
+    if blob_cache is None:
+        return source
+    if source.etag:
+        entry = blob_cache.get(blob_client.container_name, blob_client.blob_name, source.etag)
+        if entry:
+            # locate_blob acaba de confirmar el ETag contra Azure
+            blob_cache.confirm_latest(blob_client.container_name, blob_client.blob_name, source.etag)
+            return LocalFileSource.from_cache(entry)
+    return _coalesced_source(source, blob_cache)
+
+
+def open_file_source(blob_ref: str):
+    """
+    Devuelve la fuente del archivo según el almacenamiento configurado:
+    Azure (USE_AZURE_MEDIA, pasando por la caché local) o el disco local
+    en MEDIA_ROOT.
+    """
+    if getattr(settings, "USE_AZURE_MEDIA", False):
+        return _open_azure_source(blob_ref)
+
+    name = AzureFileProxy._normalize_blob_name(blob_ref)
+    if not name:
+        raise FileNotFoundError("Nombre de archivo vacío")
+
+    path = os.path.realpath(os.path.join(str(settings.MEDIA_ROOT), name))
+    media_root = os.path.realpath(str(settings.MEDIA_ROOT))
+    if not path.startswith(media_root + os.sep) or not os.path.isfile(path):
+        raise FileNotFoundError(f"Archivo no encontrado en MEDIA_ROOT: {name}")
+    return LocalFileSource(path)
@@ -1,6 +1,9 @@
 from django import template
+from django.conf import settings
 from django.urls import reverse
 
+from ..image_derivatives import supported_formats
+
 register = template.Library()
 
 
@@ -35,6 +38,25 @@ def azure_avatar_url(perfil):
     return reverse("serve_protected_file", args=["perfil", perfil.pk, "foto"])
 
 
+@register.simple_tag
+def azure_image_srcset(obj, field_name: str, fmt: str = "webp"):
+    """
+    srcset con las versiones reducidas de una foto, para <source srcset="...">.
+    Retorna "" si el formato no está disponible o el objeto no tiene foto.
+    """
+    if not obj or not getattr(obj, field_name, None):
+        return ""
+    if fmt not in supported_formats() + ["jpeg"]:
+        return ""
+
+    base_url = azure_file_url(obj, field_name)
+    if not base_url:
+        return ""
+
+    widths = sorted(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", []))
+    return ", ".join(f"{base_url}?w={w}&fmt={fmt} {w}w" for w in widths)
+
+
 @register.simple_tag
 def tiene_archivo(obj, field_name: str):
     """
@@ -12,7 +12,11 @@ Uso en templates:
 """
 
 from django import template
-from ..visibilidad import obtener_configuracion_visibilidad, seccion_activa
+from django.utils.safestring import mark_safe
+
+from ..fragmentos import render_fragmento
+from ..perfil_activo import obtener_perfil_activo
+from ..visibilidad import obtener_configuracion_request, seccion_activa
 
 register = template.Library()
 
@@ -26,13 +30,29 @@ def es_seccion_activa(config, nombre_seccion):
         return False
     return seccion_activa(config, nombre_seccion)
 
-@register.simple_tag
-def obtener_config_visibilidad(perfil_id=None):
+@register.simple_tag(takes_context=True)
+def obtener_config_visibilidad(context, perfil_id=None):
     """
-    Obtiene la configuración de visibilidad.
+    Obtiene la configuración de visibilidad (una sola vez por request).
     Uso: {% obtener_config_visibilidad as config %}
     """
-    return obtener_configuracion_visibilidad(perfil_id)
+    return obtener_configuracion_request(context.get("request"), perfil_id)
+
+@register.simple_tag(takes_context=True)
+def perfil_activo(context):
+    """
+    Perfil activo (el mismo objeto que usa la vista).
+    Uso: {% perfil_activo as perfil %}
+    """
+    return obtener_perfil_activo(context.get("request"))
+
+@register.simple_tag(takes_context=True)
+def fragmento_seccion(context, seccion):
+    """
+    HTML cacheado de una sección del CV (templates/cv/secciones/).
+    Uso: {% fragmento_seccion "cursos" %}
+    """
+    return mark_safe(render_fragmento(context.get("perfil"), seccion, context.get(seccion, [])))
 
 @register.simple_tag
 def mostrar_datos_personales(config):
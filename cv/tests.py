@@ -1,3 +1,805 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .blob_cache import BlobDiskCache, get_blob_cache
+from .bundles import bundle_members, members_etag
+from .circuit_breaker import CircuitBreaker
+from .file_responses import build_file_response, parse_range_header
+from .garage_catalogo import pagina_garage, productos_garage
+from .image_derivatives import derivative_name, get_or_create_derivative, render_derivative
+from .models import (
+    ConfiguracionVisibilidad,
+    CursosRealizados,
+    DatosPersonales,
+    MetadatosArchivo,
+    ProductosAcademicos,
+    SnapshotCV,
+    VentaGarage,
+)
+from .perfil_activo import _cargar_perfil_activo
+from .prerender import prerenderizar_todo
+from .secciones import SECCIONES
+from .snapshot import obtener_cv, reconstruir_snapshot
+from .storage_backends import AzureFileProxy, LocalFileSource, LocalMediaStorage, open_file_source
+from .views_async import serve_avatar_async
+from .warmup import calentar_worker
+
+# sección de cv/secciones.py -> índice parcial que debe usar su consulta
+INDICES_SECCIONES = {
+    "experiencias": "experiencia_visible_idx",
+    "cursos": "curso_visible_idx",
+    "reconocimientos": "reconocimiento_visible_idx",
+    "prod_acad": "prodacad_visible_idx",
+    "prod_lab": "prodlab_visible_idx",
+    "garage": "garage_visible_idx",
+}
+
+
+class IndicesConsultasTests(TestCase):
+    """EXPLAIN de las consultas de las vistas del CV: usan los índices parciales."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfil = DatosPersonales.objects.create(
+            nombres="Ana", apellidos="Paz", numerocedula="1300000001"
+        )
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            # con tablas de prueba tan chicas el planner preferiría un seq scan
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assertSinOrdenamiento(self, plan):
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Sort", plan)
+        elif connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_secciones_usan_indice_parcial(self):
+        self.assertEqual(set(INDICES_SECCIONES), {s.nombre for s in SECCIONES})
+        for seccion in SECCIONES:
+            with self.subTest(seccion=seccion.nombre):
+                plan = self.plan(seccion.queryset(self.perfil))
+                self.assertIn(INDICES_SECCIONES[seccion.nombre], plan)
+                self.assertSinOrdenamiento(plan)
+
+    def test_filtros_garage_usan_indice_parcial(self):
+        indices = {
+            "garage_disponible_idx": {"disponible": "1"},
+            "garage_no_disponible_idx": {"disponible": "0"},
+            "garage_estado_idx": {"estado": "Vendido"},
+        }
+        for indice, filtros in indices.items():
+            with self.subTest(indice=indice):
+                plan = self.plan(productos_garage(self.perfil, filtros).filter(idventagarage__lt=100)[:25])
+                self.assertIn(indice, plan)
+                self.assertSinOrdenamiento(plan)
+
+    def test_perfil_activo_usa_indice_parcial(self):
+        queryset = DatosPersonales.objects.filter(perfilactivo=1).order_by("idperfil")[:1]
+        self.assertEqual(_cargar_perfil_activo(), self.perfil)
+        plan = self.plan(queryset)
+        self.assertIn("datospersonales_activo_idx", plan)
+        self.assertSinOrdenamiento(plan)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PRERENDER_ENABLED=False,
+)
+class ConsultasHojaVidaTests(TestCase):
+    """Cantidad de consultas de una página completa del CV."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfil = DatosPersonales.objects.create(
+            nombres="Ana", apellidos="Paz", numerocedula="1300000002"
+        )
+        ConfiguracionVisibilidad.objects.create(perfil=cls.perfil, mostrar_venta_garage=True)
+        CursosRealizados.objects.create(idperfilconqueestaactivo=cls.perfil, nombrecurso="Curso visible")
+        ProductosAcademicos.objects.create(idperfilconqueestaactivo=cls.perfil, nombrerecurso="Recurso visible")
+        # TestCase no confirma la transacción: las señales no llegan a reconstruirlo
+        reconstruir_snapshot(cls.perfil.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hoja_vida_sin_cache(self):
+        # perfil activo + configuración + snapshot
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("hoja_vida"), secure=True)
+        self.assertContains(response, "Curso visible")
+        self.assertContains(response, "Recurso visible")
+
+    def test_hoja_vida_con_cache(self):
+        self.client.get(reverse("hoja_vida"), secure=True)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("hoja_vida"), secure=True)
+        self.assertContains(response, "Curso visible")
+
+    def test_secciones_ocultas(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("hoja_vida"), {"cursos": "0"}, secure=True)
+        self.assertNotContains(response, "Curso visible")
+        self.assertContains(response, "Recurso visible")
+
+    def test_garage_una_consulta_por_pagina(self):
+        # perfil activo + página del catálogo
+        with self.assertNumQueries(2):
+            self.client.get(reverse("garage"), secure=True)
+
+    def test_snapshot_se_reconstruye_al_guardar(self):
+        version = obtener_cv(self.perfil.pk)["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            curso = CursosRealizados.objects.get(idperfilconqueestaactivo=self.perfil)
+            curso.nombrecurso = "Curso editado"
+            curso.save()
+        cv = obtener_cv(self.perfil.pk)
+        self.assertEqual(cv["version"], version + 1)
+        self.assertEqual([c.nombrecurso for c in cv["cursos"]], ["Curso editado"])
+
+    def test_fragmento_no_se_regenera_con_el_snapshot_anterior(self):
+        self.client.get(reverse("hoja_vida"), secure=True)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            curso = CursosRealizados.objects.get(idperfilconqueestaactivo=self.perfil)
+            curso.nombrecurso = "Curso editado"
+            curso.save()
+        # confirmada la edición pero sin reconstruir todavía: sigue el fragmento anterior
+        self.assertContains(self.client.get(reverse("hoja_vida"), secure=True), "Curso visible")
+        # un request entre cada callback no debe dejar en caché el fragmento anterior
+        for callback in callbacks:
+            callback()
+            self.client.get(reverse("hoja_vida"), secure=True)
+        self.assertContains(self.client.get(reverse("hoja_vida"), secure=True), "Curso editado")
+
+    def test_sin_certificados_no_ofrece_el_zip(self):
+        response = self.client.get(reverse("hoja_vida"), secure=True)
+        self.assertNotContains(response, reverse("descargar_certificados"))
+        response = self.client.get(reverse("descargar_certificados"), secure=True)
+        self.assertEqual(response.status_code, 404)
+
+    def test_zip_revalidado_sin_abrir_archivos(self):
+        CursosRealizados.objects.create(
+            idperfilconqueestaactivo=self.perfil, nombrecurso="Con certificado", rutacertificado="cursos/a.pdf"
+        )
+        MetadatosArchivo.objects.create(nombre="cursos/a.pdf", tamano=3, sha256="abc")
+        reconstruir_snapshot(self.perfil.pk)
+        self.assertContains(self.client.get(reverse("hoja_vida"), secure=True), reverse("descargar_certificados"))
+
+        etag = members_etag(bundle_members(obtener_cv(self.perfil.pk)))
+        with mock.patch("cv.bundles.open_members", side_effect=AssertionError("no debe abrir archivos")):
+            response = self.client.get(reverse("descargar_certificados"), HTTP_IF_NONE_MATCH=etag, secure=True)
+        self.assertEqual(response.status_code, 304)
+
+    def test_prerender_con_request_interna(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(PRERENDER_DIR=directorio):
+            archivos = prerenderizar_todo()
+            self.assertIn("hoja_vida?", archivos)
+            with open(os.path.join(directorio, archivos["hoja_vida?"]), "rb") as fh:
+                self.assertIn(b"Curso visible", fh.read())
+
+    def test_calentar_worker(self):
+        # el worker cierra su conexión al terminar; dentro del test no
+        with mock.patch("cv.warmup.connection"), mock.patch("cv.warmup.calentar_paginas") as paginas:
+            calentar_worker()
+        paginas.assert_called_once_with()
+        loader = engines["django"].engine.template_loaders[0]
+        self.assertIn("garage.html", loader.get_template_cache)
+
+    def test_version_del_snapshot_recien_creado(self):
+        SnapshotCV.objects.filter(pk=self.perfil.pk).update(version=5, datos={})
+        self.assertEqual(obtener_cv(self.perfil.pk)["version"], 6)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PRERENDER_ENABLED=False,
+    GARAGE_PAGE_SIZE=2,
+)
+class CatalogoGarageTests(TestCase):
+    """Paginación por cursor y filtros de la venta garage."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfil = DatosPersonales.objects.create(
+            nombres="Ana", apellidos="Paz", numerocedula="1300000003"
+        )
+        for i, (estado, disponible) in enumerate(
+            [("Disponible", True), ("Vendido", False), ("Disponible", True), ("Reservado", True), ("Vendido", False)],
+            start=1,
+        ):
+            VentaGarage.objects.create(
+                idperfilconqueestaactivo=cls.perfil, nombreproducto=f"Producto {i}",
+                estadoproducto=estado, disponible=disponible, valordelbien=i * 10,
+            )
+        VentaGarage.objects.create(
+            idperfilconqueestaactivo=cls.perfil, nombreproducto="Oculto", activarparaqueseveaenfront=False
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def nombres(self, productos):
+        return [p.nombreproducto for p in productos]
+
+    def test_recorre_todas_las_paginas(self):
+        vistos, cursor = [], None
+        while True:
+            productos, cursor = pagina_garage(self.perfil, cursor=cursor, tamano=2)
+            vistos += self.nombres(productos)
+            if cursor is None:
+                break
+        self.assertEqual(vistos, [f"Producto {i}" for i in range(5, 0, -1)])
+
+    def test_filtros(self):
+        productos, _ = pagina_garage(self.perfil, {"disponible": "0"}, tamano=10)
+        self.assertEqual(self.nombres(productos), ["Producto 5", "Producto 2"])
+        productos, _ = pagina_garage(self.perfil, {"estado": "Disponible", "precio_min": "20"}, tamano=10)
+        self.assertEqual(self.nombres(productos), ["Producto 3"])
+        productos, _ = pagina_garage(self.perfil, {"precio_min": "20", "precio_max": "40"}, tamano=10)
+        self.assertEqual(self.nombres(productos), ["Producto 4", "Producto 3", "Producto 2"])
+
+    def test_endpoint_json(self):
+        response = self.client.get(reverse("garage"), {"disponible": "1"}, secure=True)
+        self.assertContains(response, "Producto 4")
+        self.assertNotContains(response, "Producto 1")
+        siguiente = response.context["siguiente"]
+
+        response = self.client.get(
+            reverse("garage_pagina"), {"disponible": "1", "cursor": siguiente}, secure=True
+        )
+        datos = response.json()
+        self.assertEqual(datos["cantidad"], 1)
+        self.assertIn("Producto 1", datos["html"])
+        self.assertIsNone(datos["siguiente"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    PRERENDER_ENABLED=False,
+)
+class WarmupTests(TestCase):
+    """manage.py warmup deja cada archivo de Azure en la caché local."""
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(
+            USE_AZURE_MEDIA=True,
+            BLOB_CACHE_DIR=directorio.name,
+            BLOB_CACHE_MAX_BYTES=10 ** 6,
+            BLOB_CACHE_MAX_ITEM_BYTES=10 ** 5,
+        ))
+        perfil = DatosPersonales.objects.create(nombres="Ana", apellidos="Paz", numerocedula="1300000002")
+        self.contenido = {"cursos/a.pdf": b"pdf a", "cursos/b.pdf": b"pdf b" * 10}
+        for nombre in self.contenido:
+            CursosRealizados.objects.create(
+                idperfilconqueestaactivo=perfil, nombrecurso=nombre, rutacertificado=nombre
+            )
+
+    def localizar(self, nombre):
+        blob_client = SimpleNamespace(container_name="media", blob_name=nombre)
+        props = SimpleNamespace(
+            size=len(self.contenido[nombre]), etag=f"e-{nombre}", last_modified=None, content_settings=None
+        )
+        return blob_client, props
+
+    def descargar(self, blob_client, offset=None, length=None, etag=None):
+        return iter([self.contenido[blob_client.blob_name]])
+
+    def test_warmup_llena_la_cache_de_blobs(self):
+        # los hilos del comando no ven la transacción del test: sin registrar metadatos
+        with mock.patch.object(AzureFileProxy, "locate_blob", side_effect=self.localizar), \
+                mock.patch.object(AzureFileProxy, "iter_blob_chunks", side_effect=self.descargar) as descargas, \
+                mock.patch("cv.storage_backends.registrar_metadatos"):
+            call_command("warmup", "--skip-derivatives", "--skip-pages", stdout=io.StringIO())
+        self.assertEqual(descargas.call_count, 2)
+
+        blob_cache = get_blob_cache()
+        for nombre, datos in self.contenido.items():
+            entrada = blob_cache.get("media", nombre, f'"e-{nombre}"')
+            self.assertIsNotNone(entrada, nombre)
+            with entrada.fh:
+                self.assertEqual(entrada.fh.read(), datos)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    USE_AZURE_MEDIA=True,
+    BLOB_CACHE_MAX_BYTES=0,
+)
+class DescargaDesdeMetadatosTests(TestCase):
+    """Archivos con registro en MetadatosArchivo: sin HEAD antes de descargar."""
+
+    def setUp(self):
+        cache.clear()
+        MetadatosArchivo.objects.create(
+            nombre="cursos/a.pdf", contenedor="media", blob="cursos/a.pdf", tamano=5, etag="0x1"
+        )
+        self.blob_client = self.cliente(b"hola!")
+        patcher = mock.patch.object(AzureFileProxy, "_get_blob_client", return_value=self.blob_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def cliente(contenido):
+        blob_client = mock.Mock(container_name="media", blob_name="cursos/a.pdf")
+        blob_client.download_blob.return_value.chunks.return_value = iter([contenido])
+        return blob_client
+
+    def test_una_sola_peticion_a_azure(self):
+        source = open_file_source("cursos/a.pdf")
+        # la descarga condicional ya empezó antes de armar la respuesta
+        self.blob_client.download_blob.assert_called_once_with(
+            offset=None, length=None, etag="0x1", match_condition=MatchConditions.IfNotModified
+        )
+        self.assertEqual(b"".join(source.iter_range()), b"hola!")
+        self.blob_client.download_blob.assert_called_once()
+        self.blob_client.get_blob_properties.assert_not_called()
+
+    def test_blob_cambiado_se_vuelve_a_buscar(self):
+        error = ResourceModifiedError("cambió")
+        error.status_code = 412
+        self.blob_client.download_blob.side_effect = error
+        nuevo = self.cliente(b"nuevo")
+        props = SimpleNamespace(size=5, etag="0x2", last_modified=None, content_settings=None)
+        with mock.patch.object(AzureFileProxy, "locate_blob", return_value=(nuevo, props)):
+            source = open_file_source("cursos/a.pdf")
+        # el error llegó al abrir, no a mitad de la respuesta
+        self.assertEqual(source.etag, '"0x2"')
+        self.assertEqual(b"".join(source.iter_range()), b"nuevo")
+        self.assertEqual(MetadatosArchivo.objects.get(nombre="cursos/a.pdf").etag, "0x2")
+
+
+class VistasAsyncTests(TestCase):
+    """Vistas ASGI de cv/views_async.py."""
+
+    async def test_avatar_por_defecto_sin_file_response(self):
+        perfil = await DatosPersonales.objects.acreate(nombres="Ana", apellidos="Paz", numerocedula="1300000002")
+        with tempfile.TemporaryDirectory() as base:
+            os.makedirs(os.path.join(base, "static", "img"))
+            with open(os.path.join(base, "static", "img", "default-avatar.png"), "wb") as fh:
+                fh.write(b"png")
+            with override_settings(BASE_DIR=base):
+                response = await serve_avatar_async(RequestFactory().get("/"), perfil.pk)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b"png")
+
+
+class BlobDiskCacheTests(SimpleTestCase):
+    """Contador de tamaño y expulsión de la caché local de blobs."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.blob_cache = BlobDiskCache(self.directorio.name, max_bytes=250, max_item_bytes=100)
+
+    def guardar(self, nombre, datos=b"x" * 100):
+        return self.blob_cache.store("c", nombre, '"e"', [datos])
+
+    def test_contador_de_tamano(self):
+        self.guardar("a")
+        self.guardar("b", b"y" * 50)
+        self.assertEqual(self.blob_cache.stats()["bytes"], 150)
+        # la misma entrada guardada de nuevo no suma dos veces
+        self.guardar("b", b"y" * 50)
+        self.assertEqual(self.blob_cache.stats()["bytes"], 150)
+
+    def test_expulsa_al_superar_el_presupuesto(self):
+        for nombre in ("a", "b", "c"):
+            self.guardar(nombre)
+        self.assertLessEqual(self.blob_cache.stats()["bytes"], 250)
+        self.assertIsNotNone(self.blob_cache.get("c", "c", '"e"'))
+
+    def test_entrada_abierta_sobrevive_a_la_expulsion(self):
+        entrada = self.guardar("a", b"contenido")
+        entrada = self.blob_cache.get("c", "a", '"e"')
+        for nombre in ("b", "c", "d"):
+            self.guardar(nombre)
+        self.assertIsNone(self.blob_cache.get("c", "a", '"e"'))
+        self.assertEqual(entrada.fh.read(), b"contenido")
+
+    def test_acierto_no_escribe_en_disco(self):
+        self.guardar("a")
+        latest = self.blob_cache._latest_path("c", "a")
+        antes = os.stat(latest).st_mtime_ns
+        with mock.patch.object(self.blob_cache, "_write_atomic") as escribir:
+            self.blob_cache.get("c", "a", '"e"')
+            self.blob_cache.confirm_latest("c", "a", '"e"')
+        escribir.assert_not_called()
+        self.assertGreaterEqual(os.stat(latest).st_mtime_ns, antes)
+
+    def test_lider_transmite_antes_de_terminar_la_descarga(self):
+        liberar = threading.Event()
+        descargas = []
+
+        def descargar():
+            descargas.append(1)
+            yield b"primero"
+            liberar.wait(5)
+            yield b"resto"
+
+        lider = self.blob_cache.stream_fill("c", "a", '"e"', descargar, 12)
+        self.assertEqual(next(lider), b"primero")
+
+        # otra petición espera la copia en disco en vez de descargar de nuevo
+        resultado = []
+        seguidor = threading.Thread(
+            target=lambda: resultado.append(b"".join(self.blob_cache.stream_fill("c", "a", '"e"', descargar, 12)))
+        )
+        seguidor.start()
+        liberar.set()
+        self.assertEqual(b"".join(lider), b"resto")
+        seguidor.join(5)
+        self.assertEqual(resultado, [b"primeroresto"])
+        self.assertEqual(len(descargas), 1)
+
+    def test_descarga_no_depende_del_cliente_lider(self):
+        descargas = []
+
+        def descargar():
+            descargas.append(1)
+            for parte in (b"uno", b"dos", b"tres"):
+                time.sleep(0.05)
+                yield parte
+
+        # el cliente de la primera petición lee un bloque y se queda quieto
+        lider = self.blob_cache.stream_fill("c", "a", '"e"', descargar, 10, timeout=5)
+        self.assertEqual(next(lider), b"uno")
+
+        resultados = []
+        seguidores = [
+            threading.Thread(target=lambda: resultados.append(
+                b"".join(self.blob_cache.stream_fill("c", "a", '"e"', descargar, 10, timeout=5))
+            ))
+            for _ in range(3)
+        ]
+        for hilo in seguidores:
+            hilo.start()
+        for hilo in seguidores:
+            hilo.join(2)
+        self.assertEqual(resultados, [b"unodostres"] * 3)
+        self.assertFalse(self.blob_cache.filling("c", "a", '"e"'))
+
+        # y si se desconecta, la copia ya quedó guardada
+        lider.close()
+        self.assertEqual(len(descargas), 1)
+        self.assertEqual(self.blob_cache.get("c", "a", '"e"').fh.read(), b"unodostres")
+
+    def test_cliente_lider_desconectado_no_corta_la_descarga(self):
+        descargas = []
+        liberar = threading.Event()
+
+        def descargar():
+            descargas.append(1)
+            yield b"primero"
+            liberar.wait(5)
+            yield b"resto"
+
+        lider = self.blob_cache.stream_fill("c", "a", '"e"', descargar, 12)
+        next(lider)
+        lider.close()
+        liberar.set()
+        seguidor = b"".join(self.blob_cache.stream_fill("c", "a", '"e"', descargar, 12))
+        self.assertEqual(seguidor, b"primeroresto")
+        self.assertEqual(len(descargas), 1)
+
+    def test_claves_distintas_no_se_esperan(self):
+        def lento():
+            time.sleep(0.5)
+            yield b"x"
+
+        hilos = [
+            threading.Thread(target=lambda n=nombre: b"".join(self.blob_cache.stream_fill("c", n, '"e"', lento, 1)))
+            # con 64 archivos de bloqueo compartidos estas claves caían en el mismo
+            for nombre in ("a", "b44", "b52", "b67")
+        ]
+        inicio = time.monotonic()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertLess(time.monotonic() - inicio, 1.5)
+
+    def test_estado_solo_para_staff(self):
+        url = reverse("estado_cache_blobs")
+        with override_settings(BLOB_CACHE_DIR=self.directorio.name, BLOB_CACHE_MAX_BYTES=250):
+            self.assertEqual(self.client.get(url, secure=True).status_code, 302)
+            staff = mock.Mock(is_active=True, is_staff=True)
+            with mock.patch("django.contrib.auth.middleware.get_user", return_value=staff):
+                datos = self.client.get(url, secure=True).json()
+        self.assertTrue(datos["habilitada"])
+        self.assertEqual({"hits", "misses", "evictions", "bytes"} - datos.keys(), set())
+
+    def test_astream_fill_una_sola_descarga(self):
+        descargas = []
+
+        async def descargar():
+            descargas.append(1)
+            yield b"abc"
+            await asyncio.sleep(0.05)
+            yield b"def"
+
+        async def leer():
+            return b"".join([c async for c in self.blob_cache.astream_fill("c", "a", '"e"', descargar, 6)])
+
+        async def main():
+            return await asyncio.gather(leer(), leer(), leer())
+
+        self.assertEqual(asyncio.run(main()), [b"abcdef"] * 3)
+        self.assertEqual(len(descargas), 1)
+        self.assertIsNotNone(self.blob_cache.get("c", "a", '"e"'))
+
+    def test_astream_fill_sigue_sin_el_cliente_lider(self):
+        descargas = []
+
+        async def descargar():
+            descargas.append(1)
+            yield b"abc"
+            await asyncio.sleep(0.05)
+            yield b"def"
+
+        async def main():
+            lider = self.blob_cache.astream_fill("c", "a", '"e"', descargar, 6)
+            await lider.__anext__()
+            await lider.aclose()
+            return b"".join([c async for c in self.blob_cache.astream_fill("c", "a", '"e"', descargar, 6)])
+
+        self.assertEqual(asyncio.run(main()), b"abcdef")
+        self.assertEqual(len(descargas), 1)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    USE_AZURE_MEDIA=False,
+)
+class DerivadasImagenTests(SimpleTestCase):
+    """Versiones reducidas de las fotos (cv/image_derivatives.py)."""
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directorio.name))
+        os.makedirs(os.path.join(directorio.name, "fotos"))
+        Image.new("RGB", (640, 10)).save(os.path.join(directorio.name, "fotos", "a.png"))
+
+        # registros de MetadatosArchivo simulados: nombre -> (versión, fecha de registro)
+        self.metadatos = {}
+        self.enterContext(mock.patch(
+            "cv.image_derivatives.obtener_metadatos", side_effect=lambda nombre: self.metadatos.get(nombre)
+        ))
+        self.enterContext(mock.patch(
+            "cv.image_derivatives.save_derived_file", side_effect=lambda _o, derivada, *_a: self.registrar(derivada)
+        ))
+        self.render = self.enterContext(mock.patch(
+            "cv.image_derivatives.render_derivative", side_effect=lambda *_a: time.sleep(0.1) or b"x"
+        ))
+
+    def registrar(self, nombre, sha256=""):
+        self.metadatos[nombre] = SimpleNamespace(etag="", sha256=sha256, fecha_registro=datetime.now())
+
+    def test_nombre_conserva_la_extension(self):
+        self.assertEqual(derivative_name("garage/foto.jpg", 320, "webp"), "garage/foto.jpg__w320.webp")
+        self.assertNotEqual(derivative_name("foto.jpg", 320, "webp"), derivative_name("foto.png", 320, "webp"))
+
+    def test_una_sola_generacion_concurrente(self):
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(get_or_create_derivative("fotos/a.png", 320, "jpeg")))
+            for _ in range(4)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(5)
+        self.assertEqual(resultados, ["fotos/a.png__w320.jpeg"] * 4)
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_original_reemplazado_genera_otra(self):
+        self.registrar("fotos/a.png", sha256="1")
+        get_or_create_derivative("fotos/a.png", 320, "jpeg")
+        # sin la caché compartida, la derivada registrada sigue sirviendo
+        cache.clear()
+        get_or_create_derivative("fotos/a.png", 320, "jpeg")
+        self.assertEqual(self.render.call_count, 1)
+
+        self.registrar("fotos/a.png", sha256="2")
+        get_or_create_derivative("fotos/a.png", 320, "jpeg")
+        self.assertEqual(self.render.call_count, 2)
+
+    @override_settings(IMAGE_DERIVATIVE_MAX_PIXELS=100)
+    def test_limite_de_pixeles_sin_tocar_pillow(self):
+        limite_global = Image.MAX_IMAGE_PIXELS
+        datos = io.BytesIO()
+        Image.new("RGB", (20, 10)).save(datos, format="PNG")
+        with self.assertRaises(ValueError):
+            render_derivative(datos.getvalue(), 10, "jpeg")
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, limite_global)
+
+
+class RangosTests(SimpleTestCase):
+    """Range, If-Range y GET condicional de cv/file_responses.py."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.path = os.path.join(directorio.name, "a.txt")
+        with open(self.path, "wb") as fh:
+            fh.write(b"0123456789")
+        self.factory = RequestFactory()
+
+    def responder(self, **headers):
+        source = LocalFileSource(self.path, etag='"v1"')
+        return build_file_response(self.factory.get("/", **headers), source, "text/plain")
+
+    @staticmethod
+    def cuerpo(response):
+        return b"".join(response.streaming_content)
+
+    def test_parse_range_header(self):
+        self.assertIsNone(parse_range_header(None, 10))
+        self.assertIsNone(parse_range_header("items=0-1", 10))
+        self.assertIsNone(parse_range_header("bytes=5-2", 10))
+        self.assertEqual(parse_range_header("bytes=0-1", 10), [(0, 1)])
+        self.assertEqual(parse_range_header("bytes=-3", 10), [(7, 9)])
+        self.assertEqual(parse_range_header("bytes=8-", 10), [(8, 9)])
+        # solapados o contiguos se fusionan
+        self.assertEqual(parse_range_header("bytes=4-6,0-1,2-3", 10), [(0, 6)])
+        self.assertEqual(parse_range_header("bytes=20-30", 10), [])
+        self.assertIsNone(parse_range_header("bytes=" + ",".join(["0-0"] * 11), 10))
+
+    def test_archivo_completo(self):
+        response = self.responder()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self.cuerpo(response), b"0123456789")
+
+    def test_un_rango(self):
+        response = self.responder(HTTP_RANGE="bytes=2-4")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-4/10")
+        self.assertEqual(response["Content-Length"], "3")
+        self.assertEqual(self.cuerpo(response), b"234")
+
+    def test_rango_no_satisfacible(self):
+        response = self.responder(HTTP_RANGE="bytes=20-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_varios_rangos(self):
+        response = self.responder(HTTP_RANGE="bytes=0-1,5-6")
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges; boundary="))
+        cuerpo = self.cuerpo(response)
+        self.assertEqual(len(cuerpo), int(response["Content-Length"]))
+        self.assertIn(b"Content-Range: bytes 0-1/10\r\n\r\n01", cuerpo)
+        self.assertIn(b"Content-Range: bytes 5-6/10\r\n\r\n56", cuerpo)
+
+    def test_if_range(self):
+        # validador vigente: se respeta el rango; si cambió, archivo completo
+        self.assertEqual(self.responder(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"v1"').status_code, 206)
+        self.assertEqual(self.responder(HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"v0"').status_code, 200)
+
+    def test_if_none_match(self):
+        response = self.responder(HTTP_IF_NONE_MATCH='"v1"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"v1"')
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Estados del circuit breaker de cv/circuit_breaker.py."""
+
+    def setUp(self):
+        self.ahora = 100.0
+        self.enterContext(mock.patch("cv.circuit_breaker.time.monotonic", side_effect=lambda: self.ahora))
+        self.breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    def test_se_abre_al_llegar_al_umbral(self):
+        self.breaker.record_failure("media")
+        self.assertTrue(self.breaker.allow("media"))
+        self.breaker.record_failure("media")
+        self.assertTrue(self.breaker.is_open("media"))
+        self.assertFalse(self.breaker.allow("media"))
+        # el éxito reinicia la cuenta de fallas
+        self.assertTrue(self.breaker.allow("otro"))
+
+    def test_semiabierto_deja_pasar_una_prueba(self):
+        self.breaker.record_failure("media")
+        self.breaker.record_failure("media")
+        self.ahora += 31
+        self.assertFalse(self.breaker.is_open("media"))
+        self.assertTrue(self.breaker.allow("media"))
+        # mientras la prueba está en curso, el resto sigue fallando rápido
+        self.assertFalse(self.breaker.allow("media"))
+        self.breaker.record_success("media")
+        self.assertTrue(self.breaker.allow("media"))
+        self.assertFalse(self.breaker.is_open("media"))
+
+    def test_prueba_fallida_vuelve_a_abrir(self):
+        self.breaker.record_failure("media")
+        self.breaker.record_failure("media")
+        self.ahora += 31
+        self.assertTrue(self.breaker.allow("media"))
+        self.breaker.record_failure("media")
+        self.assertTrue(self.breaker.is_open("media"))
+        self.assertFalse(self.breaker.allow("media"))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    AZURE_CONTAINER="media",
+    AZURE_CONTAINER_FALLBACKS="",
+)
+class UbicacionAzureTests(SimpleTestCase):
+    """Caché negativa de locate_blob y caché de URLs SAS."""
+
+    def setUp(self):
+        cache.clear()
+
+    def no_existe(self, container, blob_name):
+        error = ResourceNotFoundError("no existe")
+        error.status_code = 404
+        raise error
+
+    def test_404_se_recuerda(self):
+        with mock.patch.object(AzureFileProxy, "_probe", side_effect=self.no_existe) as probe:
+            with self.assertRaises(FileNotFoundError):
+                AzureFileProxy.locate_blob("cursos/a.pdf")
+            intentos = probe.call_count
+            with self.assertRaises(FileNotFoundError):
+                AzureFileProxy.locate_blob("cursos/a.pdf")
+        self.assertEqual(probe.call_count, intentos)
+        # subir el archivo borra la marca
+        AzureFileProxy.forget_missing("cursos/a.pdf")
+        self.assertIsNone(cache.get(AzureFileProxy._missing_cache_key("cursos/a.pdf")))
+
+    @override_settings(AZURE_ACCOUNT_NAME="cuenta", AZURE_ACCOUNT_KEY="Y2xhdmU=")
+    def test_sas_se_reutiliza(self):
+        blob_client = mock.Mock(url="https://cuenta.blob.core.windows.net/media/cursos/a.pdf")
+        with mock.patch.object(AzureFileProxy, "resolve_location", return_value=("media", "cursos/a.pdf")), \
+                mock.patch.object(AzureFileProxy, "_get_blob_client", return_value=blob_client), \
+                mock.patch("cv.storage_backends.generate_blob_sas", return_value="sig=1") as generar:
+            primera = AzureFileProxy.generate_sas_url("cursos/a.pdf", expiry_seconds=3600)
+            segunda = AzureFileProxy.generate_sas_url("cursos/a.pdf", expiry_seconds=3600)
+        self.assertEqual(primera, f"{blob_client.url}?sig=1")
+        self.assertEqual(segunda, primera)
+        generar.assert_called_once()
+
+
+class MetadatosAlSubirTests(TestCase):
+    """MetadataStorageMixin registra cada archivo subido."""
+
+    def test_guardar_registra_metadatos(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            storage = LocalMediaStorage(location=directorio)
+            nombre = storage.save("cursos/a.txt", ContentFile(b"hola"))
+            meta = MetadatosArchivo.objects.get(nombre=nombre)
+            self.assertEqual(meta.tamano, 4)
+            self.assertEqual(meta.sha256, hashlib.sha256(b"hola").hexdigest())
+            self.assertEqual(meta.content_type, "text/plain")
+
+            storage.delete(nombre)
+            self.assertFalse(MetadatosArchivo.objects.filter(nombre=nombre).exists())
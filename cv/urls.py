@@ -1,13 +1,22 @@
 #cv/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_FILE_PROXY:
+    from .views_async import serve_protected_file_async as serve_protected_file
+    from .views_async import serve_avatar_async as serve_avatar
+else:
+    serve_protected_file = views.serve_protected_file
+    serve_avatar = views.serve_avatar
+
 urlpatterns = [
     # Garage Management
     path('', views.garage, name='garage'),
+    path('pagina/', views.garage_pagina, name='garage_pagina'),
     
     # Protected files
-    path('protected/media/avatar/<int:perfil_id>/', views.serve_avatar, name='serve_avatar'),
+    path('protected/media/avatar/<int:perfil_id>/', serve_avatar, name='serve_avatar'),
     path('protected/media/<str:file_type>/<int:model_id>/<str:field_name>/', 
-         views.serve_protected_file, name='serve_protected_file'),
+         serve_protected_file, name='serve_protected_file'),
 ]
\ No newline at end of file
@@ -1,111 +1,61 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, Http404, FileResponse, JsonResponse
-from django.views.decorators.cache import cache_control
+from django.template.loader import render_to_string
+from django.http import HttpResponse, HttpResponseRedirect, Http404, FileResponse, JsonResponse
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 
 from .models import (
     DatosPersonales,
     ExperienciaLaboral,
     CursosRealizados,
     Reconocimientos,
-    ProductosAcademicos,
-    ProductosLaborales,
     VentaGarage,
 )
-from .storage_backends import AzureFileProxy
+from .storage_backends import (
+    AzureFileProxy,
+    AzureUnavailableError,
+    azure_circuit_open,
+    delivery_mode,
+    open_file_source,
+)
+from .perfil_activo import obtener_perfil_activo
+from .secciones import cargar_secciones, secciones_vacias, sections_config_desde_request
+from .snapshot import obtener_cv, secciones_visibles
+from .prerender import servir_prerenderizada
+from .pdf_export import pdf_disponible, pdf_response
+from .fragmentos import fragmentos_pendientes
+from .garage_catalogo import (
+    ESTADOS,
+    cursor_desde_request,
+    filtros_desde_request,
+    pagina_garage,
+    querystring,
+    tamano_desde_request,
+)
+from .blob_cache import get_blob_cache
+from .bundles import bundle_members, bundle_response, hay_certificados
+from .file_responses import blob_filename, build_file_response, guess_content_type
+from .image_derivatives import IMAGE_FIELDS, get_or_create_derivative, normalize_width, supported_formats
 
-import mimetypes
 import os
 
 
 def print_preview_improved(request):
     """Vista mejorada para la vista previa de impresión"""
+    sections_config = sections_config_desde_request(request)
     try:
         # Obtener perfil con manejo seguro
-        perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
-        
+        perfil = obtener_perfil_activo(request)
+
         # Obtener configuración de visibilidad
-        from .visibilidad import obtener_configuracion_visibilidad
-        config = obtener_configuracion_visibilidad(perfil.idperfil) if perfil else None
-        
-        # Obtener configuraciones desde URL
-        sections_config = {
-            "datos_personales": request.GET.get("datos-personales", "1") == "1",
-            "experiencia": request.GET.get("experiencia", "1") == "1",
-            "cursos": request.GET.get("cursos", "1") == "1",
-            "reconocimientos": request.GET.get("reconocimientos", "1") == "1",
-            "productos_academicos": request.GET.get("productos-academicos", "1") == "1",
-            "productos_laborales": request.GET.get("productos-laborales", "1") == "1",
-            "venta_garage": request.GET.get("venta-garage", "1") == "1",
-        }
-        
-        # Obtener los modelos con manejo seguro
-        context_data = {}
-        
+        from .visibilidad import obtener_configuracion_request
+        config = obtener_configuracion_request(request, perfil.idperfil) if perfil else None
+
+        # Solo se consultan las secciones visibles
         if perfil and config:
-            try:
-                context_data["experiencias"] = ExperienciaLaboral.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechafingestion')
-            except Exception as e:
-                print(f"Error cargando experiencias: {e}")
-                context_data["experiencias"] = []
-
-            try:
-                context_data["cursos"] = CursosRealizados.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechafin')
-            except Exception as e:
-                print(f"Error cargando cursos: {e}")
-                context_data["cursos"] = []
-
-            try:
-                context_data["reconocimientos"] = Reconocimientos.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechareconocimiento')
-            except Exception as e:
-                print(f"Error cargando reconocimientos: {e}")
-                context_data["reconocimientos"] = []
-
-            try:
-                context_data["prod_acad"] = ProductosAcademicos.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                )
-            except Exception as e:
-                print(f"Error cargando productos académicos: {e}")
-                context_data["prod_acad"] = []
-
-            try:
-                context_data["prod_lab"] = ProductosLaborales.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechaproducto')
-            except Exception as e:
-                print(f"Error cargando productos laborales: {e}")
-                context_data["prod_lab"] = []
-
-            try:
-                context_data["garage"] = VentaGarage.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-idventagarage')
-            except Exception as e:
-                print(f"Error cargando garage: {e}")
-                context_data["garage"] = []
+            context_data = secciones_visibles(obtener_cv(perfil.idperfil), config, sections_config)
         else:
-            # Si no hay perfil o config, datos vacíos
-            context_data = {
-                "experiencias": [],
-                "cursos": [],
-                "reconocimientos": [],
-                "prod_acad": [],
-                "prod_lab": [],
-                "garage": [],
-            }
+            context_data = secciones_vacias()
 
         context = {
             "perfil": perfil,
@@ -121,163 +71,51 @@ def print_preview_improved(request):
         return render(request, "hoja_vida_print_improved.html", {
             "perfil": None,
             "config": None,
-            "experiencias": [],
-            "cursos": [],
-            "reconocimientos": [],
-            "prod_acad": [],
-            "prod_lab": [],
-            "garage": [],
-            "sections_config": {
-                "datos_personales": False,
-                "experiencia": False,
-                "cursos": False,
-                "reconocimientos": False,
-                "productos_academicos": False,
-                "productos_laborales": False,
-                "vista_garage": False,
-            }
-        })
-
-def hoja_vida(request):
-    """Vista original para hoja de vida"""
-    try:
-        # Obtener perfil con manejo seguro
-        perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
-        
-        # Obtener configuración de visibilidad
-        from .visibilidad import obtener_configuracion_visibilidad
-        config = obtener_configuracion_visibilidad(perfil.idperfil) if perfil else None
-        
-        # Obtener los modelos con manejo seguro de errores
-        context_data = {}
-
-        if perfil and config:
-            # Experiencias
-            try:
-                context_data["experiencias"] = ExperienciaLaboral.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechafingestion')
-            except Exception as e:
-                print(f"Error cargando experiencias: {e}")
-                context_data["experiencias"] = []
-
-            # Cursos
-            try:
-                context_data["cursos"] = CursosRealizados.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechafin')
-            except Exception as e:
-                print(f"Error cargando cursos: {e}")
-                context_data["cursos"] = []
-
-            # Reconocimientos
-            try:
-                context_data["reconocimientos"] = Reconocimientos.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechareconocimiento')
-            except Exception as e:
-                print(f"Error cargando reconocimientos: {e}")
-                context_data["reconocimientos"] = []
-
-            # Productos Académicos
-            try:
-                context_data["prod_acad"] = ProductosAcademicos.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                )
-            except Exception as e:
-                print(f"Error cargando productos académicos: {e}")
-                context_data["prod_acad"] = []
-
-            # Productos Laborales
-            try:
-                context_data["prod_lab"] = ProductosLaborales.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-fechaproducto')
-            except Exception as e:
-                print(f"Error cargando productos laborales: {e}")
-                context_data["prod_lab"] = []
-
-            # Garage
-            try:
-                context_data["garage"] = VentaGarage.objects.filter(
-                    idperfilconqueestaactivo=perfil,
-                    activarparaqueseveaenfront=True
-                ).order_by('-idventagarage')
-            except Exception as e:
-                print(f"Error cargando garage: {e}")
-                context_data["garage"] = []
-
-        context = {
-            "perfil": perfil,
-            "config": config,
-            **context_data,
-        }
-
-        return render(request, "hoja_vida_print.html", context)
-
-    except Exception as e:
-        print(f"Error general en hoja_vida: {e}")
-        return render(request, "hoja_vida_print.html", {
-            "perfil": None,
-            "config": None,
-            "experiencias": [],
-            "cursos": [],
-            "reconocimientos": [],
-            "prod_acad": [],
-            "prod_lab": [],
-            "garage": [],
+            **secciones_vacias(),
+            "sections_config": {clave: False for clave in sections_config},
         })
 
 
 def hoja_vida(request):
-    perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+    prerenderizada = servir_prerenderizada(request, "hoja_vida")
+    if prerenderizada is not None:
+        return prerenderizada
+
+    perfil = obtener_perfil_activo(request)
 
     # Verificar si es vista previa o descarga
     is_preview = request.GET.get('preview') == '1'
     is_download = request.GET.get('download') == '1'
 
     # Obtener configuraciones de secciones desde URL o usar valores por defecto
-    sections_config = {
-        "datos_personales": request.GET.get("datos-personales", "1") == "1",
-        "experiencia": request.GET.get("experiencia", "1") == "1",
-        "cursos": request.GET.get("cursos", "1") == "1",
-        "reconocimientos": request.GET.get("reconocimientos", "1") == "1",
-        "productos_academicos": request.GET.get("productos-academicos", "1") == "1",
-        "productos_laborales": request.GET.get("productos-laborales", "1") == "1",
-        "venta_garage": request.GET.get("venta-garage", "1") == "1",
-    }
+    sections_config = sections_config_desde_request(request)
+
+    from .visibilidad import obtener_configuracion_request
+    config = obtener_configuracion_request(request, perfil.idperfil) if perfil else None
+
+    # descarga: el PDF generado en el servidor (cacheado por versión y secciones)
+    if is_download and perfil and pdf_disponible():
+        try:
+            response = pdf_response(request, perfil, config, sections_config)
+            response["Content-Disposition"] = f'attachment; filename="CV_{perfil.nombres}_{perfil.apellidos}.pdf"'
+            return response
+        except Exception as e:
+            print(f"Error generando PDF del CV: {e}")
+
+    # con todos los fragmentos en caché las secciones no se leen (querysets
+    # perezosos); si falta alguno, salen del snapshot en una sola consulta
+    cv = None
+    if perfil and fragmentos_pendientes(perfil.pk):
+        cv = obtener_cv(perfil.pk)
+        secciones = secciones_visibles(cv, config, sections_config)
+    else:
+        secciones = cargar_secciones(perfil, config, sections_config)
 
     context = {
         "perfil": perfil,
-        "experiencias": ExperienciaLaboral.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
-        "cursos": CursosRealizados.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
-        "reconocimientos": Reconocimientos.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
-        "prod_acad": ProductosAcademicos.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
-        "prod_lab": ProductosLaborales.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
-        "garage": VentaGarage.objects.filter(
-            idperfilconqueestaactivo=perfil,
-            activarparaqueseveaenfront=True
-        ) if perfil else [],
+        **secciones,
+        # el botón del ZIP solo si hay algo para descargar
+        "hay_certificados": hay_certificados(perfil.pk, cv) if perfil else False,
         "is_preview": is_preview,
         "is_download": is_download,
         "sections_config": sections_config,
@@ -296,39 +134,106 @@ def hoja_vida(request):
 
 def garage(request):
     """Vista para la página de venta garage"""
-    perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+    prerenderizada = servir_prerenderizada(request, "garage")
+    if prerenderizada is not None:
+        return prerenderizada
+
+    perfil = obtener_perfil_activo(request)
     
     if not perfil:
         raise Http404("Perfil no encontrado")
     
-    productos = VentaGarage.objects.filter(
-        idperfilconqueestaactivo=perfil,
-        activarparaqueseveaenfront=True
-    ).order_by('-idventagarage')
+    filtros = filtros_desde_request(request)
+    productos, siguiente = pagina_garage(
+        perfil, filtros, cursor_desde_request(request), tamano_desde_request(request)
+    )
     
     context = {
         "perfil": perfil,
         "garage": productos,
+        "filtros": filtros,
+        "filtros_qs": querystring(filtros),
+        "estados": ESTADOS,
+        "siguiente": siguiente,
+        "siguiente_qs": querystring(filtros, cursor=siguiente) if siguiente else "",
     }
     
     return render(request, "garage.html", context)
 
 
-def serve_protected_file(request, file_type, model_id, field_name):
-    model_map = {
-        "perfil": DatosPersonales,
-        "experiencia": ExperienciaLaboral,
-        "curso": CursosRealizados,
-        "reconocimiento": Reconocimientos,
-        "garage": VentaGarage,
-    }
+def garage_pagina(request):
+    """Página siguiente del catálogo en JSON (scroll infinito de garage.html)."""
+    perfil = obtener_perfil_activo(request)
+    if not perfil:
+        return JsonResponse({"error": "Perfil no encontrado"}, status=404)
+
+    filtros = filtros_desde_request(request)
+    productos, siguiente = pagina_garage(
+        perfil, filtros, cursor_desde_request(request), tamano_desde_request(request)
+    )
+    html = render_to_string("cv/garage_productos.html", {"garage": productos}, request=request)
+    return JsonResponse({
+        "html": html,
+        "cantidad": len(productos),
+        "siguiente": siguiente,
+        "siguiente_qs": querystring(filtros, cursor=siguiente) if siguiente else None,
+    })
+
+
+def descargar_certificados(request):
+    """ZIP con el CV y los certificados visibles del perfil activo."""
+    perfil = obtener_perfil_activo(request)
+    if not perfil:
+        raise Http404("Perfil no encontrado")
 
-    if file_type not in model_map:
-        raise Http404("Tipo de archivo no válido")
+    members = bundle_members(obtener_cv(perfil.idperfil))
+    response = bundle_response(request, perfil, members) if members else None
+    if response is None:
+        raise Http404("No hay certificados para descargar")
+
+    filename = f"Certificados_{perfil.nombres}_{perfil.apellidos}.zip".replace(" ", "_")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-cache"
+    return response
 
-    model_class = model_map[file_type]
-    obj = get_object_or_404(model_class, pk=model_id)
 
+def _content_disposition(content_type, force_download):
+    """inline para PDF/imágenes que el navegador puede mostrar, attachment para el resto."""
+    if force_download:
+        return "attachment"
+    inline_ok = content_type in [
+        "application/pdf", "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif",
+    ]
+    return "inline" if inline_ok else "attachment"
+
+
+def _image_derivative_ref(blob_ref, width, fmt):
+    """Referencia de la derivada pedida; si no se puede generar, el original."""
+    widths = getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", [])
+    width = normalize_width(width) if width else (max(widths) if widths else None)
+    fmt = (fmt or "jpeg").lower()
+    if not width or fmt not in supported_formats() + ["jpeg"]:
+        return blob_ref
+
+    try:
+        return get_or_create_derivative(blob_ref, width, fmt)
+    except Exception as e:
+        print(f"Error generando derivada de {blob_ref}: {e}")
+        return blob_ref
+
+
+# Modelos con archivos servidos por serve_protected_file
+PROTECTED_FILE_MODELS = {
+    "perfil": DatosPersonales,
+    "experiencia": ExperienciaLaboral,
+    "curso": CursosRealizados,
+    "reconocimiento": Reconocimientos,
+    "garage": VentaGarage,
+}
+
+
+def _blob_ref_for(obj, field_name):
+    """Referencia del archivo guardado en el campo, o 404 si no hay."""
     file_field = getattr(obj, field_name, None)
     if not file_field:
         raise Http404("Campo de archivo no existe")
@@ -340,74 +245,122 @@ def serve_protected_file(request, file_type, model_id, field_name):
 
     if not blob_ref:
         raise Http404("Archivo no asociado al registro")
+    return blob_ref
+
+
+def _sas_redirect(blob_ref, filename, force_download):
+    """302 a una URL SAS temporal: Azure entrega el archivo directamente."""
+    content_type = guess_content_type(None, blob_ref)
+    disposition = _content_disposition(content_type, force_download)
+    sas_url = AzureFileProxy.generate_sas_url(
+        blob_ref,
+        expiry_seconds=settings.AZURE_SAS_EXPIRY_SECONDS,
+        content_disposition=f'{disposition}; filename="{filename}"',
+    )
+    response = HttpResponseRedirect(sas_url)
+    response["Cache-Control"] = "private, max-age=60"
+    return response
+
+
+def _set_file_cache_headers(response, file_type):
+    # Las fotos de garage cambian seguido: el navegador siempre revalida
+    # con ETag/Last-Modified (304 barato) en vez de volver a descargarlas
+    if file_type == "garage":
+        response["Cache-Control"] = "no-cache"
+    else:
+        response["Cache-Control"] = "public, max-age=3600"
+    return response
+
+
+def _default_avatar_response(error_message, cache_control="public, max-age=86400"):
+    default_image_path = os.path.join(settings.BASE_DIR, "static", "img", "default-avatar.png")
+    if os.path.exists(default_image_path):
+        response = FileResponse(open(default_image_path, "rb"), content_type="image/png")
+        response["Cache-Control"] = cache_control
+        return response
+    raise Http404(error_message)
 
-    try:
-        content, blob_properties = AzureFileProxy.download_blob(blob_ref)
 
-        content_type = getattr(blob_properties.content_settings, "content_type", None)
-        if not content_type:
-            filename_guess = os.path.basename(str(blob_ref))
-            content_type, _ = mimetypes.guess_type(filename_guess)
-            if not content_type:
-                content_type = "application/octet-stream"
+def _azure_unavailable_response():
+    """503 mientras Azure no responde (no es un 404: el archivo puede existir)."""
+    response = HttpResponse("Almacenamiento no disponible temporalmente", status=503, content_type="text/plain")
+    response["Retry-After"] = str(getattr(settings, "AZURE_BREAKER_COOLDOWN", 30))
+    response["Cache-Control"] = "no-store"
+    return response
 
-        # filename final
-        filename = os.path.basename(str(blob_ref).replace("\\", "/").split("?")[0])
 
-        force_download = request.GET.get("download") == "1"
-        inline_ok = content_type in ["application/pdf", "image/jpeg", "image/png", "image/gif"]
+def serve_protected_file(request, file_type, model_id, field_name):
+    if file_type not in PROTECTED_FILE_MODELS:
+        raise Http404("Tipo de archivo no válido")
 
-        response = HttpResponse(content, content_type=content_type)
+    model_class = PROTECTED_FILE_MODELS[file_type]
+    obj = get_object_or_404(model_class, pk=model_id)
+    blob_ref = _blob_ref_for(obj, field_name)
 
-        if force_download:
-            disposition = "attachment"
-        else:
-            disposition = "inline" if inline_ok else "attachment"
+    # Versión reducida de una foto: ?w=640&fmt=webp
+    if field_name in IMAGE_FIELDS.get(file_type, ()) and ("w" in request.GET or "fmt" in request.GET):
+        blob_ref = _image_derivative_ref(blob_ref, request.GET.get("w"), request.GET.get("fmt"))
+
+    # filename final
+    filename = blob_filename(blob_ref)
+    force_download = request.GET.get("download") == "1"
+
+    try:
+        if delivery_mode(file_type) == "sas":
+            return _sas_redirect(blob_ref, filename, force_download)
+
+        source = open_file_source(blob_ref)
+        content_type = guess_content_type(source, blob_ref)
 
+        response = build_file_response(request, source, content_type)
+
+        disposition = _content_disposition(content_type, force_download)
         response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
-        
-        # No cachear archivos de garage para permitir actualizaciones de fotos
-        if file_type == "garage":
-            response["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response["Pragma"] = "no-cache"
-            response["Expires"] = "0"
-        else:
-            response["Cache-Control"] = "public, max-age=3600"
-        
-        return response
+        return _set_file_cache_headers(response, file_type)
 
     except FileNotFoundError:
         raise Http404("Archivo no encontrado en el almacenamiento")
+    except AzureUnavailableError:
+        return _azure_unavailable_response()
     except Exception as e:
         raise Http404(f"Error al obtener el archivo: {str(e)}")
 
 
-
-@cache_control(max_age=86400)
 def serve_avatar(request, perfil_id):
     perfil = get_object_or_404(DatosPersonales, pk=perfil_id)
 
     if not perfil.foto or not getattr(perfil.foto, "name", ""):
-        default_image_path = os.path.join(settings.BASE_DIR, "static", "img", "default-avatar.png")
-        if os.path.exists(default_image_path):
-            return FileResponse(open(default_image_path, "rb"), content_type="image/png")
-        raise Http404("No hay foto disponible")
+        return _default_avatar_response("No hay foto disponible")
 
     blob_name = perfil.foto.name
 
+    # Azure caído: avatar por defecto sin esperar timeouts (y sin cachearlo)
+    if azure_circuit_open(blob_name):
+        return _default_avatar_response("Almacenamiento no disponible", cache_control="no-cache")
+
     try:
-        content, blob_properties = AzureFileProxy.download_blob(blob_name)
-        content_type = getattr(blob_properties.content_settings, "content_type", None) or "image/jpeg"
+        source = open_file_source(blob_name)
+        content_type = guess_content_type(source, blob_name, default="image/jpeg")
 
-        response = HttpResponse(content, content_type=content_type)
+        response = build_file_response(request, source, content_type)
         response["Content-Disposition"] = f'inline; filename="{os.path.basename(blob_name)}"'
         response["Cache-Control"] = "public, max-age=86400"
         return response
 
+    except AzureUnavailableError:
+        return _default_avatar_response("Almacenamiento no disponible", cache_control="no-cache")
     except Exception:
-        default_image_path = os.path.join(settings.BASE_DIR, "static", "img", "default-avatar.png")
-        if os.path.exists(default_image_path):
-            return FileResponse(open(default_image_path, "rb"), content_type="image/png")
-        raise Http404("Error al cargar la imagen")
-
-
+        return _default_avatar_response("Error al cargar la imagen")
+
+
+@staff_member_required
+def estado_cache_blobs(request):
+    """
+    Contadores de la caché local de blobs (aciertos, fallos, descargas
+    compartidas, expulsiones) del worker que atiende y uso de disco total.
+    Cada worker de gunicorn lleva sus propios contadores.
+    """
+    blob_cache = get_blob_cache()
+    if blob_cache is None:
+        return JsonResponse({"habilitada": False})
+    return JsonResponse({"habilitada": True, "pid": os.getpid(), **blob_cache.stats()})
@@ -0,0 +1,121 @@
+# cv/views_async.py - Vistas asíncronas para servir archivos (ASGI)
+
+"""
+Versiones async de serve_protected_file y serve_avatar.
+
+Se activan con ASYNC_FILE_PROXY=True y requieren correr el proyecto con un
+servidor ASGI, por ejemplo:
+
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+
+Mientras Azure responde, el event loop sigue atendiendo otras peticiones,
+así un proceso mantiene muchas descargas en curso a la vez.
+"""
+
+import asyncio
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+
+from .file_responses import blob_filename, build_file_response, guess_content_type
+from .image_derivatives import IMAGE_FIELDS
+from .models import DatosPersonales
+from .storage_async import aazure_circuit_open, aopen_file_source
+from .storage_backends import AzureUnavailableError, delivery_mode
+from .views import (
+    PROTECTED_FILE_MODELS,
+    _azure_unavailable_response,
+    _blob_ref_for,
+    _content_disposition,
+    _image_derivative_ref,
+    _sas_redirect,
+    _set_file_cache_headers,
+)
+
+
+async def serve_protected_file_async(request, file_type, model_id, field_name):
+    if file_type not in PROTECTED_FILE_MODELS:
+        raise Http404("Tipo de archivo no válido")
+
+    model_class = PROTECTED_FILE_MODELS[file_type]
+    obj = await aget_object_or_404(model_class, pk=model_id)
+    blob_ref = _blob_ref_for(obj, field_name)
+
+    # Versión reducida de una foto: ?w=640&fmt=webp
+    if field_name in IMAGE_FIELDS.get(file_type, ()) and ("w" in request.GET or "fmt" in request.GET):
+        blob_ref = await sync_to_async(_image_derivative_ref)(
+            blob_ref, request.GET.get("w"), request.GET.get("fmt")
+        )
+
+    filename = blob_filename(blob_ref)
+    force_download = request.GET.get("download") == "1"
+
+    try:
+        if delivery_mode(file_type) == "sas":
+            return await sync_to_async(_sas_redirect)(blob_ref, filename, force_download)
+
+        source = await aopen_file_source(blob_ref)
+        content_type = guess_content_type(source, blob_ref)
+
+        response = build_file_response(request, source, content_type)
+
+        disposition = _content_disposition(content_type, force_download)
+        response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+        return _set_file_cache_headers(response, file_type)
+
+    except FileNotFoundError:
+        raise Http404("Archivo no encontrado en el almacenamiento")
+    except AzureUnavailableError:
+        return _azure_unavailable_response()
+    except Exception as e:
+        raise Http404(f"Error al obtener el archivo: {str(e)}")
+
+
+def _leer_archivo(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+async def _adefault_avatar_response(error_message, cache_control="public, max-age=86400"):
+    """
+    Versión asíncrona de _default_avatar_response: la imagen (chica) se lee
+    en un hilo y se responde completa, sin un FileResponse que bajo ASGI
+    se iteraría de forma síncrona.
+    """
+    default_image_path = os.path.join(settings.BASE_DIR, "static", "img", "default-avatar.png")
+    try:
+        data = await asyncio.to_thread(_leer_archivo, default_image_path)
+    except FileNotFoundError:
+        raise Http404(error_message)
+    response = HttpResponse(data, content_type="image/png")
+    response["Cache-Control"] = cache_control
+    return response
+
+
+async def serve_avatar_async(request, perfil_id):
+    perfil = await aget_object_or_404(DatosPersonales, pk=perfil_id)
+
+    if not perfil.foto or not getattr(perfil.foto, "name", ""):
+        return await _adefault_avatar_response("No hay foto disponible")
+
+    blob_name = perfil.foto.name
+
+    if await aazure_circuit_open(blob_name):
+        return await _adefault_avatar_response("Almacenamiento no disponible", cache_control="no-cache")
+
+    try:
+        source = await aopen_file_source(blob_name)
+        content_type = guess_content_type(source, blob_name, default="image/jpeg")
+
+        response = build_file_response(request, source, content_type)
+        response["Content-Disposition"] = f'inline; filename="{blob_filename(blob_name)}"'
+        response["Cache-Control"] = "public, max-age=86400"
+        return response
+
+    except AzureUnavailableError:
+        return await _adefault_avatar_response("Almacenamiento no disponible", cache_control="no-cache")
+    except Exception:
+        return await _adefault_avatar_response("Error al cargar la imagen")
@@ -7,8 +7,17 @@ Puedes adaptar estas vistas a tu aplicación.
 
 from django.shortcuts import render, get_object_or_404
 from .models import DatosPersonales, ConfiguracionVisibilidad
+from .perfil_activo import obtener_perfil_activo, obtener_perfil_activo_id
+from .snapshot import obtener_cv
 from .visibilidad import obtener_datos_filtrados, obtener_resumen_visibilidad
 
+def _configuracion_perfil(perfil, cv=None):
+    """Configuración del snapshot del perfil, o la de la BD (creándola si no existe)."""
+    if cv and cv['config'] is not None:
+        return cv['config']
+    config, _ = ConfiguracionVisibilidad.objects.get_or_create(perfil=perfil)
+    return config
+
 def proyecto_vida_completo(request, perfil_id=None):
     """
     Vista que muestra el proyecto de vida completo filtrando por visibilidad.
@@ -20,7 +29,7 @@ def proyecto_vida_completo(request, perfil_id=None):
         perfil = get_object_or_404(DatosPersonales, idperfil=perfil_id)
     else:
         # Obtener el primer perfil activo
-        perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+        perfil = obtener_perfil_activo(request)
         if not perfil:
             return render(request, 'cv/error.html', {
                 'error': 'No hay perfiles activos'
@@ -56,17 +65,14 @@ def panel_control_visibilidad(request):
     URL: /cv/control-visibilidad/
     """
     
-    perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+    perfil = obtener_perfil_activo(request)
     
     if not perfil:
         return render(request, 'cv/error.html', {
             'error': 'No hay perfiles activos'
         })
     
-    try:
-        config = ConfiguracionVisibilidad.objects.get(perfil=perfil)
-    except ConfiguracionVisibilidad.DoesNotExist:
-        config = ConfiguracionVisibilidad.objects.create(perfil=perfil)
+    config = _configuracion_perfil(perfil, obtener_cv(perfil.idperfil))
     
     resumen = obtener_resumen_visibilidad(perfil.idperfil)
     
@@ -99,18 +105,14 @@ def api_obtener_secciones_activas(request, perfil_id=None):
     """
     from django.http import JsonResponse
     
-    if perfil_id:
-        perfil = get_object_or_404(DatosPersonales, idperfil=perfil_id)
-    else:
-        perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+    # perfil y configuración salen del snapshot (una consulta por clave)
+    cv = obtener_cv(perfil_id or obtener_perfil_activo_id(request))
     
-    if not perfil:
+    if not cv:
         return JsonResponse({'error': 'Perfil no encontrado'}, status=404)
     
-    try:
-        config = ConfiguracionVisibilidad.objects.get(perfil=perfil)
-    except ConfiguracionVisibilidad.DoesNotExist:
-        config = ConfiguracionVisibilidad.objects.create(perfil=perfil)
+    perfil = cv['perfil']
+    config = _configuracion_perfil(perfil, cv)
     
     secciones = config.get_secciones_activas()
     
@@ -144,7 +146,7 @@ def api_actualizar_visibilidad(request, perfil_id=None):
     if perfil_id:
         perfil = get_object_or_404(DatosPersonales, idperfil=perfil_id)
     else:
-        perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
+        perfil = obtener_perfil_activo(request)
     
     if not perfil:
         return JsonResponse({'error': 'Perfil no encontrado'}, status=404)
@@ -5,36 +5,85 @@ Módulo para gestionar la visibilidad de secciones en la página del proyecto de
 Proporciona funciones auxiliares y template tags para filtrar datos.
 """
 
+from django.conf import settings
+from django.core.cache import cache
+
 from .models import ConfiguracionVisibilidad, DatosPersonales
+from .perfil_activo import obtener_perfil_activo_id
+from .secciones import cargar_secciones
+
+
+def _cache_key(perfil_id):
+    return f"visibilidad:config:{perfil_id or 'activo'}"
+
+
+def invalidar_cache_visibilidad(perfil_id=None):
+    """Descarta la configuración cacheada del perfil (y la del perfil por defecto)."""
+    cache.delete_many([_cache_key(perfil_id), _cache_key(None)])
+
+
+def _cargar_configuracion(perfil_id=None):
+    try:
+        configuraciones = ConfiguracionVisibilidad.objects.select_related("perfil")
+        if not perfil_id:
+            # sin id: la del perfil activo (o la primera que exista si no hay activo)
+            perfil_id = obtener_perfil_activo_id()
+            if perfil_id is None:
+                return configuraciones.first()
+        
+        return configuraciones.get(perfil_id=perfil_id)
+    except ConfiguracionVisibilidad.DoesNotExist:
+        # Perfil sin configuración todavía: se crea con los valores por defecto
+        if DatosPersonales.objects.filter(pk=perfil_id).exists():
+            config, _ = ConfiguracionVisibilidad.objects.get_or_create(perfil_id=perfil_id)
+            return config
+        return None
 
 def obtener_configuracion_visibilidad(perfil_id=None):
     """
     Obtiene la configuración de visibilidad para un perfil.
     Si no existe, crea una por defecto.
     
+    La configuración (con su perfil ya cargado) se guarda en la caché
+    compartida; las señales de cv/signals.py la invalidan al guardar
+    ConfiguracionVisibilidad o DatosPersonales.
+    
     Args:
         perfil_id: ID del perfil. Si es None, usa el primer perfil activo.
     
     Returns:
         ConfiguracionVisibilidad object
     """
-    try:
-        if perfil_id:
-            config = ConfiguracionVisibilidad.objects.get(perfil_id=perfil_id)
-        else:
-            config = ConfiguracionVisibilidad.objects.first()
-        
-        if not config:
-            # Crear configuración por defecto para el primer perfil
-            perfil = DatosPersonales.objects.filter(perfilactivo=1).first()
-            if perfil:
-                config, _ = ConfiguracionVisibilidad.objects.get_or_create(
-                    perfil=perfil
-                )
-        
-        return config
-    except ConfiguracionVisibilidad.DoesNotExist:
-        return None
+    key = _cache_key(perfil_id)
+    config = cache.get(key)
+    if config is None:
+        config = _cargar_configuracion(perfil_id)
+        if config is not None:
+            cache.set(key, config, getattr(settings, "VISIBILIDAD_CACHE_TTL", 3600))
+    return config
+
+def obtener_configuracion_request(request, perfil_id=None):
+    """
+    Igual que obtener_configuracion_visibilidad pero memorizada en el
+    request: la vista y los template tags de una misma página comparten
+    el mismo objeto.
+    """
+    if request is None:
+        return obtener_configuracion_visibilidad(perfil_id)
+    
+    memo = getattr(request, "_configuracion_visibilidad", None)
+    if memo is None:
+        memo = request._configuracion_visibilidad = {}
+    if perfil_id not in memo:
+        config = obtener_configuracion_visibilidad(perfil_id)
+        memo[perfil_id] = config
+        if config is not None:
+            # el perfil activo es también el que se resuelve sin id
+            if not perfil_id:
+                memo.setdefault(config.perfil_id, config)
+            elif config.perfil_id == obtener_perfil_activo_id(request):
+                memo.setdefault(None, config)
+    return memo[perfil_id]
 
 def obtener_datos_filtrados(perfil_id=None):
     """
@@ -63,41 +112,8 @@ def obtener_datos_filtrados(perfil_id=None):
             'mostrar_cv': config.mostrar_cv_descargable,
         }
     
-    # Experiencia laboral
-    if config.mostrar_experiencia_laboral:
-        datos['experiencias'] = perfil.experiencias.filter(
-            activarparaqueseveaenfront=True
-        ).order_by('-fechafingestion')
-    
-    # Cursos
-    if config.mostrar_cursos:
-        datos['cursos'] = perfil.cursos.filter(
-            activarparaqueseveaenfront=True
-        ).order_by('-fechafin')
-    
-    # Reconocimientos
-    if config.mostrar_reconocimientos:
-        datos['reconocimientos'] = perfil.reconocimientos.filter(
-            activarparaqueseveaenfront=True
-        ).order_by('-fechareconocimiento')
-    
-    # Productos académicos
-    if config.mostrar_productos_academicos:
-        datos['productos_academicos'] = perfil.productos_academicos.filter(
-            activarparaqueseveaenfront=True
-        )
-    
-    # Productos laborales
-    if config.mostrar_productos_laborales:
-        datos['productos_laborales'] = perfil.productos_laborales.filter(
-            activarparaqueseveaenfront=True
-        ).order_by('-fechaproducto')
-    
-    # Venta garage
-    if config.mostrar_venta_garage:
-        datos['garage'] = perfil.garage.filter(
-            activarparaqueseveaenfront=True
-        )
+    # Secciones visibles (mismo registro que las vistas del CV)
+    datos.update(cargar_secciones(perfil, config, usar_alias=True, incluir_ocultas=False))
     
     # Configuración
     datos['config'] = config
@@ -0,0 +1,99 @@
+# cv/warmup.py - Precalentamiento del estado de cada proceso
+
+"""
+`manage.py warmup` corre una vez en build.sh, en un proceso que termina
+antes de que arranque gunicorn: lo que deja sirve a todos los workers
+porque vive en disco o en la BD (caché de archivos, ubicaciones de blobs,
+metadatos, miniaturas, snapshot). Lo que vive en memoria de cada proceso
+se pierde con él:
+
+- el cargador de plantillas (plantillas ya compiladas),
+- el BlobServiceClient con su pool de conexiones (cv/storage_backends.py),
+- el circuit breaker de Azure (cv/circuit_breaker.py).
+
+Por eso gunicorn llama a calentar_worker() en cada worker al arrancar
+(post_worker_init en gunicorn.conf.py), antes de que reciba tráfico.
+Se desactiva con WARMUP_WORKER_START=False.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404
+from django.template.loader import get_template
+
+from .circuit_breaker import azure_breaker, is_unavailable_error
+from .prerender import request_interna
+from .storage_backends import get_blob_service_client
+
+# plantillas de las páginas públicas (se compilan aunque la página se
+# sirva pre-renderizada, para el primer visitante autenticado o filtrado)
+WARMUP_TEMPLATES = ("hoja_vida_cv.html", "hoja_vida_print_improved.html", "garage.html")
+
+
+def warmup_pages():
+    """(nombre, path, vista) de las páginas que se renderizan al precalentar."""
+    from . import views
+
+    return (
+        ("hoja_vida", "/", views.hoja_vida),
+        ("print_preview_improved", "/print-preview-improved/", views.print_preview_improved),
+        ("garage", "/garage/", views.garage),
+    )
+
+
+def calentar_paginas():
+    """Renderiza las páginas públicas; retorna [(nombre, status, segundos)]."""
+    resultados = []
+    for name, path, view in warmup_pages():
+        request = request_interna(path)
+        t0 = time.perf_counter()
+        try:
+            status = view(request).status_code
+        except Http404:
+            status = 404
+        except Exception as e:
+            status = f"error: {e}"
+        resultados.append((name, status, time.perf_counter() - t0))
+    return resultados
+
+
+def calentar_plantillas():
+    for name in WARMUP_TEMPLATES:
+        get_template(name)
+
+
+def calentar_azure():
+    """
+    Crea el cliente del proceso y abre una conexión del pool con una
+    consulta liviana al contenedor; el resultado queda en el breaker.
+    """
+    if not getattr(settings, "USE_AZURE_MEDIA", False):
+        return
+    container = (getattr(settings, "AZURE_CONTAINER", "") or "").strip()
+    client = get_blob_service_client()
+    if not container or not azure_breaker.allow(container):
+        return
+    try:
+        client.get_container_client(container).get_container_properties()
+    except Exception as e:
+        if is_unavailable_error(e):
+            azure_breaker.record_failure(container)
+            raise
+    azure_breaker.record_success(container)
+
+
+def calentar_worker():
+    """Precalienta el worker actual; un paso que falla no detiene el resto."""
+    if not getattr(settings, "WARMUP_WORKER_START", True):
+        return
+    started = time.perf_counter()
+    for paso in (calentar_plantillas, calentar_azure, calentar_paginas):
+        try:
+            paso()
+        except Exception as e:
+            print(f"⚠️ Warm-up del worker: {paso.__name__} falló: {e}")
+    # no dejar abierta una conexión a la BD creada fuera de un request
+    connection.close()
+    print(f"🔥 Worker precalentado en {time.perf_counter() - started:.2f}s")
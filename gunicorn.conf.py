@@ -0,0 +1,8 @@
+# gunicorn.conf.py - gunicorn lo lee automáticamente desde el directorio de trabajo
+
+
+def post_worker_init(worker):
+    # estado en memoria de cada worker: plantillas, cliente de Azure, breaker (cv/warmup.py)
+    from cv.warmup import calentar_worker
+
+    calentar_worker()